@@ -9,6 +9,7 @@ import retrofit2.http.Header
 import retrofit2.http.Path
 import okhttp3.MultipartBody
 import okhttp3.RequestBody
+import retrofit2.Response
 import retrofit2.http.*
 
 
@@ -72,6 +73,12 @@ interface ApiService {
         @Path("assetId") assetId: Int
     ): StreamStatus
 
+    // 推流状态 / 排队位置 (同时作为心跳，防止会话被空闲回收)
+    @GET("api/v1/stream/status")
+    suspend fun getStreamStatus(
+        @Header("Authorization") token: String
+    ): StreamStatus
+
     // 停止推流
     @POST("api/v1/stream/stop")
     suspend fun stopStream(
@@ -85,11 +92,13 @@ interface ApiService {
         @Body cmd: ControlCommand
     ): Map<String, Any>
 
-    // 社区帖子列表
+    // 社区帖子列表 (游标分页：响应头 X-Next-Cursor 为下一页游标，没有表示已到末尾)
     @GET("api/v1/posts/community")
     suspend fun getCommunityPosts(
-        @Header("Authorization") token: String
-    ): List<PostCard>
+        @Header("Authorization") token: String,
+        @Query("limit") limit: Int,
+        @Query("cursor") cursor: String? = null
+    ): Response<List<PostCard>>
 
     // 发布帖子
     @POST("api/v1/posts/publish")
@@ -223,13 +232,13 @@ interface ApiService {
     ): List<PostCard>
 
 
-    //模型下载
+    //模型下载 (OBJ/GLB/PLY 需要后台导出，未完成时返回 202 + Retry-After，见 awaitDownload)
     @POST("api/v1/assets/{id}/download")
     suspend fun downloadAsset(
         @Header("Authorization") token: String,
         @Path("id") assetId: Int,
         @Query("file_type") fileType: String
-    ): DownloadResponse
+    ): Response<DownloadResponse>
 
 
     //下载记录
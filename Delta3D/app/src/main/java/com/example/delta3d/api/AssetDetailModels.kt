@@ -25,11 +25,18 @@ data class AssetDetail(
     val estimatedGenSeconds: Int?
 )
 
-// 下载接口
+// 下载接口 (status 为 queued / running 时文件还在导出，url 为空，按 Retry-After 重新请求)
 data class DownloadResponse(
     val url: String,
-    val filename: String
-)
+    val filename: String,
+    val status: String?,
+
+    @SerializedName("file_size")
+    val fileSize: Long?
+) {
+    val isPending: Boolean
+        get() = status == "queued" || status == "running"
+}
 
 //更新的
 data class AssetUpdateRequest(
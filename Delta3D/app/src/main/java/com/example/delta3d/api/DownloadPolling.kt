@@ -0,0 +1,33 @@
+package com.example.delta3d.api
+
+import kotlinx.coroutines.delay
+import retrofit2.HttpException
+
+private const val DEFAULT_RETRY_AFTER_SECONDS = 5L
+private const val MAX_WAIT_MILLIS = 15 * 60 * 1000L
+
+/**
+ * 请求下载地址；服务端还在导出网格时按 Retry-After 轮询，直到导出完成或失败
+ * onPending 在每次收到 queued / running 时回调 (用于提示用户)
+ */
+suspend fun ApiService.awaitDownload(
+    token: String,
+    assetId: Int,
+    fileType: String,
+    onPending: suspend (DownloadResponse) -> Unit = {}
+): DownloadResponse {
+    var waited = 0L
+    while (true) {
+        val response = downloadAsset(token, assetId, fileType)
+        if (!response.isSuccessful) throw HttpException(response)
+        val body = response.body() ?: throw IllegalStateException("Empty download response")
+        if (!body.isPending) return body
+
+        if (waited >= MAX_WAIT_MILLIS) throw IllegalStateException("Export timed out, please try again later")
+        onPending(body)
+        val retryAfter = response.headers()["Retry-After"]?.toLongOrNull() ?: DEFAULT_RETRY_AFTER_SECONDS
+        val delayMillis = retryAfter.coerceAtLeast(1) * 1000
+        delay(delayMillis)
+        waited += delayMillis
+    }
+}
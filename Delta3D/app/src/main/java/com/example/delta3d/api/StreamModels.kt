@@ -35,5 +35,7 @@ data class ControlCommand(
 data class StreamStatus(
     @SerializedName("is_active") val isActive: Boolean,
     @SerializedName("rtsp_url") val rtspUrl: String?,
-    @SerializedName("current_asset_id") val currentAssetId: Int?
+    @SerializedName("current_asset_id") val currentAssetId: Int?,
+    // 会话已满时的排队位置 (从 1 开始)，未排队为 null
+    @SerializedName("queue_position") val queuePosition: Int?
 )
\ No newline at end of file
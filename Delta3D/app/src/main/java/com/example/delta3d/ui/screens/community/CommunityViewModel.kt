@@ -44,8 +44,17 @@ class CommunityViewModel : ViewModel() {
             _isRefreshing.value = true
             try {
                 val authHeader = if (token.startsWith("Bearer ")) token else "Bearer $token"
-                _allPosts = RetrofitClient.api.getCommunityPosts(authHeader)
-                refreshDisplayList()
+                // 按游标逐页加载，每页到达后立即刷新列表 (搜索 / 只看关注在本地过滤，需要完整列表)
+                val posts = mutableListOf<PostCard>()
+                var cursor: String? = null
+                do {
+                    val response = RetrofitClient.api.getCommunityPosts(authHeader, PAGE_SIZE, cursor)
+                    if (!response.isSuccessful) throw HttpException(response)
+                    posts += response.body().orEmpty()
+                    _allPosts = posts.toList()
+                    refreshDisplayList()
+                    cursor = response.headers()["X-Next-Cursor"]
+                } while (cursor != null)
             } catch (e: Exception) {
                 e.printStackTrace()
             } finally {
@@ -196,5 +205,8 @@ class CommunityViewModel : ViewModel() {
         }
     }
 
+    companion object {
+        private const val PAGE_SIZE = 50
+    }
 
 }
\ No newline at end of file
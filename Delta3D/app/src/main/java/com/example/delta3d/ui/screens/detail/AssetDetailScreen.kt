@@ -115,6 +115,10 @@ fun AssetDetailScreen(
 
                 }
 
+                is DownloadEvent.Preparing -> {
+                    feedbackState.show("Preparing ${event.filename}, download will start when ready")
+                }
+
                 is DownloadEvent.Error -> {
                     feedbackState.showError(event.msg)
                 }
@@ -6,6 +6,7 @@ import com.example.delta3d.api.AssetDetail
 import com.example.delta3d.api.AssetUpdateRequest
 import com.example.delta3d.api.ReportRequest
 import com.example.delta3d.api.RetrofitClient
+import com.example.delta3d.api.awaitDownload
 import kotlinx.coroutines.flow.MutableStateFlow
 import kotlinx.coroutines.flow.asStateFlow
 import kotlinx.coroutines.launch
@@ -34,8 +35,14 @@ class AssetDetailViewModel : ViewModel() {
 
                 val authHeader = if (token.startsWith("Bearer ")) token else "Bearer $token"
 
-                // 调用 API
-                val response = RetrofitClient.api.downloadAsset(authHeader, assetId, fileType)
+                // 调用 API (网格格式需要等待后台导出完成)
+                var notified = false
+                val response = RetrofitClient.api.awaitDownload(authHeader, assetId, fileType) { pending ->
+                    if (!notified) {
+                        notified = true
+                        _downloadEvent.emit(DownloadEvent.Preparing(pending.filename))
+                    }
+                }
 
                 _downloadEvent.emit(DownloadEvent.Success(response.url, response.filename))
 
@@ -128,6 +135,7 @@ sealed class DetailUiState {
 
 
 sealed class DownloadEvent {
+    data class Preparing(val filename: String) : DownloadEvent()
     data class Success(val url: String, val filename: String) : DownloadEvent()
     data class Error(val msg: String) : DownloadEvent()
 }
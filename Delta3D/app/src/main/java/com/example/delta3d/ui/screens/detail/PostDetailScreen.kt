@@ -132,6 +132,10 @@ fun PostDetailScreen(
                     feedbackState.showSuccess("Starting download: ${event.filename}")
                 }
 
+                is DownloadEvent.Preparing -> {
+                    feedbackState.show("Preparing ${event.filename}, download will start when ready")
+                }
+
                 is DownloadEvent.Error -> {
                     feedbackState.showError(event.msg)
                 }
@@ -4,6 +4,7 @@ import androidx.lifecycle.ViewModel
 import androidx.lifecycle.viewModelScope
 import com.example.delta3d.api.PostDetail
 import com.example.delta3d.api.RetrofitClient
+import com.example.delta3d.api.awaitDownload
 import kotlinx.coroutines.flow.MutableStateFlow
 import kotlinx.coroutines.flow.asStateFlow
 import kotlinx.coroutines.launch
@@ -167,7 +168,13 @@ class PostDetailViewModel : ViewModel() {
                 val authHeader = if (token.startsWith("Bearer ")) token else "Bearer $token"
 
 
-                val response = RetrofitClient.api.downloadAsset(authHeader, assetId, fileType)
+                var notified = false
+                val response = RetrofitClient.api.awaitDownload(authHeader, assetId, fileType) { pending ->
+                    if (!notified) {
+                        notified = true
+                        _downloadEvent.emit(DownloadEvent.Preparing(pending.filename))
+                    }
+                }
 
 
                 _downloadEvent.emit(DownloadEvent.Success(response.url, response.filename))
@@ -133,6 +133,20 @@ fun StreamPreviewScreen(
                 )
             }
 
+            is StreamUiState.Queued -> {
+                CircularProgressIndicator(
+                    color = Color(0xFF64FFDA),
+                    modifier = Modifier.align(Alignment.Center)
+                )
+                Text(
+                    "All render slots are busy, you are #${(uiState as StreamUiState.Queued).position} in line",
+                    color = Color.White.copy(0.7f),
+                    modifier = Modifier
+                        .align(Alignment.Center)
+                        .padding(top = 80.dp)
+                )
+            }
+
             is StreamUiState.Error -> {
                 Column(
                     modifier = Modifier.align(Alignment.Center),
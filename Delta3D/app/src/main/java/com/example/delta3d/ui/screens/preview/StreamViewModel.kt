@@ -4,7 +4,10 @@ import android.util.Log
 import androidx.lifecycle.ViewModel
 import androidx.lifecycle.viewModelScope
 import com.example.delta3d.api.*
+import kotlinx.coroutines.CancellationException
+import kotlinx.coroutines.Job
 import kotlinx.coroutines.NonCancellable
+import kotlinx.coroutines.delay
 import kotlinx.coroutines.flow.MutableStateFlow
 import kotlinx.coroutines.flow.asStateFlow
 import kotlinx.coroutines.launch
@@ -13,6 +16,7 @@ import kotlinx.coroutines.withContext
 sealed class StreamUiState {
     object Idle : StreamUiState()
     object Loading : StreamUiState()
+    data class Queued(val position: Int) : StreamUiState()
     data class Streaming(val url: String) : StreamUiState()
     data class Error(val msg: String) : StreamUiState()
 }
@@ -21,28 +25,54 @@ class StreamViewModel : ViewModel() {
     private val _uiState = MutableStateFlow<StreamUiState>(StreamUiState.Idle)
     val uiState = _uiState.asStateFlow()
 
+    // 状态轮询 (排队 / 心跳)
+    private var pollJob: Job? = null
+
     // 开启推流
     fun startStreamSession(token: String, assetId: Int) {
-        viewModelScope.launch {
+        pollJob?.cancel()
+        pollJob = viewModelScope.launch {
             _uiState.value = StreamUiState.Loading
             try {
                 val authHeader = if (token.startsWith("Bearer ")) token else "Bearer $token"
 
                 Log.d("TRACK_STREAM", "请求启动推流: AssetId=$assetId")
 
-                val status = RetrofitClient.api.startStream(authHeader, assetId)
+                var status = RetrofitClient.api.startStream(authHeader, assetId)
+
+                // 排队时轮询排队位置，播放中定期轮询作为心跳 (服务端会回收长时间无心跳的会话)
+                while (true) {
+                    Log.d(
+                        "TRACK_STREAM",
+                        "后端返回状态: Active=${status.isActive}, URL=${status.rtspUrl}, Queue=${status.queuePosition}"
+                    )
+
+                    val interval = when {
+                        status.isActive && !status.rtspUrl.isNullOrEmpty() -> {
+                            _uiState.value = StreamUiState.Streaming(status.rtspUrl!!)
+                            HEARTBEAT_INTERVAL_MS
+                        }
 
-                Log.d(
-                    "TRACK_STREAM",
-                    "后端返回状态: Active=${status.isActive}, URL=${status.rtspUrl}"
-                )
+                        status.queuePosition != null -> {
+                            _uiState.value = StreamUiState.Queued(status.queuePosition!!)
+                            QUEUE_POLL_INTERVAL_MS
+                        }
 
-                if (status.isActive && !status.rtspUrl.isNullOrEmpty()) {
-                    _uiState.value = StreamUiState.Streaming(status.rtspUrl)
-                } else {
-                    Log.e("TRACK_STREAM", "推流启动失败: URL为空或状态非Active")
-                    _uiState.value = StreamUiState.Error("Stream failed to start")
+                        else -> {
+                            val wasStreaming = _uiState.value is StreamUiState.Streaming
+                            Log.e("TRACK_STREAM", "推流未运行: URL为空或状态非Active")
+                            _uiState.value = StreamUiState.Error(
+                                if (wasStreaming) "Stream ended" else "Stream failed to start"
+                            )
+                            return@launch
+                        }
+                    }
+
+                    delay(interval)
+                    status = RetrofitClient.api.getStreamStatus(authHeader)
                 }
+            } catch (e: CancellationException) {
+                throw e
             } catch (e: Exception) {
                 e.printStackTrace()
                 Log.e("TRACK_STREAM", "网络/API异常: ${e.message}")
@@ -53,6 +83,7 @@ class StreamViewModel : ViewModel() {
 
     // 停止推流
     fun stopStreamSession(token: String) {
+        pollJob?.cancel()
         viewModelScope.launch {
             // 使用 NonCancellable 上下文，防止因页面销毁导致网络请求被中断
             withContext(NonCancellable) {
@@ -88,4 +119,9 @@ class StreamViewModel : ViewModel() {
             }
         }
     }
+
+    companion object {
+        private const val HEARTBEAT_INTERVAL_MS = 30_000L
+        private const val QUEUE_POLL_INTERVAL_MS = 5_000L
+    }
 }
\ No newline at end of file
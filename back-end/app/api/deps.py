@@ -1,5 +1,5 @@
 # app/api/deps.py
-from typing import Generator, Annotated
+from typing import Generator, Annotated, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
@@ -7,30 +7,75 @@ from sqlmodel import Session
 from pydantic import ValidationError
 
 from app.core.config import settings
-from app.database import get_session
+from app.database import get_session, engine
 from app.models import User
+from app.core.auth_cache import Principal, principal_cache
 from app.core.config import settings
 
 # 指明 Token 获取地址
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"/api/v1/auth/login")
 
 
-def get_current_user(
-        session: Session = Depends(get_session),
-        token: str = Depends(reusable_oauth2)
-) -> User:
-    """
-    依赖注入：验证 Token 并返回当前 User 对象
-    """
+def user_id_from_token(token: str) -> int | None:
+    """解析 Token 中的用户 ID (WebSocket 等无法使用 OAuth2 依赖的场景)，无效时返回 None"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        sub = payload.get("sub")
+        return int(sub) if sub is not None else None
+    except (JWTError, ValidationError, ValueError):
+        return None
+
+
+def _decode_token(token: str) -> Tuple[int, float | None]:
+    """解析 Token，返回 (user_id, exp 时间戳)"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         token_data = payload.get("sub")
         if token_data is None:
             raise HTTPException(status_code=403, detail="Token 凭证无效")
-    except (JWTError, ValidationError):
+        return int(token_data), payload.get("exp")
+    except (JWTError, ValidationError, ValueError):
         raise HTTPException(status_code=403, detail="无法验证凭证")
 
-    user = session.get(User, int(token_data))
+
+def get_current_principal(token: str = Depends(reusable_oauth2)) -> Principal:
+    """
+    依赖注入：返回当前用户的轻量身份 (id / username / avatar_url)
+    命中缓存时不解析 JWT、不打开数据库 Session，只需要用户 ID 的接口应使用它
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    with Session(engine) as session:
+        return _load_user(session, token)[1]
+
+
+def _load_user(session: Session, token: str) -> Tuple[User, Principal]:
+    """解析 Token 并用给定的 Session 读取用户，同时写入身份缓存，返回 (user, principal)"""
+    user_id, token_exp = _decode_token(token)
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    principal = Principal(id=user.id, username=user.username, avatar_url=user.avatar_url)
+    principal_cache.put(token, principal, token_exp)
+    return user, principal
+
+
+def get_current_user(
+        session: Session = Depends(get_session),
+        token: str = Depends(reusable_oauth2)
+) -> User:
+    """
+    依赖注入：验证 Token 并返回当前 User 对象 (需要完整资料或要修改用户时使用)
+    缓存未命中时直接用本次请求的 Session 读取用户，不再额外打开连接
+    """
+    principal = principal_cache.get(token)
+    if principal is None:
+        return _load_user(session, token)[0]
+
+    user = session.get(User, principal.id)
     if not user:
+        principal_cache.invalidate_user(principal.id)
         raise HTTPException(status_code=404, detail="用户不存在")
-    return user
\ No newline at end of file
+    return user
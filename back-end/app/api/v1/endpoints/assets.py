@@ -1,25 +1,42 @@
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks
-from sqlmodel import Session
-
+from typing import Dict, List
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select, func, col
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import ClientDisconnect
+
+import asyncio
+import hashlib
+import json
 import shutil
 import uuid
 import os
 from pathlib import Path
+from urllib.parse import quote
 
-from app.database import get_session
-from app.models import User, ModelAsset
+from app.database import get_session, get_async_session
+from app.models import User, ModelAsset, TrainingJob, JobStatus, UploadSession, UploadStatus
 from app.schemas import AssetCard, DownloadResponse, DownloadFileType, AssetUpdate, AssetReport
-from app.api.deps import get_current_user
+from app.schemas import PipelineStats, TrainingJobStatus, UploadInit, UploadSessionOut
+from app.api.deps import get_current_user, get_current_principal
+from app.core.auth_cache import Principal
+from app.core import thumbnails, uploads, zip_stream
+from app.core.security import create_download_token, verify_download_token
 from app.crud import crud_asset
 from app.core.config import settings
-from app.ngp.worker import task_train_asset
+from app.ngp.job_queue import enqueue_training, training_dispatcher
+from app.ngp.pipeline import training_pipeline
+from app.ngp.export import export_queue
 from app.schemas import AssetDetail
 from app.schemas import ToggleResponse
 
 router = APIRouter()
 
+# 同一上传会话同时只接收一个分片
+_upload_locks: Dict[str, asyncio.Lock] = {}
+
 
 @router.get("/me", response_model=List[AssetCard])
 def read_my_assets(
@@ -38,18 +55,25 @@ def read_my_assets(
     return assets
 
 
-@router.post("/upload", response_model=AssetCard)
-def upload_asset(
-        background_tasks: BackgroundTasks,
-        file: UploadFile = File(...),
-        title: str = Form(...),
-        description: str = Form(default=None),
-        tags: str = Form(default=""),
-        remark: str = Form(default=None),
-        estimated_time: int = Form(default=None),
-        session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
-):
+def _reject_video(message: str, status_code: int = 400) -> HTTPException:
+    return HTTPException(status_code=status_code, detail=message)
+
+
+def _create_asset_from_video(
+        session: Session,
+        user_id: int,
+        video_file: Path,
+        video_hash: str,
+        video_ext: str,
+        title: str,
+        description: str | None,
+        tags: List[str],
+        remark: str | None,
+        estimated_time: int | None
+) -> AssetCard:
+    """
+    把已校验的视频移入资产目录，创建资产并写入训练队列
+    """
     upload_root = Path(settings.UPLOAD_DIR)
     upload_root.mkdir(parents=True, exist_ok=True)
 
@@ -58,24 +82,13 @@ def upload_asset(
     asset_dir = upload_root / asset_uid
     asset_dir.mkdir(parents=True, exist_ok=False)
 
-    # (asset_dir / "outputs").mkdir(exist_ok=True)
-    # (asset_dir / "temp").mkdir(exist_ok=True)
-
-    # 视频统一叫 video.<ext>
-    video_filename = f"video.mp4"
-    video_disk_path = asset_dir / video_filename
-
+    # 视频统一叫 video.<ext>，扩展名与实际容器一致
+    video_disk_path = asset_dir / f"video{video_ext}"
     try:
-        with video_disk_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        shutil.move(str(video_file), str(video_disk_path))
     except Exception:
         shutil.rmtree(asset_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail="文件保存失败")
-    finally:
-        try:
-            file.file.close()
-        except Exception:
-            pass
 
     # web 路径
     web_asset_base = f"/static/uploads/{asset_uid}"
@@ -83,28 +96,31 @@ def upload_asset(
     snapshot_disk_path = str((asset_dir / "model.msgpack"))
     web_model_path = snapshot_disk_path
 
-    # tags
-    tag_list = [t.strip() for t in tags.split(",") if t.strip()]
-
     # video_path 只存 base
     new_asset = crud_asset.create_asset(
         session=session,
-        user_id=current_user.id,
+        user_id=user_id,
         title=title,
         video_path=web_asset_base,
         description=description,
-        tags=tag_list,
+        tags=tags,
         remark=remark,
         estimated_gen_seconds=estimated_time
     )
 
-    background_tasks.add_task(
-        task_train_asset,
-        new_asset.id,
-        video_disk_path,
-        snapshot_disk_path,
-        web_model_path
+    # 写入持久化训练队列，由调度器领取后交给进程内按阶段划分的线程池流水线执行
+    enqueue_training(
+        session=session,
+        asset_id=new_asset.id,
+        user_id=user_id,
+        video_disk_path=video_disk_path,
+        snapshot_disk_path=snapshot_disk_path,
+        web_model_path=web_model_path,
+        video_hash=video_hash
     )
+    training_dispatcher.notify()
+    # 封面在后台生成，生成前卡片沿用 video_path
+    thumbnails.thumbnail_worker.submit(new_asset.id, video_disk_path)
 
     return AssetCard(
         id=new_asset.id,
@@ -116,7 +132,332 @@ def upload_asset(
         created_at=str(new_asset.created_at),
         status=new_asset.status,
         height=new_asset.height,
-        owner_id=current_user.id
+        owner_id=user_id
+    )
+
+
+@router.post("/upload", response_model=AssetCard)
+def upload_asset(
+        file: UploadFile = File(...),
+        title: str = Form(...),
+        description: str = Form(default=None),
+        tags: str = Form(default=""),
+        remark: str = Form(default=None),
+        estimated_time: int = Form(default=None),
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    一次性上传 (小文件)。大文件请使用 /uploads 分片上传，可断点续传
+    """
+    filename = file.filename or "video.mp4"
+    try:
+        uploads.check_upload_request(filename, file.size)
+    except ValueError as e:
+        raise _reject_video(str(e), status_code=413 if file.size and file.size > settings.UPLOAD_MAX_BYTES else 400)
+
+    # 边写盘边计算 hash，供训练缓存去重；超过大小上限立即停止
+    temp_path = uploads.incoming_dir() / f"{uuid.uuid4().hex}.part"
+    hasher = hashlib.sha256()
+    written = 0
+    try:
+        with temp_path.open("wb") as buffer:
+            for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+                written += len(chunk)
+                if written > settings.UPLOAD_MAX_BYTES:
+                    raise _reject_video("文件过大", status_code=413)
+                hasher.update(chunk)
+                buffer.write(chunk)
+    except HTTPException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    except Exception:
+        temp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail="文件保存失败")
+    finally:
+        try:
+            file.file.close()
+        except Exception:
+            pass
+
+    # 排队训练之前检查容器与时长
+    try:
+        probe = uploads.probe_video(str(temp_path))
+    except ValueError as e:
+        temp_path.unlink(missing_ok=True)
+        raise _reject_video(str(e))
+
+    # tags
+    tag_list = [t.strip() for t in tags.split(",") if t.strip()]
+
+    return _create_asset_from_video(
+        session,
+        user_id=current_user.id,
+        video_file=temp_path,
+        video_hash=hasher.hexdigest(),
+        video_ext=uploads.video_extension(probe, filename),
+        title=title,
+        description=description,
+        tags=tag_list,
+        remark=remark,
+        estimated_time=estimated_time
+    )
+
+
+# ============================
+# 分片上传 (断点续传)
+# 1. POST   /uploads                 创建会话 (文件大小 + 资产信息)
+# 2. PUT    /uploads/{id}            上传分片，Content-Range: bytes <start>-<end>/<total>
+#    GET    /uploads/{id}            查询已接收字节数，断线后从 offset 继续
+# 3. POST   /uploads/{id}/commit     校验 sha256 + ffprobe，创建资产并排队训练
+#    DELETE /uploads/{id}            放弃上传
+# ============================
+def _upload_out(upload: UploadSession) -> UploadSessionOut:
+    return UploadSessionOut(
+        upload_id=upload.id,
+        status=upload.status,
+        offset=upload.received_bytes,
+        total_size=upload.total_size,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        asset_id=upload.asset_id
+    )
+
+
+def _get_own_upload(upload: UploadSession | None, user_id: int) -> UploadSession:
+    if not upload or upload.user_id != user_id:
+        raise HTTPException(status_code=404, detail="上传会话不存在")
+    return upload
+
+
+@router.post("/uploads", response_model=UploadSessionOut)
+def create_upload(
+        upload_in: UploadInit,
+        session: Session = Depends(get_session),
+        current_user: Principal = Depends(get_current_principal)
+):
+    try:
+        uploads.check_upload_request(upload_in.filename, upload_in.size)
+    except ValueError as e:
+        raise _reject_video(str(e), status_code=413 if upload_in.size > settings.UPLOAD_MAX_BYTES else 400)
+
+    uploads.purge_expired_uploads(session)
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        filename=upload_in.filename,
+        total_size=upload_in.size,
+        sha256=upload_in.sha256.lower() if upload_in.sha256 else None,
+        meta=upload_in.model_dump(include={"title", "description", "tags", "remark", "estimated_time"})
+    )
+    uploads.part_path(upload.id).touch()
+    session.add(upload)
+    session.commit()
+    session.refresh(upload)
+    return _upload_out(upload)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionOut)
+def read_upload(
+        upload_id: str,
+        session: Session = Depends(get_session),
+        current_user: Principal = Depends(get_current_principal)
+):
+    upload = _get_own_upload(session.get(UploadSession, upload_id), current_user.id)
+    return _upload_out(upload)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionOut)
+async def upload_chunk(
+        upload_id: str,
+        request: Request,
+        content_range: str | None = Header(default=None),
+        session: AsyncSession = Depends(get_async_session),
+        current_user: Principal = Depends(get_current_principal)
+):
+    """
+    上传一个分片：请求体直接流式写入磁盘并增量计算 sha256，不在内存中缓冲整个分片。
+    start 必须等于已接收字节数，否则返回 409 (响应头 Upload-Offset 为正确偏移)。
+    连接中途断开时已写入的部分仍然有效，客户端查询 offset 后继续。
+    """
+    upload = _get_own_upload(await session.get(UploadSession, upload_id), current_user.id)
+    if upload.status != UploadStatus.UPLOADING:
+        raise HTTPException(status_code=409, detail="上传会话已结束")
+
+    try:
+        start, end, total = uploads.parse_content_range(content_range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if total != upload.total_size:
+        raise HTTPException(status_code=400, detail="文件总大小与上传会话不一致")
+    if start != upload.received_bytes:
+        raise HTTPException(
+            status_code=409,
+            detail="分片偏移不正确",
+            headers={"Upload-Offset": str(upload.received_bytes)}
+        )
+
+    lock = _upload_locks.setdefault(upload_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(status_code=409, detail="该上传会话正在接收其他分片")
+
+    async with lock:
+        path = uploads.part_path(upload_id)
+        hasher = await run_in_threadpool(uploads.upload_hashers.resume, upload_id, path, start)
+        received = start
+        f = await run_in_threadpool(path.open, "r+b")
+        try:
+            await run_in_threadpool(f.truncate, start)
+            await run_in_threadpool(f.seek, start)
+
+            def _write(data: bytes):
+                f.write(data)
+                hasher.update(data)
+
+            async for data in request.stream():
+                if not data:
+                    continue
+                if received + len(data) > end + 1:
+                    raise HTTPException(status_code=400, detail="分片长度超过 Content-Range")
+                await run_in_threadpool(_write, data)
+                received += len(data)
+        except ClientDisconnect:
+            pass
+        finally:
+            await run_in_threadpool(f.close)
+            uploads.upload_hashers.save(upload_id, received, hasher)
+            upload.received_bytes = received
+            upload.updated_at = datetime.utcnow()
+            session.add(upload)
+            await session.commit()
+            _upload_locks.pop(upload_id, None)
+
+    return _upload_out(upload)
+
+
+@router.post("/uploads/{upload_id}/commit", response_model=AssetCard)
+def commit_upload(
+        upload_id: str,
+        session: Session = Depends(get_session),
+        current_user: Principal = Depends(get_current_principal)
+):
+    upload = _get_own_upload(session.get(UploadSession, upload_id), current_user.id)
+    if upload.status != UploadStatus.UPLOADING:
+        raise HTTPException(status_code=409, detail="上传会话已结束")
+    if upload.received_bytes != upload.total_size:
+        raise HTTPException(
+            status_code=409,
+            detail="文件尚未上传完成",
+            headers={"Upload-Offset": str(upload.received_bytes)}
+        )
+
+    path = uploads.part_path(upload_id)
+    video_hash = uploads.upload_hashers.resume(upload_id, path, upload.received_bytes).hexdigest()
+    uploads.upload_hashers.discard(upload_id)
+
+    def _abort(message: str):
+        uploads.discard_upload(upload)
+        session.add(upload)
+        session.commit()
+        raise _reject_video(message)
+
+    if upload.sha256 and upload.sha256 != video_hash:
+        _abort("文件校验失败 (sha256 不一致)，请重新上传")
+
+    try:
+        probe = uploads.probe_video(str(path))
+    except ValueError as e:
+        _abort(str(e))
+
+    meta = upload.meta or {}
+    card = _create_asset_from_video(
+        session,
+        user_id=current_user.id,
+        video_file=path,
+        video_hash=video_hash,
+        video_ext=uploads.video_extension(probe, upload.filename),
+        title=meta.get("title") or Path(upload.filename).stem,
+        description=meta.get("description"),
+        tags=meta.get("tags") or [],
+        remark=meta.get("remark"),
+        estimated_time=meta.get("estimated_time")
+    )
+
+    upload.status = UploadStatus.COMMITTED
+    upload.asset_id = card.id
+    upload.updated_at = datetime.utcnow()
+    session.add(upload)
+    session.commit()
+    return card
+
+
+@router.delete("/uploads/{upload_id}", response_model=UploadSessionOut)
+def abort_upload(
+        upload_id: str,
+        session: Session = Depends(get_session),
+        current_user: Principal = Depends(get_current_principal)
+):
+    upload = _get_own_upload(session.get(UploadSession, upload_id), current_user.id)
+    if upload.status == UploadStatus.UPLOADING:
+        uploads.discard_upload(upload)
+        session.add(upload)
+        session.commit()
+    return _upload_out(upload)
+
+
+@router.get("/pipeline/stats", response_model=PipelineStats)
+def read_pipeline_stats(
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    训练流水线状态：各阶段排队数、并发数、耗时统计
+    """
+    queued_jobs = session.exec(
+        select(func.count()).select_from(TrainingJob).where(TrainingJob.status == JobStatus.QUEUED)
+    ).one()
+
+    return PipelineStats(
+        in_flight=training_pipeline.in_flight(),
+        queued_jobs=queued_jobs,
+        stages=training_pipeline.stats()
+    )
+
+
+@router.get("/{asset_id}/training", response_model=TrainingJobStatus)
+def read_asset_training(
+        asset_id: int,
+        session: Session = Depends(get_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    获取模型最近一次训练任务的进度与各阶段耗时
+    权限：仅拥有者可见
+    """
+    asset = session.get(ModelAsset, asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="模型资产不存在")
+
+    if asset.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问该资产")
+
+    job = session.exec(
+        select(TrainingJob)
+        .where(TrainingJob.asset_id == asset_id)
+        .order_by(col(TrainingJob.id).desc())
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="未找到训练任务")
+
+    return TrainingJobStatus(
+        asset_id=asset_id,
+        status=job.status,
+        current_stage=job.current_stage,
+        attempts=job.attempts,
+        stage_timings=job.stage_timings or {},
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
     )
 
 
@@ -189,7 +530,8 @@ def read_my_collected_assets(
         AssetCard(
             id=asset.id,
             title=asset.title,
-            cover_url=asset.video_path,
+            cover_url=thumbnails.cover_url(asset),
+            thumbnails=thumbnails.thumbnail_sources(asset),
             description=asset.description,
             tags=asset.tags,
             is_collected=True,
@@ -202,38 +544,166 @@ def read_my_collected_assets(
     ]
 
 
+def _safe_title(asset: ModelAsset) -> str:
+    return asset.title.replace(" ", "_").replace("/", "_").replace("\\", "_")
+
+
+def _source_bundle(asset: ModelAsset) -> zip_stream.ZipStream:
+    """
+    源数据打包：视频 + transforms.json + transforms.json 中引用的帧 + 快照
+    只打包资产目录内的文件
+    """
+    asset_dir = Path(settings.UPLOAD_DIR) / Path(asset.video_path).name
+    root = asset_dir.resolve()
+    prefix = _safe_title(asset)
+
+    files = [(f"{prefix}/{video.name}", str(video)) for video in sorted(asset_dir.glob("video.*"))]
+
+    transforms = asset_dir / "transforms.json"
+    if transforms.is_file():
+        files.append((f"{prefix}/transforms.json", str(transforms)))
+        try:
+            frames = json.loads(transforms.read_text(encoding="utf-8")).get("frames", [])
+        except (OSError, ValueError, AttributeError):
+            frames = []
+
+        seen = set()
+        for frame in frames:
+            file_path = frame.get("file_path") if isinstance(frame, dict) else None
+            if not file_path:
+                continue
+            path = (asset_dir / file_path).resolve()
+            if path in seen or not path.is_relative_to(root) or not path.is_file():
+                continue
+            seen.add(path)
+            files.append((f"{prefix}/{path.relative_to(root).as_posix()}", str(path)))
+
+    if asset.model_path and os.path.isfile(asset.model_path):
+        files.append((f"{prefix}/{Path(asset.model_path).name}", asset.model_path))
+
+    return zip_stream.ZipStream(files)
+
+
 @router.post("/{asset_id}/download", response_model=DownloadResponse)
 def download_asset_file(
         asset_id: int,
         file_type: DownloadFileType,  # 前端传递 obj/glb/ply/source
+        response: Response,
+        resolution: int | None = None,  # marching cubes 分辨率，默认 EXPORT_MARCHING_CUBES_RES
         session: Session = Depends(get_session),
         current_user: User = Depends(get_current_user)
 ):
     """
     下载模型接口
-    1. 校验资产是否存在
-    2. 记录下载历史
-    3. 返回文件真实链接 (目前统一返回 msgpack)
+    1. 校验资产是否存在，以及下载权限 (拥有者，或已发布为非私密且允许下载的帖子)
+    2. SOURCE (msgpack) 返回源数据 ZIP 的打包下载链接 (带短期 Token)；
+       OBJ/GLB/PLY 查询导出任务，未完成时返回 202 (按 Retry-After 重试)
+    3. 文件就绪时记录下载历史并返回真实链接
     """
     # 检查资产
     asset = session.get(ModelAsset, asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="资产不存在")
 
+    # 权限校验 (在签发 Token / 创建导出任务之前)
+    if not crud_asset.can_download(session, current_user.id, asset):
+        raise HTTPException(status_code=403, detail="无权下载该资产")
+
     if not asset.model_path:
         raise HTTPException(status_code=400, detail="模型文件尚未生成或已丢失")
 
-    # 记录下载
+    safe_title = _safe_title(asset)
+
+    if file_type == DownloadFileType.SOURCE:
+        # 源数据 (视频 + transforms.json + 帧 + 快照) 打包成 ZIP 流式下载，链接自带短期 Token
+        crud_asset.record_download(session, current_user.id, asset.id)
+        token = create_download_token(current_user.id, asset.id)
+        return DownloadResponse(url=f"/api/v1/assets/{asset.id}/bundle?token={token}", filename=f"{safe_title}_source.zip")
+
+    resolution = resolution or settings.EXPORT_MARCHING_CUBES_RES
+    if resolution not in settings.EXPORT_ALLOWED_RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的分辨率，可选: {', '.join(map(str, settings.EXPORT_ALLOWED_RESOLUTIONS))}"
+        )
+
+    filename = f"{safe_title}_{resolution}.{file_type.value}"
+    job = export_queue.request(session, asset, file_type.value, resolution, current_user.id)
+
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"模型导出失败: {job.error}")
+
+    if job.status != JobStatus.DONE:
+        response.status_code = 202
+        response.headers["Retry-After"] = str(settings.EXPORT_RETRY_AFTER)
+        return DownloadResponse(url="", filename=filename, status=job.status)
+
     crud_asset.record_download(session, current_user.id, asset.id)
+    return DownloadResponse(
+        url="/" + Path(job.output_path).as_posix().lstrip("/"),
+        filename=filename,
+        status=job.status,
+        file_size=job.file_size
+    )
 
-    # 返回的文件路径
-    real_url = asset.model_path
 
-    file_extension = ".msgpack"
-    safe_title = asset.title.replace(" ", "_").replace("/", "_")
-    filename = f"{safe_title}_{file_type.value}{file_extension}"
+@router.get("/{asset_id}/bundle")
+def download_asset_bundle(
+        asset_id: int,
+        token: str,
+        request: Request,
+        session: Session = Depends(get_session)
+):
+    """
+    源数据打包下载 (ZIP 边读边发，不生成临时文件)
+    - token 由 POST /{asset_id}/download (file_type=DownloadFileType.SOURCE) 签发 (系统下载器无法携带 Authorization 头)
+    - 预先给出 Content-Length，支持 Range / If-Range 断点续传
+    - 每次请求都重新校验下载权限 (签发后帖子可能被设为私密或关闭下载)
+    """
+    user_id = verify_download_token(token, asset_id)
+    if user_id is None:
+        raise HTTPException(status_code=403, detail="下载链接无效或已过期")
+
+    asset = session.get(ModelAsset, asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="资产不存在")
+    if not crud_asset.can_download(session, user_id, asset):
+        raise HTTPException(status_code=403, detail="无权下载该资产")
 
-    return DownloadResponse(url=real_url, filename=filename)
+    try:
+        bundle = _source_bundle(asset)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="资产文件已丢失")
+    if not bundle.entries:
+        raise HTTPException(status_code=404, detail="资产文件已丢失")
+
+    filename = f"{_safe_title(asset)}_source.zip"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": bundle.etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+    }
+
+    # If-Range 不匹配 (文件已变化) 时忽略 Range，重新下载整个压缩包
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == bundle.etag:
+        try:
+            byte_range = zip_stream.parse_range(request.headers.get("range"), bundle.size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{bundle.size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(bundle.size)
+        return StreamingResponse(bundle.iter_range(), media_type="application/zip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{bundle.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        bundle.iter_range(start, end), status_code=206, media_type="application/zip", headers=headers
+    )
 
 
 @router.get("/me/downloads", response_model=List[AssetCard])
@@ -1,47 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.database import get_session
+from app.database import get_async_session
 from app.schemas import UserCreate, UserOut, Token
 from app.crud import crud_user
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_password_async, create_access_token, HashPoolBusy
+from app.core.rate_limit import login_ip_limiter, login_user_limiter
 
 router = APIRouter()
 
 
+def _check_rate_limit(limiter, key: str):
+    retry_after = limiter.hit(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="尝试次数过多，请稍后再试",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def _hash_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="服务繁忙，请稍后再试",
+        headers={"Retry-After": "1"},
+    )
+
+
 # 注册接口
 @router.post("/register", response_model=UserOut)
-def register(user_in: UserCreate, session: Session = Depends(get_session)):
+async def register(
+        user_in: UserCreate,
+        request: Request,
+        session: AsyncSession = Depends(get_async_session)
+):
+    _check_rate_limit(login_ip_limiter, request.client.host if request.client else "")
+
     # 检查用户名是否已存在
-    user = crud_user.get_user_by_username(session, username=user_in.username)
+    user = await crud_user.get_user_by_username_async(session, username=user_in.username)
     if user:
         raise HTTPException(
             status_code=400,
             detail="该用户名已被注册",
         )
-    # 创建用户
-    new_user = crud_user.create_user(session, user_in)
+    # 创建用户 (密码哈希在专用线程池中计算)
+    try:
+        new_user = await crud_user.create_user_async(session, user_in)
+    except HashPoolBusy:
+        raise _hash_pool_busy()
     return new_user
 
 
 # 登录接口
 @router.post("/login", response_model=Token)
-def login(
+async def login(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
-        session: Session = Depends(get_session)
+        session: AsyncSession = Depends(get_async_session)
 ):
+    # 先限流再计算哈希：撞库请求不会占满哈希线程池
+    _check_rate_limit(login_ip_limiter, request.client.host if request.client else "")
+    _check_rate_limit(login_user_limiter, form_data.username)
+
     # form_data.username 和 form_data.password
-    user = crud_user.get_user_by_username(session, username=form_data.username)
+    user = await crud_user.get_user_by_username_async(session, username=form_data.username)
 
     # 验证账号和密码
-    if not user or not verify_password(form_data.password, user.password_hash):
+    try:
+        verified, new_hash = await verify_password_async(
+            form_data.password, user.password_hash if user else None
+        )
+    except HashPoolBusy:
+        raise _hash_pool_busy()
+
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # 旧算法 / 旧成本参数的哈希：登录成功后透明升级
+    if new_hash:
+        user.password_hash = new_hash
+        session.add(user)
+        await session.commit()
+
+    login_user_limiter.reset(form_data.username)
+
     # 生成 Token
     access_token = create_access_token(subject=user.id)
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,6 +1,6 @@
 # app/api/v1/endpoints/posts.py
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlmodel import Session
 
 from app.database import get_session
@@ -12,11 +12,14 @@ from app.models import (
     PostCollection,
     Comment,
     UserFollow,
-    User,
     Visibility, AssetStatus
 )
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.auth_cache import Principal
 from app.crud import crud_post
+from app.core import thumbnails
+from app.core.config import settings
+from app.core.renderer_pool import renderer_pool, resolve_render_paths
 
 router = APIRouter()
 
@@ -24,7 +27,7 @@ router = APIRouter()
 @router.get("/users/me/posts", response_model=List[PostCard])
 def read_my_posts(
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取【我自己】的所有帖子列表
@@ -41,7 +44,7 @@ def read_my_posts(
 def read_user_posts(
         target_user_id: int,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)  # 需要登录才能看
+        current_user: Principal = Depends(get_current_principal)  # 需要登录才能看
 ):
     """
     获取指定用户(target_user_id)的所有帖子列表
@@ -56,8 +59,11 @@ def read_user_posts(
 
 @router.get("/community", response_model=List[PostCard])
 def read_community_posts(
+        response: Response,
+        limit: Optional[int] = Query(None, ge=1, le=settings.COMMUNITY_MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     【社区首页】
@@ -65,11 +71,20 @@ def read_community_posts(
     - 模型信息（标题、封面）
     - 帖子数据（内容、时间、点赞数、评论数、收藏数）
     - 交互状态（是否已赞、是否已收藏、是否已关注作者）
+
+    分页：响应头 X-Next-Cursor 为下一页游标，没有该响应头表示已到末尾
+    limit 与 cursor 都不传时按旧版客户端处理，返回全部帖子且不分页
     """
-    posts = crud_post.get_community_posts(
+    if limit is None and cursor:
+        limit = settings.COMMUNITY_PAGE_SIZE
+    posts, next_cursor = crud_post.get_community_posts(
         session=session,
-        current_user_id=current_user.id
+        current_user_id=current_user.id,
+        limit=limit,
+        cursor=cursor
     )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return posts
 
 
@@ -77,7 +92,7 @@ def read_community_posts(
 def publish_post(
         post_in: PostCreate,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     发布帖子 (Publish Post)
@@ -130,7 +145,8 @@ def publish_post(
         post_id=new_post.id,
         asset_id=asset.id,
         title=asset.title,  # 沿用模型标题
-        cover_url=asset.video_path,  # 沿用模型视频/封面
+        cover_url=thumbnails.cover_url(asset),  # 沿用模型封面
+        thumbnails=thumbnails.thumbnail_sources(asset),
         description=new_post.content or asset.description,  # 优先显示帖子文案
         tags=asset.tags,  # 沿用模型标签
         published_at=str(new_post.published_at),
@@ -159,7 +175,7 @@ def publish_post(
 def like_post(
         post_id: int,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     点赞/取消点赞
@@ -183,7 +199,7 @@ def like_post(
 def collect_post(
         post_id: int,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     收藏/取消收藏
@@ -207,7 +223,7 @@ def comment_post(
         post_id: int,
         comment_in: CommentCreate,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """发表评论"""
     comment = crud_post.create_comment(
@@ -233,7 +249,7 @@ def comment_post(
 def read_post_detail(
         post_id: int,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     【帖子详情页】
@@ -245,13 +261,23 @@ def read_post_detail(
         post_id=post_id,
         current_user_id=current_user.id
     )
+
+    # 详情页通常紧接着打开 3D 预览：提前把快照加载到空闲渲染进程
+    asset = session.get(CommunityPost, post_id).asset
+    if settings.STREAM_HEADLESS and asset and asset.status == AssetStatus.COMPLETED and asset.model_path:
+        try:
+            scene_path, snapshot_path = resolve_render_paths(asset.model_path)
+            renderer_pool.prefetch(str(scene_path), str(snapshot_path))
+        except (ValueError, FileNotFoundError):
+            pass
+
     return post_detail
 
 
 @router.get("/me/collected", response_model=List[PostCard])
 def read_my_collections(
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取【我收藏】的所有帖子列表
@@ -1,18 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from functools import partial
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
+from pydantic import ValidationError
 from sqlmodel import Session
 
 from app.core.config import settings
 from app.database import get_session
-from app.models import User, ModelAsset, AssetStatus
-from app.api.deps import get_current_user
-from app.schemas import StreamStatus, ControlCommand
-from app.core.stream_manager import stream_session
-from pathlib import Path
+from app.models import ModelAsset, AssetStatus
+from app.api.deps import get_current_principal, user_id_from_token
+from app.core.auth_cache import Principal
+from app.schemas import StreamStatus, ControlCommand, CameraPose, CameraVelocity
+from app.core.stream_manager import stream_pool
+from app.core.renderer_pool import resolve_render_paths
+from fastapi import Request
 
 router = APIRouter()
 
-from pathlib import Path
-from fastapi import Depends, HTTPException, Request
+
+def _build_status(request: Request, state: dict) -> StreamStatus:
+    """把会话池状态转换为前端使用的播放地址 (每个会话独立的流路径)"""
+    webrtc_url = None
+    if state["stream_path"]:
+        # 通过公网地址访问时走端口映射，其余 (内网 / 本机) 直接连 mediamtx 的 WebRTC 端口
+        host = request.url.hostname
+        if settings.STREAM_PUBLIC_IP and host == settings.STREAM_PUBLIC_IP:
+            webrtc_url = f"http://{host}:{settings.STREAM_PUBLIC_WEBRTC_PORT}/{state['stream_path']}"
+        else:
+            webrtc_url = f"http://{host}:{settings.STREAM_WEBRTC_PORT}/{state['stream_path']}"
+
+    return StreamStatus(
+        is_active=state["is_active"],
+        rtsp_url=webrtc_url,
+        current_asset_id=state["current_asset_id"],
+        queue_position=state["queue_position"]
+    )
 
 
 @router.post("/start/{asset_id}", response_model=StreamStatus)
@@ -20,7 +43,7 @@ def start_stream(
         asset_id: int,
         request: Request,
         session: Session = Depends(get_session),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     asset = session.get(ModelAsset, asset_id)
     if not asset:
@@ -29,95 +52,58 @@ def start_stream(
     if asset.status != "completed" or not asset.model_path:
         raise HTTPException(status_code=400, detail="模型尚未训练完成，无法预览")
 
-    model_path_rel = Path(asset.model_path)  # 相对路径
-
-    parts = model_path_rel.parts
-    if not parts or parts[0].lower() != "static":
-        raise HTTPException(status_code=500, detail=f"model_path 不合法(必须 static 开头): {asset.model_path}")
-
-    under_static = Path(*parts[1:])
-
-    static_root = Path("static").resolve()
-
-    snapshot_path = static_root / under_static
-
-    asset_dir = snapshot_path.parent
-    scene_path = asset_dir / f"{asset_dir.name}_scene"
-
-    # ---- debug 打印 ----
-    print("\n========== [PATH DEBUG] ==========")
-    print(f"asset.model_path = {asset.model_path}")
-    print(f"static_root      = {static_root}")
-    print(f"under_static     = {under_static}")
-    print(f"snapshot_path    = {snapshot_path}")
-    print(f"asset_dir        = {asset_dir}")
-    print(f"scene_path       = {scene_path}")
-    print("=================================\n")
-
-    # 校验 snapshot
-    if not snapshot_path.exists():
-        print("!! snapshot_path NOT EXISTS")
-        raise HTTPException(status_code=404, detail=f"模型文件丢失: {snapshot_path}")
-
-    # 校验 scene
-    if not scene_path.exists():
-        print("!! scene_path(guess) NOT EXISTS")
-        transforms_in_asset_dir = asset_dir / "transforms.json"
-        print(f"transforms.json@asset_dir = {transforms_in_asset_dir} exists={transforms_in_asset_dir.exists()}")
-
-        if transforms_in_asset_dir.exists():
-            scene_path = asset_dir
-            print(f"scene_path(fallback)= {scene_path}")
-        else:
-            print(f"调试路径(scene_path guess): {scene_path}")
-            raise HTTPException(status_code=404, detail="场景数据丢失 (transforms.json)")
-
-    print("========== [start_stream] PATH DEBUG END ==========\n")
+    try:
+        scene_path, snapshot_path = resolve_render_paths(asset.model_path)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    stream_session.start(
+    state = stream_pool.start(
+        user_id=current_user.id,
         asset_id=asset.id,
         scene_path=str(scene_path),
         snapshot_path=str(snapshot_path)
     )
+    status = _build_status(request, state)
+    if status.rtsp_url:
+        print(f"用户 {current_user.id} 开始推流，播放地址: {status.rtsp_url}")
+    return status
 
-    host = request.url.hostname
-
-    # rtsp_url = f"rtsp://{host}:8555/live"
-    PUBLIC_IP = "47.107.130.88"
-    if host == PUBLIC_IP:
-        webrtc_url = f"http://{PUBLIC_IP}:29655/live"
-        print(f"检测到公网访问，返回: {webrtc_url}")
-    else:
-        webrtc_url = f"http://{host}:8889/live"
-        print(f"检测到内网访问，返回: {webrtc_url}")
 
-    return StreamStatus(
-        is_active=True,
-        rtsp_url=webrtc_url,
-        current_asset_id=asset.id
-    )
+@router.get("/status", response_model=StreamStatus)
+def stream_status(
+        request: Request,
+        current_user: Principal = Depends(get_current_principal)
+):
+    """
+    查询当前用户的推流状态 / 排队位置
+    前端需定期轮询，作为心跳防止会话被空闲回收
+    """
+    return _build_status(request, stream_pool.status(current_user.id))
 
 
 @router.post("/stop")
 def stop_stream(
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
-    """停止推流"""
-    stream_session.stop()
+    """停止推流 (或取消排队)"""
+    stream_pool.stop(current_user.id)
     return {"message": "推流已停止"}
 
 
 @router.post("/control")
 def control_view(
         cmd: ControlCommand,
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     操控窗口 (旋转/缩放/平移)
     mode="start" 开始连续动作
     mode="stop" 停止动作
     """
-    if not stream_session.is_running:
+    stream_session = stream_pool.get(current_user.id)
+    if not stream_session or not stream_session.is_running:
         raise HTTPException(status_code=400, detail="推流未启动")
 
     stream_session.control(
@@ -126,3 +112,79 @@ def control_view(
         mode=cmd.mode
     )
     return {"status": "ok", "cmd": cmd}
+
+
+def _parse_camera_message(msg: dict) -> dict:
+    """
+    WebSocket 消息 -> 渲染服务指令
+
+    Raises:
+        ValueError / ValidationError: 消息格式错误
+    """
+    msg_type = msg.get("type")
+    if msg_type == "pose":
+        pose = CameraPose.model_validate(msg)
+        if len(pose.matrix) != 3 or any(len(row) != 4 for row in pose.matrix):
+            raise ValueError("matrix 必须是 3x4")
+        return {"cmd": "pose", "matrix": pose.matrix, "scale": pose.scale}
+
+    if msg_type == "velocity":
+        velocity = CameraVelocity.model_validate(msg)
+        if len(velocity.orbit) != 2 or len(velocity.pan) != 2:
+            raise ValueError("orbit / pan 必须是长度为 2 的数组")
+        return {"cmd": "velocity", "orbit": velocity.orbit, "pan": velocity.pan, "zoom": velocity.zoom}
+
+    if msg_type == "move":
+        cmd = ControlCommand.model_validate(msg)
+        return {"cmd": "move", "action": cmd.action.value, "direction": cmd.direction.value, "mode": cmd.mode}
+
+    raise ValueError(f"未知的消息类型: {msg_type}")
+
+
+@router.websocket("/ws")
+async def stream_control_ws(
+        websocket: WebSocket,
+        token: str = Query(...)
+):
+    """
+    相机控制通道 (替代高频调用 /control)
+    客户端消息：
+      {"type": "pose", "matrix": [[...4], [...4], [...4]], "scale": 1.0}
+      {"type": "velocity", "orbit": [yaw, pitch], "pan": [x, y], "zoom": z}
+      {"type": "move", "action": "rotate", "direction": "left", "mode": "start"}
+    同类指令在推流线程的每个帧周期内只发送最新的一条
+    """
+    user_id = user_id_from_token(token)
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            data = await websocket.receive_text()
+
+            try:
+                command = _parse_camera_message(json.loads(data))
+            except (json.JSONDecodeError, ValidationError, ValueError, AttributeError) as e:
+                await websocket.send_text(json.dumps({"type": "error", "detail": f"指令格式错误: {e}"}))
+                continue
+
+            stream_session = stream_pool.get(user_id)
+            if not stream_session or not stream_session.is_running:
+                await websocket.send_text(json.dumps({"type": "error", "detail": "推流未启动"}))
+                continue
+
+            if stream_session.headless:
+                stream_session.submit_camera(command)
+            elif command["cmd"] == "move":
+                # GUI 模式只支持 move，鼠标模拟会阻塞，放到线程池执行
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, partial(
+                    stream_session.control, command["action"], command["direction"], command["mode"]
+                ))
+            else:
+                await websocket.send_text(json.dumps({"type": "error", "detail": "GUI 推流模式不支持该指令"}))
+
+    except WebSocketDisconnect:
+        pass
@@ -1,6 +1,3 @@
-import shutil
-import uuid
-
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlmodel import Session
 from app.database import get_session
@@ -8,7 +5,7 @@ from app.schemas import ToggleResponse, UserDetail, UserAvatar, UserOut, UserUpd
 from app.models import User
 from app.api.deps import get_current_user
 from app.crud import crud_user
-from pathlib import Path
+from app.core import images
 from typing import List
 
 router = APIRouter()
@@ -65,10 +62,6 @@ def read_user_me(
     )
 
 
-AVATAR_UPLOAD_ROOT = Path("static/uploads/avatars")
-AVATAR_UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
-
-
 @router.post("/me/avatar", response_model=UserDetail)
 def update_my_avatar(
         file: UploadFile = File(...),
@@ -82,24 +75,21 @@ def update_my_avatar(
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="只能上传图片文件")
 
-    # 生成唯一文件名 (user_id + uuid + 后缀)
-    ext = file.filename.split(".")[-1] if "." in file.filename else "png"
-    new_filename = f"{current_user.id}_{uuid.uuid4().hex[:8]}.{ext}"
-
-    disk_path = AVATAR_UPLOAD_ROOT / new_filename
-    web_path = f"/static/uploads/avatars/{new_filename}"
-
-    # 保存文件
+    # 解码、裁剪并转码 (不保存客户端原始文件)
     try:
-        with disk_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        web_path = images.save_image(images.read_upload(file.file), "avatar")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"头像保存失败: {str(e)}")
     finally:
         file.file.close()
 
-    # 更新数据库
+    # 更新数据库，回收旧头像
+    old_path = current_user.avatar_url
     updated_user = crud_user.update_avatar(session, current_user.id, web_path)
+    if old_path != web_path:
+        images.release_image(session, old_path)
 
     # 返回最新的用户详情
     return UserDetail(
@@ -165,11 +155,6 @@ def get_user_following(
     return user.following
 
 
-# 更新背景图
-COVER_UPLOAD_ROOT = Path("static/uploads/covers")
-COVER_UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
-
-
 @router.post("/me/cover", response_model=UserDetail)
 def update_my_cover(
         file: UploadFile = File(...),
@@ -183,24 +168,21 @@ def update_my_cover(
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="只能上传图片文件")
 
-    # 生成唯一文件名
-    ext = file.filename.split(".")[-1] if "." in file.filename else "png"
-    new_filename = f"cover_{current_user.id}_{uuid.uuid4().hex[:8]}.{ext}"
-
-    disk_path = COVER_UPLOAD_ROOT / new_filename
-    web_path = f"/static/uploads/covers/{new_filename}"
-
-    # 保存文件
+    # 解码、裁剪并转码 (不保存客户端原始文件)
     try:
-        with disk_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        web_path = images.save_image(images.read_upload(file.file), "cover")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"背景图保存失败: {str(e)}")
     finally:
         file.file.close()
 
-    # 更新数据库
+    # 更新数据库，回收旧背景图
+    old_path = current_user.cover_url
     updated_user = crud_user.update_cover(session, current_user.id, web_path)
+    if old_path != web_path:
+        images.release_image(session, old_path)
 
     # 返回最新的用户详情
     return UserDetail(
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """已登录用户的轻量身份 (不绑定数据库 Session)"""
+    id: int
+    username: str
+    avatar_url: Optional[str] = None
+
+
+class PrincipalCache:
+    """
+    Token -> Principal 的 TTL + LRU 缓存
+    - 命中时既不解析 JWT 也不查库
+    - 条目过期时间不晚于 Token 本身的 exp
+    - 用户资料变更时按 user_id 失效 (仅本进程，其他 worker 最多延迟 ttl 秒)
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = defaultdict(set)
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float] = None):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user[principal.id].add(token)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+# 全局单例
+principal_cache = PrincipalCache(
+    max_size=settings.AUTH_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_CACHE_TTL
+)
@@ -0,0 +1,124 @@
+-- 首个版本 (引入版本化迁移之前) init_db 生成的 SQLite 表结构
+-- 只用于 python -m app.core.migrations check-upgrade 验证从旧库升级，不要修改
+
+CREATE TABLE user (
+	id INTEGER NOT NULL,
+	username VARCHAR NOT NULL,
+	password_hash VARCHAR NOT NULL,
+	gender VARCHAR(6) NOT NULL,
+	avatar_url VARCHAR,
+	cover_url VARCHAR,
+	bio VARCHAR(500),
+	created_at DATETIME NOT NULL,
+	follower_count INTEGER NOT NULL,
+	following_count INTEGER NOT NULL,
+	liked_total_count INTEGER NOT NULL,
+	PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX ix_user_username ON user (username);
+
+CREATE TABLE userfollow (
+	follower_id INTEGER NOT NULL,
+	followed_id INTEGER NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (follower_id, followed_id),
+	FOREIGN KEY(follower_id) REFERENCES user (id),
+	FOREIGN KEY(followed_id) REFERENCES user (id)
+);
+
+CREATE TABLE modelasset (
+	id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	video_path VARCHAR NOT NULL,
+	model_path VARCHAR,
+	title VARCHAR(100) NOT NULL,
+	description VARCHAR,
+	remark VARCHAR,
+	tags JSON NOT NULL,
+	status VARCHAR(10) NOT NULL,
+	created_at DATETIME NOT NULL,
+	estimated_gen_seconds INTEGER,
+	height INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+
+CREATE TABLE message (
+	id INTEGER NOT NULL,
+	sender_id INTEGER NOT NULL,
+	receiver_id INTEGER NOT NULL,
+	content VARCHAR NOT NULL,
+	is_read BOOLEAN NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(sender_id) REFERENCES user (id),
+	FOREIGN KEY(receiver_id) REFERENCES user (id)
+);
+
+CREATE TABLE modelcollection (
+	user_id INTEGER NOT NULL,
+	asset_id INTEGER NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (user_id, asset_id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(asset_id) REFERENCES modelasset (id)
+);
+
+CREATE TABLE communitypost (
+	id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	asset_id INTEGER NOT NULL,
+	content VARCHAR,
+	visibility VARCHAR(9) NOT NULL,
+	allow_download BOOLEAN NOT NULL,
+	published_at DATETIME NOT NULL,
+	view_count INTEGER NOT NULL,
+	like_count INTEGER NOT NULL,
+	collect_count INTEGER NOT NULL,
+	download_count INTEGER NOT NULL,
+	comment_count INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(asset_id) REFERENCES modelasset (id)
+);
+
+CREATE TABLE downloadrecord (
+	id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	asset_id INTEGER NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(asset_id) REFERENCES modelasset (id)
+);
+
+CREATE TABLE postcollection (
+	user_id INTEGER NOT NULL,
+	post_id INTEGER NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (user_id, post_id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(post_id) REFERENCES communitypost (id)
+);
+
+CREATE TABLE interactionlike (
+	user_id INTEGER NOT NULL,
+	post_id INTEGER NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (user_id, post_id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(post_id) REFERENCES communitypost (id)
+);
+
+CREATE TABLE comment (
+	id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	post_id INTEGER NOT NULL,
+	parent_id INTEGER,
+	content VARCHAR NOT NULL,
+	created_at DATETIME NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES user (id),
+	FOREIGN KEY(post_id) REFERENCES communitypost (id)
+);
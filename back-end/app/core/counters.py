@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import update, case, func
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.database import engine
+from app.models import CommunityPost, Comment, InteractionLike, PostCollection, User, UserFollow
+
+
+# =============================================================================
+# SQL 端原子增减
+# 计数列统一用 UPDATE ... SET x = x + 1，避免读-改-写丢失并发增量
+# =============================================================================
+
+def increment(session: Session, column, where, delta: int = 1):
+    """原子增减计数列，减到 0 为止 (调用方负责 commit)"""
+    if delta >= 0:
+        value = column + delta
+    else:
+        value = case((column + delta > 0, column + delta), else_=0)
+    session.exec(update(column.class_).where(where).values({column.key: value}))
+
+
+class ViewCountBuffer:
+    """
+    浏览量写缓冲：
+    详情页访问只在内存中累加，由后台线程每 VIEW_FLUSH_INTERVAL 秒批量写回，
+    热门帖子的读请求不再排队等待同一行的写锁。
+    进程退出时未写回的增量会丢失 (最多一个刷新周期)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = defaultdict(int)
+
+    def incr(self, post_id: int):
+        with self._lock:
+            self._pending[post_id] += 1
+
+    def pending(self, post_id: int) -> int:
+        """尚未写回的增量 (详情页展示时叠加)"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self) -> int:
+        """
+        把缓冲的增量写回数据库
+
+        Returns:
+            int: 写回的帖子数
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return 0
+
+        try:
+            with Session(engine) as session:
+                for post_id, delta in pending.items():
+                    increment(session, CommunityPost.view_count, CommunityPost.id == post_id, delta)
+                session.commit()
+        except Exception as e:
+            # 写回失败：把增量放回缓冲，下个周期重试
+            print(f"浏览量写回失败: {e}")
+            with self._lock:
+                for post_id, delta in pending.items():
+                    self._pending[post_id] += delta
+            return 0
+
+        return len(pending)
+
+
+def reconcile_counters(session: Session):
+    """
+    按关联表重新计算冗余计数：
+    - CommunityPost.like_count / collect_count / comment_count
+    - User.follower_count / following_count / liked_total_count
+    用于修复历史上非原子更新造成的偏差
+    """
+    like_count = (
+        select(func.count()).select_from(InteractionLike)
+        .where(InteractionLike.post_id == CommunityPost.id)
+        .scalar_subquery()
+    )
+    collect_count = (
+        select(func.count()).select_from(PostCollection)
+        .where(PostCollection.post_id == CommunityPost.id)
+        .scalar_subquery()
+    )
+    comment_count = (
+        select(func.count()).select_from(Comment)
+        .where(Comment.post_id == CommunityPost.id)
+        .scalar_subquery()
+    )
+    session.exec(update(CommunityPost).values(
+        like_count=like_count,
+        collect_count=collect_count,
+        comment_count=comment_count
+    ))
+
+    follower_count = (
+        select(func.count()).select_from(UserFollow)
+        .where(UserFollow.followed_id == User.id)
+        .scalar_subquery()
+    )
+    following_count = (
+        select(func.count()).select_from(UserFollow)
+        .where(UserFollow.follower_id == User.id)
+        .scalar_subquery()
+    )
+    liked_total_count = (
+        select(func.count()).select_from(InteractionLike)
+        .join(CommunityPost, CommunityPost.id == InteractionLike.post_id)
+        .where(CommunityPost.user_id == User.id)
+        .scalar_subquery()
+    )
+    session.exec(update(User).values(
+        follower_count=follower_count,
+        following_count=following_count,
+        liked_total_count=liked_total_count
+    ))
+
+    session.commit()
+
+
+class CounterMaintainer:
+    """后台线程：定期写回浏览量，按 COUNTER_RECONCILE_INTERVAL 对账 (0 表示不对账)"""
+
+    def __init__(self, buffer: ViewCountBuffer, flush_interval: float, reconcile_interval: float):
+        self.buffer = buffer
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        # 退出前把剩余增量写回
+        self.buffer.flush()
+
+    def _loop(self):
+        last_reconcile = time.time()
+        while not self._stop_event.wait(self.flush_interval):
+            self.buffer.flush()
+
+            if self.reconcile_interval > 0 and time.time() - last_reconcile >= self.reconcile_interval:
+                last_reconcile = time.time()
+                try:
+                    with Session(engine) as session:
+                        reconcile_counters(session)
+                    print("计数对账完成")
+                except Exception as e:
+                    print(f"计数对账失败: {e}")
+
+
+# 全局单例
+view_counter = ViewCountBuffer()
+counter_maintainer = CounterMaintainer(
+    view_counter,
+    flush_interval=settings.VIEW_FLUSH_INTERVAL,
+    reconcile_interval=settings.COUNTER_RECONCILE_INTERVAL
+)
+
+
+if __name__ == "__main__":
+    # 手动对账：python -m app.core.counters
+    with Session(engine) as session:
+        reconcile_counters(session)
+    print("计数对账完成")
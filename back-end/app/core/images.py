@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+from sqlmodel import Session, select, func, or_
+
+from app.core.config import settings
+from app.database import engine
+from app.models import User
+
+# 输出格式 -> 扩展名；同一张图的两种格式文件名相同，只有扩展名不同
+FORMAT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+# 刚写入 / 刚被复用的文件在该秒数内不回收 (避免与同内容的并发上传互相删除)
+GC_GRACE_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """一类用户图片的存储位置与输出尺寸"""
+    name: str
+    root: Path
+    web_prefix: str
+    size: Tuple[int, int]
+
+
+PROFILES: Dict[str, ImageProfile] = {
+    "avatar": ImageProfile(
+        "avatar", Path("static/uploads/avatars"), "/static/uploads/avatars",
+        (settings.AVATAR_SIZE, settings.AVATAR_SIZE)
+    ),
+    "cover": ImageProfile(
+        "cover", Path("static/uploads/covers"), "/static/uploads/covers",
+        (settings.COVER_SIZE[0], settings.COVER_SIZE[1])
+    ),
+}
+
+
+def read_upload(file) -> bytes:
+    """
+    读取上传的图片 (超过 IMAGE_UPLOAD_MAX_BYTES 时不再继续读)
+
+    Raises:
+        ValueError: 文件为空或过大
+    """
+    data = file.read(settings.IMAGE_UPLOAD_MAX_BYTES + 1)
+    if not data:
+        raise ValueError("文件为空")
+    if len(data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValueError(f"图片过大 (最大 {settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)} MB)")
+    return data
+
+
+def _decode(data: bytes, size: Tuple[int, int]):
+    """解码并按 EXIF 方向摆正，返回 RGB 图像 (透明背景铺白)"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+            raise ValueError("图片分辨率过大")
+        # JPEG 可以在解码时直接按 1/2 ~ 1/8 缩小，手机大图解码快很多；
+        # 按最长边请求，旋转之后两个方向都仍不小于目标尺寸
+        edge = max(size)
+        image.draft("RGB", (edge, edge))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("无法识别的图片文件")
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, fmt: str) -> bytes:
+    """编码时不带 EXIF / ICC 等元数据"""
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=settings.IMAGE_WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, "JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def save_image(data: bytes, kind: str) -> str:
+    """
+    规范化并保存用户图片：解码 -> 摆正 -> 居中裁剪到固定尺寸 -> WebP + JPEG
+
+    文件名是 (尺寸 / 质量参数 + 原始字节) 的哈希，同一张图重复上传时直接复用已有文件，不再解码
+
+    Returns:
+        str: IMAGE_PRIMARY_FORMAT 格式的 web 路径 (另一种格式同名，扩展名不同)
+
+    Raises:
+        ValueError: 图片无法识别或过大
+    """
+    from PIL import Image, ImageOps
+
+    profile = PROFILES[kind]
+    width, height = profile.size
+    params = f"{kind}:{width}x{height}:{settings.IMAGE_WEBP_QUALITY}:{settings.IMAGE_JPEG_QUALITY}\n"
+    digest = hashlib.sha256(params.encode() + data).hexdigest()[:32]
+
+    paths = {fmt: profile.root / f"{digest}{ext}" for fmt, ext in FORMAT_EXTENSIONS.items()}
+    if all(path.exists() for path in paths.values()):
+        for path in paths.values():
+            os.utime(path)
+    else:
+        image = ImageOps.fit(_decode(data, profile.size), profile.size, method=Image.LANCZOS)
+        for fmt, path in paths.items():
+            _write(path, _encode(image, fmt))
+
+    primary = settings.IMAGE_PRIMARY_FORMAT if settings.IMAGE_PRIMARY_FORMAT in FORMAT_EXTENSIONS else "jpeg"
+    return f"{profile.web_prefix}/{digest}{FORMAT_EXTENSIONS[primary]}"
+
+
+def _managed_file(url: str | None) -> Tuple[ImageProfile, Path] | None:
+    """url 属于头像 / 背景图目录时返回 (profile, 磁盘路径)，默认图等其他路径返回 None"""
+    if not url:
+        return None
+    for profile in PROFILES.values():
+        if url.startswith(profile.web_prefix + "/"):
+            return profile, profile.root / Path(url).name
+    return None
+
+
+def _sibling_files(path: Path) -> Set[Path]:
+    """同一张图的全部格式 (旧版上传的文件只有自身)"""
+    return {path} | {path.with_suffix(ext) for ext in FORMAT_EXTENSIONS.values()}
+
+
+def _recently_touched(path: Path) -> bool:
+    try:
+        return time.time() - path.stat().st_mtime < GC_GRACE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def release_image(session: Session, url: str | None) -> int:
+    """
+    用户换图后回收旧文件：没有任何用户再引用时删除 (内容去重后同一文件可能被多人共用)
+
+    Returns:
+        int: 删除的文件数
+    """
+    managed = _managed_file(url)
+    if managed is None:
+        return 0
+    profile, path = managed
+
+    files = _sibling_files(path)
+    urls = [f"{profile.web_prefix}/{f.name}" for f in files]
+    in_use = session.exec(
+        select(func.count()).select_from(User).where(
+            or_(User.avatar_url.in_(urls), User.cover_url.in_(urls))
+        )
+    ).one()
+    if in_use or any(_recently_touched(f) for f in files):
+        return 0
+
+    removed = 0
+    for f in files:
+        try:
+            f.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def collect_garbage(session: Session) -> int:
+    """
+    全量回收：删除头像 / 背景图目录中没有任何用户引用的文件
+    (包括旧版按 user_id + uuid 保存的原图)
+
+    Returns:
+        int: 删除的文件数
+    """
+    referenced: Set[Path] = set()
+    for avatar_url, cover_url in session.exec(select(User.avatar_url, User.cover_url)).all():
+        for url in (avatar_url, cover_url):
+            managed = _managed_file(url)
+            if managed is not None:
+                referenced |= _sibling_files(managed[1])
+
+    removed = 0
+    for profile in PROFILES.values():
+        if not profile.root.exists():
+            continue
+        for f in profile.root.iterdir():
+            if not f.is_file() or f in referenced or _recently_touched(f):
+                continue
+            f.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    # 回收无人引用的头像 / 背景图：python -m app.core.images gc
+    if sys.argv[1:] != ["gc"]:
+        print("用法: python -m app.core.images gc")
+        sys.exit(2)
+    with Session(engine) as session:
+        count = collect_garbage(session)
+    print(f"图片回收完成，删除 {count} 个文件")
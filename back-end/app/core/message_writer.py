@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.crud import crud_chat
+from app.database import async_session_maker
+from app.models import Message
+
+
+class MessageWriter:
+    """
+    私信批量写入：
+    - 每条消息进入队列，由单个写入协程攒批 (最多 batch_size 条或等待 batch_window 秒)
+    - 一批消息使用一个短生命周期的 AsyncSession、一次事务提交 (连同会话摘要)
+    - 调用方 await 返回的 future 即可拿到带 id 的 Message
+
+    同一时刻只有一个写事务，突发消息不会在 SQLite 写锁上互相排队。
+    """
+
+    def __init__(self, batch_size: int, batch_window: float):
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, sender_id: int, receiver_id: int, content: str) -> asyncio.Future:
+        """加入写入队列 (不等待)，返回写入完成后得到 Message 的 future"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+        user_low_id, user_high_id = crud_chat.pair_key(sender_id, receiver_id)
+        msg = Message(
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            user_low_id=user_low_id,
+            user_high_id=user_high_id,
+            content=content,
+            created_at=datetime.utcnow(),
+            is_read=False
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((msg, future))
+        return future
+
+    async def save(self, sender_id: int, receiver_id: int, content: str) -> Message:
+        return await self.submit(sender_id, receiver_id, content)
+
+    async def close(self):
+        """写完队列中剩余的消息后退出"""
+        if self._task is None or self._task.done():
+            return
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch: List[Tuple[Message, asyncio.Future]] = [item]
+            stop = False
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._write(batch)
+            if stop:
+                return
+
+    async def _write(self, batch: List[Tuple[Message, asyncio.Future]]):
+        try:
+            async with async_session_maker() as session:
+                messages = [msg for msg, _ in batch]
+                session.add_all(messages)
+                await session.flush()
+                await crud_chat.record_messages(session, messages)
+                await session.commit()
+        except Exception as e:
+            print(f"消息写入失败 ({len(batch)} 条): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for msg, future in batch:
+            if not future.done():
+                future.set_result(msg)
+
+
+# 全局单例
+message_writer = MessageWriter(
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    batch_window=settings.CHAT_WRITE_BATCH_WINDOW
+)
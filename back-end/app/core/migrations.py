@@ -0,0 +1,317 @@
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, case, create_engine, delete, insert, inspect, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, func, or_, and_
+
+from app.database import engine, DATABASE_BACKEND
+from app.models import (
+    Comment, CommunityPost, Conversation, DownloadRecord, ExportJob, InteractionLike, Message, ModelAsset,
+    SchemaMigration, TimelineEntry, TrainingJob, UserFollow
+)
+
+
+# =============================================================================
+# 数据库迁移
+# create_all 只会创建缺失的表，不会给已存在的表补列或补索引。
+# 对已有表的结构变更在这里按版本号追加一条迁移，init_db 启动时执行尚未执行的迁移，
+# 版本号记录在 SchemaMigration 表中。迁移函数应可重复执行 (checkfirst)。
+# 迁移只能写死当时的索引名 / 列名，不能读取模型当前的声明 (模型之后会变，旧迁移必须保持原样)。
+# =============================================================================
+
+def _create_indexes(conn: Connection, model, *indexes: Tuple[str, ...]):
+    """按 (索引名, 列名...) 创建库里还不存在的索引"""
+    table_name = model.__table__.name
+    for name, *columns in indexes:
+        # 独立的 Table 对象，不往模型的 metadata 里注册索引
+        table = Table(table_name, MetaData(), *(Column(c) for c in columns))
+        Index(name, *(table.c[c] for c in columns)).create(conn, checkfirst=True)
+
+
+def _feed_indexes(conn: Connection):
+    # 社区流游标分页 / 粉丝时间线
+    _create_indexes(
+        conn, CommunityPost,
+        ("ix_communitypost_published_at_id", "published_at", "id"),
+        ("ix_communitypost_visibility_published_at", "visibility", "published_at"),
+        ("ix_communitypost_user_published_at", "user_id", "published_at"),
+    )
+    _create_indexes(
+        conn, TimelineEntry,
+        ("ix_timelineentry_user_published_at", "user_id", "published_at", "post_id"),
+        ("ix_timelineentry_author_id", "author_id"),
+    )
+
+
+def _hot_path_indexes(conn: Connection):
+    # crud_post / crud_asset / chat 的热点查询
+    _create_indexes(conn, UserFollow, ("ix_userfollow_followed_follower", "followed_id", "follower_id"))
+    _create_indexes(conn, InteractionLike, ("ix_interactionlike_post_id", "post_id"))
+    _create_indexes(conn, ModelAsset, ("ix_modelasset_user_created_at", "user_id", "created_at"))
+    _create_indexes(conn, CommunityPost, ("ix_communitypost_asset_id", "asset_id"))
+    _create_indexes(
+        conn, Comment,
+        ("ix_comment_post_created_at", "post_id", "created_at"),
+        ("ix_comment_user_post", "user_id", "post_id"),
+    )
+    _create_indexes(
+        conn, DownloadRecord,
+        ("ix_downloadrecord_user_asset_created_at", "user_id", "asset_id", "created_at"),
+    )
+    _create_indexes(
+        conn, Message,
+        ("ix_message_sender_receiver_created_at", "sender_id", "receiver_id", "created_at"),
+        ("ix_message_receiver_sender_is_read", "receiver_id", "sender_id", "is_read"),
+    )
+
+
+def _add_columns(conn: Connection, model, *names: str):
+    """给已存在的表补列 (ALTER TABLE ADD COLUMN，列必须可为空)"""
+    table = model.__table__
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+
+
+def _pair_columns(conn: Connection):
+    """Message 增加会话对列，聊天记录改为 (会话对, id) 游标分页"""
+    _add_columns(conn, Message, "user_low_id", "user_high_id")
+    conn.execute(
+        update(Message)
+        .where(Message.user_low_id == None)
+        .values(
+            user_low_id=case((Message.sender_id <= Message.receiver_id, Message.sender_id), else_=Message.receiver_id),
+            user_high_id=case((Message.sender_id <= Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+        )
+    )
+    _create_indexes(conn, Message, ("ix_message_pair_id", "user_low_id", "user_high_id", "id"))
+
+
+def _asset_thumbnails(conn: Connection):
+    """ModelAsset 增加封面缩略图列 (旧资产用 python -m app.core.thumbnails 补生成)"""
+    _add_columns(conn, ModelAsset, "thumbnails")
+
+
+def _asset_snapshot_hash(conn: Connection):
+    """ModelAsset 增加快照哈希列 (导出缓存的 key，为空时由导出任务补算)"""
+    _add_columns(conn, ModelAsset, "snapshot_hash")
+
+
+def _training_job_lease(conn: Connection):
+    """TrainingJob 增加租约列 (旧的 RUNNING 任务没有心跳，启动时按租约过期处理)"""
+    _add_columns(conn, TrainingJob, "owner_id", "heartbeat_at")
+
+
+def _export_job_lease(conn: Connection):
+    """ExportJob 增加租约列"""
+    _add_columns(conn, ExportJob, "owner_id", "heartbeat_at")
+
+
+def _conversation_summary(conn: Connection):
+    """由历史消息重建会话摘要表"""
+    low = case((Message.sender_id <= Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    high = case((Message.sender_id <= Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+
+    def unread_for(side):
+        return func.sum(case((and_(Message.receiver_id == side, Message.is_read == False), 1), else_=0))
+
+    rows = (
+        select(low, high, func.max(Message.id), func.max(Message.created_at), unread_for(low), unread_for(high))
+        .group_by(low, high)
+    )
+    conn.execute(delete(Conversation))
+    conn.execute(insert(Conversation).from_select(
+        ["user_low_id", "user_high_id", "last_message_id", "last_message_time", "unread_low", "unread_high"],
+        rows
+    ))
+    # last_message_time 以最后一条消息为准
+    conn.execute(update(Conversation).values(
+        last_message_time=select(Message.created_at)
+        .where(Message.id == Conversation.last_message_id)
+        .scalar_subquery()
+    ))
+
+
+# (版本号, 名称, 迁移函数)，只能在末尾追加
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "feed_indexes", _feed_indexes),
+    (2, "hot_path_indexes", _hot_path_indexes),
+    (3, "conversation_summary", _conversation_summary),
+    (4, "message_pair_columns", _pair_columns),
+    (5, "asset_thumbnails", _asset_thumbnails),
+    (6, "asset_snapshot_hash", _asset_snapshot_hash),
+    (7, "training_job_lease", _training_job_lease),
+    (8, "export_job_lease", _export_job_lease),
+]
+
+
+def run_migrations(bind: Engine = engine) -> int:
+    """
+    按版本号顺序执行尚未执行的迁移，每条迁移在独立事务中执行
+
+    Returns:
+        int: 本次执行的迁移数
+    """
+    SchemaMigration.__table__.create(bind, checkfirst=True)
+    with Session(bind) as session:
+        applied = set(session.exec(select(SchemaMigration.version)).all())
+
+    count = 0
+    for version, name, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with bind.begin() as conn:
+                upgrade(conn)
+                conn.execute(insert(SchemaMigration).values(
+                    version=version, name=name, applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # 多个进程同时启动：其他进程已经执行并记录了这条迁移
+            continue
+        print(f"数据库迁移 {version:03d}_{name} 完成")
+        count += 1
+    return count
+
+
+# =============================================================================
+# 查询计划检查
+# =============================================================================
+
+def _hot_queries() -> dict:
+    """与 crud_post / crud_asset / chat 中热点查询形状一致的语句 (参数取任意值)"""
+    me, other = 1, 2
+    return {
+        "我的模型": (
+            select(ModelAsset)
+            .where(ModelAsset.user_id == me)
+            .order_by(ModelAsset.created_at.desc())
+        ),
+        "下载历史": (
+            select(DownloadRecord.asset_id, func.max(DownloadRecord.created_at))
+            .where(DownloadRecord.user_id == me)
+            .group_by(DownloadRecord.asset_id)
+        ),
+        "资产是否已发布": select(CommunityPost).where(CommunityPost.asset_id == me),
+        "用户主页帖子": (
+            select(CommunityPost)
+            .where(CommunityPost.user_id == me)
+            .order_by(CommunityPost.published_at.desc())
+        ),
+        "帖子评论": (
+            select(Comment)
+            .where(Comment.post_id == me)
+            .order_by(Comment.created_at.desc())
+        ),
+        "我评论过的帖子": select(Comment.post_id).where(Comment.user_id == me).distinct(),
+        "粉丝列表": select(UserFollow.follower_id).where(UserFollow.followed_id == me),
+        "帖子点赞数": select(func.count()).select_from(InteractionLike).where(InteractionLike.post_id == me),
+        "聊天记录": (
+            select(Message)
+            .where(Message.user_low_id == me, Message.user_high_id == other, Message.id < 1000)
+            .order_by(Message.id.desc())
+            .limit(50)
+        ),
+        "收件箱": (
+            select(Conversation)
+            .where(or_(Conversation.user_low_id == me, Conversation.user_high_id == me))
+            .order_by(Conversation.last_message_time.desc())
+        ),
+        "未读消息": select(Message).where(
+            Message.sender_id == other,
+            Message.receiver_id == me,
+            Message.is_read == False
+        ),
+    }
+
+
+def check_query_plans(bind: Engine = engine) -> List[str]:
+    """
+    对热点查询执行 EXPLAIN QUERY PLAN (仅 SQLite)
+
+    Returns:
+        List[str]: 出现全表扫描的查询名称
+    """
+    if DATABASE_BACKEND != "sqlite":
+        print(f"查询计划检查只支持 SQLite，当前为 {DATABASE_BACKEND}")
+        return []
+
+    full_scans = []
+    with bind.connect() as conn:
+        for name, statement in _hot_queries().items():
+            sql = str(statement.compile(bind, compile_kwargs={"literal_binds": True}))
+            details = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            # "SCAN message" 是全表扫描；"SCAN ... USING (COVERING) INDEX" 是索引扫描
+            scans = [d for d in details if d.startswith("SCAN") and "INDEX" not in d]
+            if scans:
+                full_scans.append(name)
+            print(f"[{'全表扫描' if scans else 'OK'}] {name}: {' | '.join(details)}")
+    return full_scans
+
+
+# =============================================================================
+# 升级检查
+# =============================================================================
+
+BASELINE_SCHEMA = Path(__file__).with_name("baseline_schema.sql")
+
+
+def check_upgrade() -> List[str]:
+    """
+    在临时 SQLite 库中建出首个版本的表结构，按 init_db 的顺序 (create_all + 全部迁移) 升级，
+    再与当前模型比对
+
+    Returns:
+        List[str]: 升级后缺失的列 / 索引
+    """
+    from app import models  # noqa: F401  注册全部表
+
+    with tempfile.TemporaryDirectory(prefix="migrate-") as tmp:
+        bind = create_engine(f"sqlite:///{Path(tmp) / 'baseline.db'}")
+        try:
+            with bind.begin() as conn:
+                for statement in BASELINE_SCHEMA.read_text(encoding="utf-8").split(";"):
+                    lines = [line for line in statement.splitlines() if not line.startswith("--")]
+                    if "".join(lines).strip():
+                        conn.exec_driver_sql("\n".join(lines))
+
+            SQLModel.metadata.create_all(bind)
+            run_migrations(bind)
+
+            missing = []
+            inspector = inspect(bind)
+            for table in SQLModel.metadata.sorted_tables:
+                columns = {c["name"] for c in inspector.get_columns(table.name)}
+                missing += [f"{table.name}.{c.name}" for c in table.columns if c.name not in columns]
+                indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+                missing += [f"{table.name}: {i.name}" for i in table.indexes if i.name not in indexes]
+        finally:
+            bind.dispose()
+
+    for item in missing:
+        print(f"[缺失] {item}")
+    print("升级检查通过" if not missing else f"升级检查失败，缺失 {len(missing)} 项")
+    return missing
+
+
+if __name__ == "__main__":
+    # 执行迁移：python -m app.core.migrations
+    # 检查查询计划：python -m app.core.migrations explain (有全表扫描时返回码为 1)
+    # 检查旧库升级：python -m app.core.migrations check-upgrade (有缺失时返回码为 1)
+    if sys.argv[1:] == ["explain"]:
+        sys.exit(1 if check_query_plans() else 0)
+    if sys.argv[1:] == ["check-upgrade"]:
+        sys.exit(1 if check_upgrade() else 0)
+
+    count = run_migrations()
+    print(f"数据库迁移完成，本次执行 {count} 条")
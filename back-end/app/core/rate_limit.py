@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from app.core.config import settings
+
+
+class SlidingWindowLimiter:
+    """
+    滑动窗口限流：每个 key 在 window 秒内最多 limit 次
+    只在本进程内计数 (多 worker 时每个进程各自限流)
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._hits: Dict[str, Deque[float]] = {}
+
+    def hit(self, key: str) -> float:
+        """
+        记录一次访问
+
+        Returns:
+            float: 0 表示放行，否则为需要等待的秒数
+        """
+        if self.limit <= 0:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.max_keys:
+                    self._purge(now)
+                hits = self._hits[key] = deque()
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0.0
+
+    def reset(self, key: str):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _purge(self, now: float):
+        """清理窗口内已无记录的 key"""
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+
+# 全局单例：登录 / 注册限流 (在计算密码哈希之前检查，撞库请求不会占满哈希线程池)
+login_ip_limiter = SlidingWindowLimiter(settings.LOGIN_RATE_LIMIT_PER_IP, settings.LOGIN_RATE_WINDOW)
+login_user_limiter = SlidingWindowLimiter(settings.LOGIN_RATE_LIMIT_PER_USER, settings.LOGIN_RATE_WINDOW)
@@ -0,0 +1,333 @@
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.process_manager.utils import ExternalCommandRunner
+from app.window_controller.render_client import RenderClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _free_port() -> int:
+    """向系统申请一个空闲的本地端口 (渲染服务控制连接)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# 本仓库自带的渲染服务脚本 (同目录有 common.py)
+_BUNDLED_RENDER_SCRIPT = Path(__file__).resolve().parents[2] / "scripts" / "render_server.py"
+
+
+def _render_script() -> str:
+    """未设置 NGP_RENDER_SCRIPT_PATH 时使用本仓库的 scripts/render_server.py"""
+    return os.getenv("NGP_RENDER_SCRIPT_PATH") or str(_BUNDLED_RENDER_SCRIPT)
+
+
+def resolve_render_paths(model_path: str) -> Tuple[Path, Path]:
+    """
+    由资产的 model_path (static/... 相对路径) 推出渲染所需的 (scene_path, snapshot_path)
+
+    Raises:
+        ValueError: model_path 不以 static 开头
+        FileNotFoundError: snapshot 或场景数据不存在
+    """
+    parts = Path(model_path).parts
+    if not parts or parts[0].lower() != "static":
+        raise ValueError(f"model_path 不合法(必须 static 开头): {model_path}")
+
+    snapshot_path = Path("static").resolve() / Path(*parts[1:])
+    if not snapshot_path.exists():
+        raise FileNotFoundError(f"模型文件丢失: {snapshot_path}")
+
+    asset_dir = snapshot_path.parent
+    scene_path = asset_dir / f"{asset_dir.name}_scene"
+    if not scene_path.exists():
+        # 兼容 transforms.json 直接放在资产目录的情况
+        if (asset_dir / "transforms.json").exists():
+            scene_path = asset_dir
+        else:
+            raise FileNotFoundError("场景数据丢失 (transforms.json)")
+
+    return scene_path, snapshot_path
+
+
+class WarmRenderer:
+    """池中的一个常驻渲染进程"""
+
+    def __init__(self):
+        self.port = _free_port()
+        self.client = RenderClient(self.port)
+        self.runner: Optional[ExternalCommandRunner] = None
+
+        self.snapshot_path: str | None = None  # 当前驻留的快照
+        self.resident_bytes = 0
+        self.last_used = 0.0
+        self.in_use = False  # 被推流会话占用
+        self.loading = False  # 正在预加载
+
+    def is_alive(self) -> bool:
+        """进程在运行且控制连接可用 (请求超时后连接会被关闭，需要重启)"""
+        return self.runner is not None and self.runner.is_running() and self.client.connected
+
+    def to_dict(self) -> dict:
+        return {
+            "port": self.port,
+            "alive": self.is_alive(),
+            "snapshot_path": self.snapshot_path,
+            "resident_bytes": self.resident_bytes,
+            "in_use": self.in_use,
+            "loading": self.loading,
+        }
+
+
+class RendererPool:
+    """
+    预热的渲染进程池：
+    - 启动时预先拉起 size 个 render_server.py (Python 解释器 + pyngp/CUDA 初始化只做一次)
+    - 进程空闲时保留最近使用的快照，同一资产再次预览时直接开始推流，无需重新加载
+    - 驻留快照总大小超过 memory_budget 时按 LRU 卸载空闲进程中的快照
+    - 打开帖子详情时可预取 (prefetch) 快照到空闲进程
+
+    显存占用以快照文件大小近似估算。
+    """
+
+    def __init__(self, size: int, memory_budget: int, ready_timeout: int):
+        self.size = max(1, size)
+        self.memory_budget = memory_budget
+        self.ready_timeout = ready_timeout
+
+        self._renderers: List[WarmRenderer] = []
+        self._cond = threading.Condition()
+        self._started = False
+
+    # -------------------------------------------------------------------------
+    # 生命周期
+    # -------------------------------------------------------------------------
+    def start(self):
+        """后台预热全部进程，不阻塞服务启动"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def shutdown(self):
+        with self._cond:
+            renderers = list(self._renderers)
+            self._renderers.clear()
+            self._started = False
+        for renderer in renderers:
+            self._kill(renderer)
+
+    def stats(self) -> List[dict]:
+        with self._cond:
+            return [r.to_dict() for r in self._renderers]
+
+    # -------------------------------------------------------------------------
+    # 对外接口
+    # -------------------------------------------------------------------------
+    def acquire(self, scene_path: str, snapshot_path: str) -> WarmRenderer:
+        """
+        取得一个已加载 snapshot_path 的渲染进程 (独占，用完必须 release)
+
+        Raises:
+            RuntimeError: 没有可用进程或加载失败
+        """
+        deadline = time.time() + self.ready_timeout
+        with self._cond:
+            while True:
+                renderer, hot = self._pick(snapshot_path)
+                if renderer is not None:
+                    renderer.in_use = True
+                    break
+                # 同一快照正在预取 / 进程全忙：等待释放
+                if time.time() >= deadline:
+                    raise RuntimeError("没有空闲的渲染进程")
+                self._cond.wait(timeout=0.5)
+
+        try:
+            if not renderer.is_alive():
+                self._spawn(renderer)
+                hot = False
+            if hot:
+                print(f"[RendererPool] 命中驻留快照: {snapshot_path}")
+            # 已驻留时 load 只把相机复位到初始视角
+            self._load(renderer, scene_path, snapshot_path)
+        except Exception:
+            with self._cond:
+                renderer.in_use = False
+                self._cond.notify_all()
+            raise
+        return renderer
+
+    def release(self, renderer: WarmRenderer):
+        """推流结束：停止编码但保留快照驻留"""
+        try:
+            if renderer.is_alive():
+                renderer.client.request({"cmd": "unstream"}, timeout=10)
+        except RuntimeError as e:
+            print(f"[RendererPool] 停止推流失败，重启进程: {e}")
+            self._kill(renderer)
+
+        with self._cond:
+            renderer.in_use = False
+            renderer.last_used = time.time()
+            self._cond.notify_all()
+        self._enforce_budget()
+
+    def prefetch(self, scene_path: str, snapshot_path: str):
+        """把快照预加载到一个空闲进程 (不阻塞调用方)"""
+        with self._cond:
+            if not self._started:
+                return
+            for r in self._renderers:
+                if r.snapshot_path == snapshot_path:
+                    r.last_used = time.time()
+                    return
+            idle = [r for r in self._renderers if not r.in_use and not r.loading and r.is_alive()]
+            if not idle:
+                return
+            renderer = min(idle, key=lambda r: (r.snapshot_path is not None, r.last_used))
+            renderer.loading = True
+            renderer.snapshot_path = snapshot_path  # 占位，避免重复预取
+
+        def _run():
+            try:
+                self._load(renderer, scene_path, snapshot_path)
+                print(f"[RendererPool] 预取完成: {snapshot_path}")
+            except Exception as e:
+                print(f"[RendererPool] 预取失败: {e}")
+                renderer.snapshot_path = None
+                renderer.resident_bytes = 0
+            finally:
+                with self._cond:
+                    renderer.loading = False
+                    renderer.last_used = time.time()
+                    self._cond.notify_all()
+                self._enforce_budget()
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    # -------------------------------------------------------------------------
+    # 内部
+    # -------------------------------------------------------------------------
+    def _pick(self, snapshot_path: str) -> Tuple[Optional[WarmRenderer], bool]:
+        """在锁内选择进程，返回 (renderer, 是否已驻留该快照)"""
+        free = [r for r in self._renderers if not r.in_use and not r.loading]
+
+        for r in free:
+            if r.snapshot_path == snapshot_path and r.is_alive():
+                return r, True
+
+        # 同一快照正在预取，等它完成比重新加载更快
+        if any(r.loading and r.snapshot_path == snapshot_path for r in self._renderers):
+            return None, False
+
+        if free:
+            # 优先空进程，其次最久未使用的
+            return min(free, key=lambda r: (r.is_alive(), r.snapshot_path is not None, r.last_used)), False
+
+        if len(self._renderers) < self.size:
+            renderer = WarmRenderer()
+            self._renderers.append(renderer)
+            return renderer, False
+
+        return None, False
+
+    def _warm_up(self):
+        for _ in range(self.size):
+            with self._cond:
+                if not self._started or len(self._renderers) >= self.size:
+                    return
+                renderer = WarmRenderer()
+                renderer.loading = True
+                self._renderers.append(renderer)
+            try:
+                self._spawn(renderer)
+            except RuntimeError as e:
+                print(f"[RendererPool] 预热失败: {e}")
+            finally:
+                with self._cond:
+                    renderer.loading = False
+                    self._cond.notify_all()
+        print(f"[RendererPool] 预热完成: {len(self._renderers)} 个渲染进程")
+
+    def _spawn(self, renderer: WarmRenderer):
+        """启动 (或重启) 渲染进程并等待就绪"""
+        self._kill(renderer)
+        cmd = [
+            os.getenv("NGP_PYTHON_PATH"), _render_script(),
+            "--port", str(renderer.port),
+            "--width", str(settings.STREAM_WIDTH),
+            "--height", str(settings.STREAM_HEIGHT),
+            "--fps", str(settings.STREAM_FPS),
+            "--spp", str(settings.STREAM_SPP),
+        ]
+        renderer.runner = ExternalCommandRunner(cmd)
+        if not renderer.runner.start():
+            raise RuntimeError("渲染服务启动失败")
+        if not renderer.client.connect(self.ready_timeout, renderer.runner.is_running):
+            self._kill(renderer)
+            raise RuntimeError("渲染服务未就绪 (超时或进程退出)")
+
+    def _load(self, renderer: WarmRenderer, scene_path: str, snapshot_path: str):
+        start = time.time()
+        renderer.client.request(
+            {"cmd": "load", "scene": scene_path, "snapshot": snapshot_path},
+            timeout=self.ready_timeout
+        )
+        renderer.snapshot_path = snapshot_path
+        renderer.resident_bytes = os.path.getsize(snapshot_path)
+        print(f"[RendererPool] 加载快照 {snapshot_path} 耗时 {time.time() - start:.2f}s")
+
+    def _kill(self, renderer: WarmRenderer):
+        renderer.client.close()
+        if renderer.runner is not None:
+            renderer.runner.stop()
+            renderer.runner = None
+        renderer.snapshot_path = None
+        renderer.resident_bytes = 0
+
+    def _enforce_budget(self):
+        """驻留总量超出预算时，按 LRU 卸载空闲进程中的快照"""
+        victims = []
+        with self._cond:
+            total = sum(r.resident_bytes for r in self._renderers)
+            idle = sorted(
+                (r for r in self._renderers if not r.in_use and not r.loading and r.snapshot_path),
+                key=lambda r: r.last_used
+            )
+            for r in idle:
+                if total <= self.memory_budget:
+                    break
+                total -= r.resident_bytes
+                r.loading = True
+                victims.append(r)
+
+        for r in victims:
+            try:
+                r.client.request({"cmd": "unload"}, timeout=10)
+                print(f"[RendererPool] 卸载快照 {r.snapshot_path} ({r.resident_bytes} bytes)")
+                r.snapshot_path = None
+                r.resident_bytes = 0
+            except RuntimeError as e:
+                print(f"[RendererPool] 卸载失败，结束进程: {e}")
+                self._kill(r)
+            finally:
+                with self._cond:
+                    r.loading = False
+                    self._cond.notify_all()
+
+
+# 全局单例
+renderer_pool = RendererPool(
+    size=max(settings.STREAM_RENDERER_POOL_SIZE, settings.STREAM_MAX_SESSIONS),
+    memory_budget=settings.STREAM_RENDERER_MEMORY_BUDGET,
+    ready_timeout=settings.STREAM_RENDER_READY_TIMEOUT
+)
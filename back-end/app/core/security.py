@@ -1,11 +1,63 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
-from jose import jwt
+from typing import Any, Optional, Tuple, Union
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
 # 密码加密配置
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# PASSWORD_SCHEMES 第一个用于新密码，其余只用于校验旧哈希；
+# deprecated="auto" 使旧算法 / 旧成本参数的哈希在登录成功后被重新计算
+pwd_context = CryptContext(
+    schemes=settings.PASSWORD_SCHEMES,
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+
+class HashPoolBusy(Exception):
+    """哈希线程池排队已满"""
+
+
+class PasswordHasher:
+    """
+    专用的密码哈希线程池：
+    - 哈希计算不占用 Starlette 默认线程池，登录高峰不会拖慢其他同步接口
+    - 排队数超过 queue_size 时直接拒绝 (HashPoolBusy)，而不是无限堆积
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.limit = max(1, workers) + max(0, queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.limit:
+                raise HashPoolBusy()
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# 全局单例
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE
+)
+
 
 def create_access_token(subject: Union[str, Any]) -> str:
     """生成 JWT Token"""
@@ -14,10 +66,55 @@ def create_access_token(subject: Union[str, Any]) -> str:
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_download_token(user_id: int, asset_id: int) -> str:
+    """生成资产打包下载链接用的短期 Token (只能下载该资产，不能用于其他接口)"""
+    expire = datetime.utcnow() + timedelta(seconds=settings.BUNDLE_LINK_TTL)
+    to_encode = {"exp": expire, "sub": str(user_id), "asset": asset_id, "scope": "bundle"}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def verify_download_token(token: str, asset_id: int) -> Optional[int]:
+    """校验打包下载 Token，返回用户 ID，无效或不属于该资产时返回 None"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("scope") != "bundle" or payload.get("asset") != asset_id:
+        return None
+    try:
+        return int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码是否正确"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """将明文密码转换成哈希值"""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if hashed_password is None:
+        # 用户不存在时同样做一次哈希，避免通过响应时间枚举用户名
+        pwd_context.dummy_verify()
+        return False, None
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    在哈希线程池中校验密码
+
+    Returns:
+        (是否正确, 新哈希)：旧算法 / 旧成本参数时返回新哈希，调用方应写回数据库，否则为 None
+
+    Raises:
+        HashPoolBusy: 排队已满
+    """
+    return await password_hasher.run(_verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """在哈希线程池中计算密码哈希 (Raises: HashPoolBusy)"""
+    return await password_hasher.run(get_password_hash, password)
@@ -1,27 +1,276 @@
-from typing import Dict
+import asyncio
+import json
+import os
+import threading
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
 from fastapi import WebSocket
 
+from app.core.config import settings
+
+# 背板收到消息后的回调：(user_id, message)
+DeliverHandler = Callable[[int, str], Awaitable[None]]
+
+
+# =============================================================================
+# 背板 (Backplane)
+# 多个 uvicorn worker 各自持有一部分 WebSocket 连接，推送消息先发布到背板，
+# 每个 worker 收到后投递给本进程内该用户的连接。
+# =============================================================================
+
+class InMemoryBackplane:
+    """进程内背板：只有一个 worker 时使用，发布即投递"""
+
+    shared = False
 
-class ConnectionManager:
     def __init__(self):
+        self._handler: Optional[DeliverHandler] = None
+
+    async def start(self, handler: DeliverHandler):
+        self._handler = handler
+
+    async def publish(self, user_id: int, message: str):
+        if self._handler is not None:
+            await self._handler(user_id, message)
+
+    def publish_sync(self, user_id: int, message: str):
+        """进程内背板没有订阅者可投递，事件循环之外的发布直接忽略"""
+
+    async def close(self):
+        self._handler = None
+
+
+class RedisBackplane:
+    """
+    Redis Pub/Sub 背板 (兼容 Redis 协议的服务均可，如 KeyDB / Valkey)
+    所有 worker 订阅同一频道，消息体为 {"user_id": ..., "message": ...}
+    """
+
+    shared = True
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        # 同步客户端：供没有事件循环的进程 (如独立训练调度进程) 发布消息
+        self._sync_redis = None
+        self._sync_lock = threading.Lock()
+
+    async def start(self, handler: DeliverHandler):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("WS_BACKPLANE_URL 需要安装 redis (pip install redis)")
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(handler))
+        print(f"WebSocket 背板已连接: {self.url} ({self.channel})")
+
+    async def _listen(self, handler: DeliverHandler):
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        payload = json.loads(item["data"])
+                        await handler(int(payload["user_id"]), payload["message"])
+                    except (ValueError, KeyError, TypeError) as e:
+                        print(f"背板消息格式错误: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 连接断开：稍后重新订阅
+                print(f"背板订阅中断，重连中: {e}")
+                await asyncio.sleep(1)
+                try:
+                    await self._pubsub.subscribe(self.channel)
+                except Exception:
+                    pass
+
+    async def publish(self, user_id: int, message: str):
+        await self._redis.publish(self.channel, json.dumps({"user_id": user_id, "message": message}))
+
+    def publish_sync(self, user_id: int, message: str):
+        """在任意线程中同步发布 (不需要事件循环，也不需要先 start)"""
+        with self._sync_lock:
+            if self._sync_redis is None:
+                try:
+                    import redis
+                except ImportError:
+                    raise RuntimeError("WS_BACKPLANE_URL 需要安装 redis (pip install redis)")
+                self._sync_redis = redis.from_url(self.url)
+        self._sync_redis.publish(self.channel, json.dumps({"user_id": user_id, "message": message}))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.close()
+        if self._redis:
+            await self._redis.close()
+        if self._sync_redis:
+            self._sync_redis.close()
 
-        self.active_connections: Dict[int, WebSocket] = {}
 
-    async def connect(self, user_id: int, websocket: WebSocket):
+def create_backplane():
+    """WS_BACKPLANE_URL 为空时使用进程内背板 (只能单 worker)"""
+    if settings.WS_BACKPLANE_URL:
+        return RedisBackplane(settings.WS_BACKPLANE_URL, settings.WS_BACKPLANE_CHANNEL)
+    return InMemoryBackplane()
+
+
+# =============================================================================
+# 连接管理
+# =============================================================================
+
+class ClientConnection:
+    """
+    一个 WebSocket 连接 (同一用户可以有多个设备同时在线)
+    - 发送走有界队列 + 独立发送协程，慢客户端不会拖住推送方
+    - 队列满或单次发送超时视为慢消费者，直接断开，由客户端重连
+    - 定时发送心跳，及时发现已断开的连接
+    """
+
+    def __init__(self, user_id: int, websocket: WebSocket, on_close: Callable[["ClientConnection"], None]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.websocket = websocket
+        self._on_close = on_close
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._tasks = []
+        self.closed = False
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+
+    def enqueue(self, message: str) -> bool:
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            print(f"用户 {self.user_id} 的连接 {self.id[:8]} 发送积压，断开")
+            asyncio.create_task(self.close(code=1013))
+            return False
+
+    async def _send_loop(self):
+        try:
+            while True:
+                message = await self._queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), settings.WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"用户 {self.user_id} 的连接 {self.id[:8]} 发送失败: {e}")
+            asyncio.create_task(self.close())
+
+    async def _heartbeat_loop(self):
+        ping = json.dumps({"type": "ping"})
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL)
+            self.enqueue(ping)
+
+    def abort(self):
+        """客户端已断开：停止发送与心跳，从管理器中移除"""
+        if self.closed:
+            return
+        self.closed = True
+        self._on_close(self)
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+
+    async def close(self, code: int = 1000):
+        """服务端主动关闭连接"""
+        if self.closed:
+            return
+        self.abort()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(self, backplane=None):
+        # user_id -> 该用户在本进程内的全部连接
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self.backplane = backplane or InMemoryBackplane()
+        # 主事件循环，供后台线程 (训练流水线等) 推送消息
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    async def start(self):
+        await self.backplane.start(self._deliver_local)
+
+    async def shutdown(self):
+        await self.backplane.close()
+        for connections in list(self.active_connections.values()):
+            for conn in list(connections):
+                await conn.close(code=1001)
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"用户 {user_id} 已连接")
+        conn = ClientConnection(user_id, websocket, self._remove)
+        self.active_connections.setdefault(user_id, set()).add(conn)
+        conn.start()
+        print(f"用户 {user_id} 已连接 (pid {os.getpid()}, 本进程连接数 {len(self.active_connections[user_id])})")
+        return conn
+
+    def disconnect(self, user_id: int, conn: ClientConnection):
+        conn.abort()
+        print(f"用户 {user_id} 已断开")
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"用户 {user_id} 已断开")
+    def _remove(self, conn: ClientConnection):
+        connections = self.active_connections.get(conn.user_id)
+        if connections is None:
+            return
+        connections.discard(conn)
+        if not connections:
+            del self.active_connections[conn.user_id]
+
+    async def _deliver_local(self, user_id: int, message: str):
+        for conn in list(self.active_connections.get(user_id, ())):
+            conn.enqueue(message)
 
     async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(message)
+        """推送给用户的所有连接 (经背板，其他 worker 上的连接也能收到)"""
+        if not self.backplane.shared and user_id not in self.active_connections:
+            return
+        await self.backplane.publish(user_id, message)
+
+    def send_personal_message_threadsafe(self, message: str, user_id: int):
+        """
+        在非事件循环线程中推送消息 (不等待发送结果)
+        事件循环未绑定 (如独立训练调度进程) 时同步发布到背板，由 Web 进程投递
+        """
+        if self.loop is None or self.loop.is_closed():
+            if not self.backplane.shared:
+                return
+            try:
+                self.backplane.publish_sync(user_id, message)
+            except Exception as e:
+                print(f"背板发布失败 (用户 {user_id}): {e}")
+            return
+        asyncio.run_coroutine_threadsafe(self.send_personal_message(message, user_id), self.loop)
 
 
 # 全局对象
-manager = ConnectionManager()
+manager = ConnectionManager(create_backplane())
@@ -0,0 +1,220 @@
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import sys
+from fnmatch import fnmatch
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Set
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.core.config import settings
+from app.core.images import PROFILES
+
+# .msgpack 默认会被猜成 text/plain
+mimetypes.add_type("application/msgpack", ".msgpack")
+
+# 内容哈希文件名：内容变了文件名一定变，可以永久缓存
+_HASHED_NAME = re.compile(r"^([0-9a-f]{32})\.[A-Za-z0-9]+$")
+
+# Accept-Encoding -> 预压缩文件后缀，按优先级排列
+PRECOMPRESSED_ENCODINGS = [("zstd", ".zst"), ("gzip", ".gz")]
+
+
+def _accepted_encodings(value: str) -> Set[str]:
+    """解析 Accept-Encoding (忽略 q=0)"""
+    accepted = set()
+    for item in value.split(","):
+        token, _, params = item.strip().partition(";")
+        if not token:
+            continue
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+@lru_cache(maxsize=1)
+def _immutable_roots() -> List[str]:
+    """按内容哈希命名文件的目录：缩略图 / 头像 / 背景图 / 导出缓存 (其他目录的 uuid 文件名不代表内容)"""
+    roots = [settings.THUMBNAIL_DIR, settings.EXPORT_CACHE_DIR] + [str(p.root) for p in PROFILES.values()]
+    return [os.path.realpath(root) for root in roots]
+
+
+def _hashed_file(full_path: str) -> Optional[str]:
+    """内容哈希目录下的哈希文件名返回哈希，否则返回 None"""
+    hashed = _HASHED_NAME.match(os.path.basename(full_path))
+    if not hashed:
+        return None
+    real = os.path.realpath(full_path)
+    if not any(real.startswith(root + os.sep) for root in _immutable_roots()):
+        return None
+    return hashed.group(1)
+
+
+def is_precompressible(path: str) -> bool:
+    name = os.path.basename(path)
+    return any(fnmatch(name, pattern) for pattern in settings.STATIC_PRECOMPRESSED_FILES)
+
+
+class AssetStaticFiles(StaticFiles):
+    """
+    /static 的文件服务：
+    - 缩略图 / 头像 / 背景图 / 导出缓存目录下的内容哈希文件名：强 ETag (即哈希本身) + Cache-Control: immutable
+    - 其他文件 (视频 / 快照等，重新训练后会被覆盖)：STATIC_CACHE_CONTROL，靠 ETag / Last-Modified 协商
+    - If-None-Match / If-Modified-Since 返回 304；Range / If-Range 由 FileResponse 处理 (视频拖动、断点续传)
+    - 存在 .zst / .gz 预压缩文件且客户端接受时直接发送压缩版本 (不带 Range 时)
+    - 配置 STATIC_ACCEL_REDIRECT_PREFIX 后只返回 X-Accel-Redirect，由 nginx 用 sendfile 发送文件
+    """
+
+    def file_response(
+            self,
+            full_path,
+            stat_result: os.stat_result,
+            scope: Scope,
+            status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+
+        headers = {}
+        digest = _hashed_file(full_path)
+        if digest:
+            headers["cache-control"] = f"public, max-age={settings.STATIC_IMMUTABLE_MAX_AGE}, immutable"
+            headers["etag"] = f'"{digest}"'
+        else:
+            headers["cache-control"] = settings.STATIC_CACHE_CONTROL
+
+        if settings.STATIC_ACCEL_REDIRECT_PREFIX:
+            return self._accel_redirect(full_path, headers, status_code)
+
+        precompressible = is_precompressible(full_path)
+        if precompressible:
+            headers["vary"] = "Accept-Encoding"
+
+        response = None
+        if precompressible and "range" not in request_headers:
+            response = self._precompressed_response(full_path, stat_result, request_headers, headers, status_code)
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _precompressed_response(
+            self,
+            full_path: str,
+            stat_result: os.stat_result,
+            request_headers: Headers,
+            headers: dict,
+            status_code: int
+    ) -> Optional[Response]:
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except FileNotFoundError:
+                continue
+            # 原文件在压缩之后被覆盖过 (重新训练)：压缩版本已过期
+            if variant_stat.st_mtime < stat_result.st_mtime:
+                continue
+
+            variant_headers = dict(headers, **{"content-encoding": encoding})
+            if "etag" in headers:
+                variant_headers["etag"] = headers["etag"][:-1] + f'-{encoding}"'
+            return FileResponse(
+                full_path + suffix,
+                status_code=status_code,
+                headers=variant_headers,
+                media_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+                stat_result=variant_stat
+            )
+        return None
+
+    def _accel_redirect(self, full_path: str, headers: dict, status_code: int) -> Response:
+        """
+        交给 nginx 发送 (sendfile / Range / 条件请求 / gzip_static 都由 nginx 处理)，例如：
+            location /_static/ { internal; alias /srv/delta3d/back-end/static/; }
+        """
+        root = os.path.realpath(self.directory)
+        relative = Path(os.path.relpath(full_path, root)).as_posix()
+        headers = dict(headers, **{"x-accel-redirect": settings.STATIC_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative})
+        content_type = mimetypes.guess_type(full_path)[0]
+        if content_type:
+            headers["content-type"] = content_type
+        return Response(status_code=status_code, headers=headers)
+
+
+def precompress(path: str | Path) -> List[str]:
+    """
+    为文件生成 .gz (以及安装了 zstandard 时的 .zst) 预压缩版本
+    压缩后反而更大的格式不保留
+
+    Returns:
+        List[str]: 生成的文件
+    """
+    path = Path(path)
+    if not path.is_file():
+        return []
+
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    size = path.stat().st_size
+    created = []
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        target = path.with_name(path.name + suffix)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        with path.open("rb") as src, tmp.open("wb") as dst:
+            if encoding == "gzip":
+                with gzip.GzipFile(filename="", mode="wb", fileobj=dst, compresslevel=6, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, 1024 * 1024)
+            elif zstandard is not None:
+                zstandard.ZstdCompressor(level=10, threads=-1).copy_stream(src, dst)
+            else:
+                tmp.unlink()
+                continue
+
+        if tmp.stat().st_size >= size:
+            tmp.unlink()
+            target.unlink(missing_ok=True)
+            continue
+        os.replace(tmp, target)
+        created.append(str(target))
+    return created
+
+
+def precompress_tree(root: str | Path) -> int:
+    """为目录下所有 STATIC_PRECOMPRESSED_FILES 匹配且没有最新压缩版本的文件生成预压缩文件"""
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if not is_precompressible(path):
+                continue
+            gz = path + ".gz"
+            if os.path.exists(gz) and os.path.getmtime(gz) >= os.path.getmtime(path):
+                continue
+            if precompress(path):
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # 为已有资产补生成预压缩文件：python -m app.core.static_files compress [目录]
+    if sys.argv[1:2] != ["compress"]:
+        print("用法: python -m app.core.static_files compress [目录]")
+        sys.exit(2)
+    target_dir = sys.argv[2] if len(sys.argv) > 2 else settings.UPLOAD_DIR
+    print(f"预压缩完成，共 {precompress_tree(target_dir)} 个文件")
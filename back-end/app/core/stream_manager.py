@@ -1,11 +1,14 @@
 import os
 import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
 import shutil
 
-from app.window_controller.continuous import ContinuousController
+from app.core.renderer_pool import renderer_pool, WarmRenderer
 from app.process_manager.utils import ExternalCommandRunner
+from app.core.config import settings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,18 +19,45 @@ class InteractiveStreamSession:
     管理单次推流会话：
     1. 启动 Instant-NGP
     2. 启动 FFMPEG
-    3. 接收鼠标控制指令
+    3. 接收控制指令
+
+    headless=True (默认)：从 renderer_pool 取得预热的渲染进程 (scripts/render_server.py)，
+        离屏渲染的原始帧经管道直接进入 ffmpeg，相机指令走本地 socket，不需要桌面环境
+    headless=False：run.py --gui + gdigrab 抓屏 + 鼠标模拟 (仅 Windows 桌面)
     """
 
-    def __init__(self):
+    def __init__(self, rtsp_url: str, user_id: int | None = None, headless: bool = True):
         self.is_running = False
         self.process_thread: Optional[threading.Thread] = None
         self.stop_event = threading.Event()
-        self.controller = ContinuousController()
+        self.headless = headless
+
+        self.renderer: Optional[WarmRenderer] = None
+        # 待发送的相机指令，按类型只保留最新一条 ("pose" / "motion")，推流线程每帧合并发送
+        self._camera_lock = threading.Lock()
+        self._pending_camera: Dict[str, dict] = {}
+        if headless:
+            # 取得渲染进程后指向其 RenderClient
+            self.controller = None
+        else:
+            # 依赖 win32gui / pyautogui，仅在 GUI 模式下导入
+            from app.window_controller.continuous import ContinuousController
+            self.controller = ContinuousController()
 
         # 状态记录
+        self.user_id = user_id
         self.current_asset_id: int | None = None
-        self.rtsp_url: str = os.getenv("RTSP_URL")
+        self.rtsp_url: str = rtsp_url
+        self.last_active = time.time()
+
+    @property
+    def stream_path(self) -> str:
+        """RTSP 路径 (如 live/u12)，WebRTC 播放地址使用同一路径"""
+        return urlparse(self.rtsp_url).path.lstrip("/")
+
+    def touch(self):
+        """记录最近一次活动，用于空闲回收"""
+        self.last_active = time.time()
 
     def start(self, asset_id: int, scene_path: str, snapshot_path: str):
         """启动推流会话（如果已有会话则先停止）"""
@@ -36,7 +66,10 @@ class InteractiveStreamSession:
 
         self.current_asset_id = asset_id
         self.stop_event.clear()
+        with self._camera_lock:
+            self._pending_camera.clear()
         self.is_running = True
+        self.touch()
 
         # 在后台线程启动 NGP 和 FFMPEG
         self.process_thread = threading.Thread(
@@ -53,7 +86,8 @@ class InteractiveStreamSession:
 
         print("正在停止推流会话...")
         # 停止鼠标操作
-        self.controller.stop()
+        if self.controller:
+            self.controller.stop()
 
         # 信号通知后台线程退出
         self.stop_event.set()
@@ -66,10 +100,35 @@ class InteractiveStreamSession:
         self.current_asset_id = None
         print("推流会话已结束")
 
+    def submit_camera(self, command: dict):
+        """
+        提交相机指令 (仅 headless)：move / velocity / pose
+        高频输入只覆盖同类型的待发送指令，不会排队积压
+        """
+        kind = "pose" if command.get("cmd") == "pose" else "motion"
+        with self._camera_lock:
+            self._pending_camera[kind] = command
+        self.touch()
+
+    def _flush_camera(self):
+        with self._camera_lock:
+            pending, self._pending_camera = self._pending_camera, {}
+        if self.controller is None:
+            return
+        # 先落位姿，再设置持续运动
+        for kind in ("pose", "motion"):
+            if kind in pending:
+                self.controller.send(pending[kind])
+
     def control(self, action: str, direction: str, mode: str):
         """处理控制指令"""
         if not self.is_running:
             return
+        self.touch()
+
+        if self.headless:
+            self.submit_camera({"cmd": "move", "action": action, "direction": direction, "mode": mode})
+            return
 
         # 停止
         if mode == "stop":
@@ -118,6 +177,103 @@ class InteractiveStreamSession:
             )
 
     def _run_processes(self, scene_path: str, snapshot_path: str):
+        if self.headless:
+            self._run_headless(scene_path, snapshot_path)
+        else:
+            self._run_gui(scene_path, snapshot_path)
+
+    def _encoder_args(self) -> list:
+        """NVENC 低延迟编码 + RTSP 推流参数 (两种模式共用)"""
+        return [
+            "-vf", "format=yuv420p",
+
+            "-vcodec", "h264_nvenc",
+            "-preset", "llhq",
+            "-tune", "ll",
+            "-bf", "0",
+            "-g", "15",
+            "-keyint_min", "15",
+            "-rc-lookahead", "0",
+            "-rc", "constqp",
+            "-b:v", "0",
+            "-qp", "19",
+
+            "-movflags", "frag_keyframe+empty_moov",
+            "-rtsp_transport", "tcp",
+            "-rtsp_flags", "prefer_tcp",
+
+            "-muxdelay", "0",
+            "-muxpreload", "0",
+
+            "-f", "rtsp",
+            self.rtsp_url,
+        ]
+
+    def _run_headless(self, scene_path: str, snapshot_path: str):
+        ffmpeg_bin = shutil.which("ffmpeg") or "ffmpeg"
+        width, height, fps = settings.STREAM_WIDTH, settings.STREAM_HEIGHT, settings.STREAM_FPS
+
+        # 由渲染进程启动 ffmpeg，原始帧写入其 stdin
+        ffmpeg_cmd = [
+            ffmpeg_bin,
+            "-hide_banner",
+            "-loglevel", "info",
+            "-stats",
+
+            "-f", "rawvideo",
+            "-pix_fmt", "rgba",
+            "-s", f"{width}x{height}",
+            "-framerate", str(fps),
+            "-i", "pipe:0",
+
+            *self._encoder_args(),
+        ]
+
+        try:
+            start_time = time.time()
+            self.renderer = renderer_pool.acquire(scene_path, snapshot_path)
+            self.controller = self.renderer.client
+            self.renderer.client.request({"cmd": "stream", "ffmpeg": ffmpeg_cmd}, timeout=10)
+            print(f"FFMPEG 推流开始... (启动耗时 {time.time() - start_time:.2f}s)")
+
+            # 每帧发送一次合并后的相机指令，每秒检查一次进程状态
+            tick = 1.0 / fps
+            last_check = time.time()
+            while not self.stop_event.wait(tick):
+                self._flush_camera()
+
+                if time.time() - last_check < 1:
+                    continue
+                last_check = time.time()
+                if not self.renderer.is_alive():
+                    print("渲染服务意外退出")
+                    break
+                if not self.renderer.client.request({"cmd": "status"}, timeout=5).get("streaming"):
+                    print("FFMPEG 意外退出（请看 ffmpeg stderr 日志）")
+                    break
+
+            print("FFMPEG 退出")
+
+        except Exception as e:
+            print(f"推流后台线程出错: {e}")
+        finally:
+            self.controller = None
+            if self.renderer:
+                renderer_pool.release(self.renderer)
+                self.renderer = None
+            self.is_running = False
+
+    def _watch(self, ngp_runner: ExternalCommandRunner, ffmpeg_runner: ExternalCommandRunner):
+        while not self.stop_event.is_set():
+            if not ngp_runner.is_running():
+                print("NGP 意外退出")
+                break
+            if not ffmpeg_runner.is_running():
+                print("FFMPEG 意外退出（请看 ffmpeg stderr 日志）")
+                break
+            time.sleep(0.5)
+
+    def _run_gui(self, scene_path: str, snapshot_path: str):
         venv_python = os.getenv("NGP_PYTHON_PATH")
         ngp_script = os.getenv("NGP_RUN_SCRIPT_PATH")
         window_title = "Instant Neural Graphics Primitives"
@@ -149,28 +305,7 @@ class InteractiveStreamSession:
             "-draw_mouse", "0",
             "-i", f"title={window_title}",
 
-            "-vf", "format=yuv420p",
-
-            "-vcodec", "h264_nvenc",
-            "-preset", "llhq",
-            "-tune", "ll",
-            "-bf", "0",
-            "-g", "15",
-            "-keyint_min", "15",
-            "-rc-lookahead", "0",
-            "-rc", "constqp",
-            "-b:v", "0",
-            "-qp", "19",
-
-            "-movflags", "frag_keyframe+empty_moov",
-            "-rtsp_transport", "tcp",
-            "-rtsp_flags", "prefer_tcp",
-
-            "-muxdelay", "0",
-            "-muxpreload", "0",
-
-            "-f", "rtsp",
-            self.rtsp_url,
+            *self._encoder_args(),
         ]
 
         try:
@@ -188,15 +323,7 @@ class InteractiveStreamSession:
                         return
 
                     print("FFMPEG 推流开始...")
-
-                    while not self.stop_event.is_set():
-                        if not ngp_runner.is_running():
-                            print("NGP 意外退出")
-                            break
-                        if not ffmpeg_runner.is_running():
-                            print("FFMPEG 意外退出（请看 ffmpeg stderr 日志）")
-                            break
-                        time.sleep(0.5)
+                    self._watch(ngp_runner, ffmpeg_runner)
 
                 print("FFMPEG 退出")
             print("NGP 退出")
@@ -207,5 +334,196 @@ class InteractiveStreamSession:
             self.is_running = False
 
 
+class StreamSessionPool:
+    """
+    推流会话池：
+    - 每个用户最多一个会话 (同一用户切换模型时替换自己的会话，不影响其他人)
+    - 每个会话有独立的 NGP + FFMPEG 进程和独立的 RTSP 路径 (<RTSP_URL>/u<user_id>)
+    - 同时运行的会话数不超过 STREAM_MAX_SESSIONS，超出的请求进入等待队列 (FIFO)
+    - 后台线程回收空闲/异常退出的会话，并把空位分配给等待中的用户
+
+    注意：GUI 推流 (STREAM_HEADLESS=False) 依赖窗口抓屏和鼠标模拟，一台机器上同时只能可靠地
+    操作一个窗口，此时会话数固定为 1。
+    """
+
+    REAP_INTERVAL = 5
+
+    def __init__(self, base_rtsp_url: str | None, max_sessions: int, idle_timeout: int, queue_timeout: int,
+                 headless: bool = True):
+        self.base_rtsp_url = (base_rtsp_url or "").rstrip("/")
+        self.headless = headless
+        self.max_sessions = max(1, max_sessions) if headless else 1
+        self.idle_timeout = idle_timeout
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.RLock()
+        self._sessions: Dict[int, InteractiveStreamSession] = {}  # user_id -> session
+        # 已占用名额、正在锁外启动的会话 (此时 is_running 可能仍为 False，回收线程不能动)
+        self._starting: Set[int] = set()
+        # user_id -> 等待中的启动请求 (按入队顺序)
+        self._waiting: "OrderedDict[int, dict]" = OrderedDict()
+
+        self._reaper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # -------------------------------------------------------------------------
+    # 对外接口
+    # -------------------------------------------------------------------------
+    def start(self, user_id: int, asset_id: int, scene_path: str, snapshot_path: str) -> dict:
+        """
+        为用户启动推流会话
+
+        Returns:
+            dict: status() 的结果，active=False 时 queue_position 为排队位置
+        """
+        self._ensure_reaper()
+
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None and len(self._sessions) >= self.max_sessions:
+                # 会话已满，进入等待队列 (重复请求更新参数，但保留排队位置)
+                entry = self._waiting.get(user_id, {"enqueued_at": time.time()})
+                entry.update(asset_id=asset_id, scene_path=scene_path,
+                             snapshot_path=snapshot_path, last_poll=time.time())
+                self._waiting[user_id] = entry
+                print(f"推流会话已满，用户 {user_id} 排队中 (位置 {self._queue_position(user_id)})")
+                return self.status(user_id)
+
+            if session is None:
+                session = InteractiveStreamSession(
+                    self._rtsp_url_for(user_id), user_id=user_id, headless=self.headless
+                )
+                self._sessions[user_id] = session
+            self._waiting.pop(user_id, None)
+            self._starting.add(user_id)
+
+        # 启动进程在锁外进行 (stop 旧会话可能需要等待数秒)
+        self._start_session(user_id, session, asset_id, scene_path, snapshot_path)
+        return self.status(user_id)
+
+    def stop(self, user_id: int):
+        """停止用户的会话 (或取消排队)，并把空位让给等待中的用户"""
+        with self._lock:
+            self._waiting.pop(user_id, None)
+            session = self._sessions.pop(user_id, None)
+
+        if session:
+            session.stop()
+        self._promote_waiting()
+
+    def get(self, user_id: int) -> Optional[InteractiveStreamSession]:
+        with self._lock:
+            return self._sessions.get(user_id)
+
+    def status(self, user_id: int) -> dict:
+        """查询用户的会话状态，同时作为心跳刷新空闲/排队计时"""
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session:
+                session.touch()
+                return {
+                    "is_active": session.is_running,
+                    "stream_path": session.stream_path,
+                    "current_asset_id": session.current_asset_id,
+                    "queue_position": None,
+                }
+
+            entry = self._waiting.get(user_id)
+            if entry:
+                entry["last_poll"] = time.time()
+                return {
+                    "is_active": False,
+                    "stream_path": None,
+                    "current_asset_id": entry["asset_id"],
+                    "queue_position": self._queue_position(user_id),
+                }
+
+        return {"is_active": False, "stream_path": None, "current_asset_id": None, "queue_position": None}
+
+    def shutdown(self):
+        """服务关闭时停止全部会话"""
+        self._stop_event.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._waiting.clear()
+        for session in sessions:
+            session.stop()
+
+    # -------------------------------------------------------------------------
+    # 内部
+    # -------------------------------------------------------------------------
+    def _rtsp_url_for(self, user_id: int) -> str:
+        return f"{self.base_rtsp_url}/u{user_id}"
+
+    def _queue_position(self, user_id: int) -> int:
+        return list(self._waiting.keys()).index(user_id) + 1
+
+    def _promote_waiting(self):
+        """有空位时按 FIFO 启动等待中的会话"""
+        while True:
+            with self._lock:
+                if not self._waiting or len(self._sessions) >= self.max_sessions:
+                    return
+                user_id, entry = self._waiting.popitem(last=False)
+                session = InteractiveStreamSession(
+                    self._rtsp_url_for(user_id), user_id=user_id, headless=self.headless
+                )
+                self._sessions[user_id] = session
+                self._starting.add(user_id)
+
+            print(f"用户 {user_id} 出队，开始推流")
+            self._start_session(user_id, session, entry["asset_id"], entry["scene_path"], entry["snapshot_path"])
+
+    def _start_session(self, user_id: int, session: InteractiveStreamSession, asset_id: int,
+                       scene_path: str, snapshot_path: str):
+        try:
+            session.start(asset_id=asset_id, scene_path=scene_path, snapshot_path=snapshot_path)
+        finally:
+            with self._lock:
+                self._starting.discard(user_id)
+
+    def _ensure_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._stop_event.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop_event.wait(self.REAP_INTERVAL):
+            try:
+                self._reap_once()
+            except Exception as e:
+                print(f"推流会话回收出错: {e}")
+
+    def _reap_once(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for user_id, session in list(self._sessions.items()):
+                if user_id in self._starting:
+                    continue
+                idle = now - session.last_active
+                if not session.is_running or idle > self.idle_timeout:
+                    expired.append(self._sessions.pop(user_id))
+                    print(f"回收用户 {user_id} 的推流会话 (running={session.is_running}, idle={idle:.0f}s)")
+
+            for user_id, entry in list(self._waiting.items()):
+                if now - entry["last_poll"] > self.queue_timeout:
+                    del self._waiting[user_id]
+                    print(f"用户 {user_id} 排队超时，已移出等待队列")
+
+        for session in expired:
+            session.stop()
+        self._promote_waiting()
+
+
 # 全局单例
-stream_session = InteractiveStreamSession()
+stream_pool = StreamSessionPool(
+    base_rtsp_url=settings.RTSP_URL or os.getenv("RTSP_URL"),
+    max_sessions=settings.STREAM_MAX_SESSIONS,
+    idle_timeout=settings.STREAM_IDLE_TIMEOUT,
+    queue_timeout=settings.STREAM_QUEUE_TIMEOUT,
+    headless=settings.STREAM_HEADLESS
+)
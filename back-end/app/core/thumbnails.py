@@ -0,0 +1,244 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.database import engine
+from app.models import ModelAsset
+
+# 比较清晰度前统一缩放到该宽度，避免分辨率不同导致的分数不可比
+SCORE_WIDTH = 320
+
+
+def variance_of_laplacian(image) -> float:
+    """清晰度评分，与 scripts/colmap2nerf.py 的 variance_of_laplacian 相同"""
+    import cv2
+    return cv2.Laplacian(image, cv2.CV_64F).var()
+
+
+def _video_duration(video_path: str) -> float:
+    cmd = [
+        shutil.which("ffprobe") or "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        video_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=settings.UPLOAD_PROBE_TIMEOUT)
+        return float(result.stdout.strip() or 0)
+    except (FileNotFoundError, subprocess.TimeoutExpired, ValueError):
+        return 0.0
+
+
+def _extract_candidates(video_path: str, out_dir: str) -> List[str]:
+    """
+    在视频中均匀取 THUMBNAIL_CANDIDATES 个时间点各抽一帧
+    每帧单独 -ss 快速定位，不必解码整段视频；避开首尾 (常见黑屏/手抖)
+    """
+    duration = _video_duration(video_path)
+    count = max(1, settings.THUMBNAIL_CANDIDATES)
+    offsets = [duration * (i + 0.5) / count for i in range(count)] if duration > 0 else [0.0]
+
+    frames = []
+    for i, offset in enumerate(offsets):
+        frame = os.path.join(out_dir, f"{i:02d}.png")
+        cmd = [
+            shutil.which("ffmpeg") or "ffmpeg",
+            "-hide_banner", "-loglevel", "error",
+            "-ss", f"{offset:.3f}",
+            "-i", video_path,
+            "-frames:v", "1",
+            "-y", frame,
+        ]
+        try:
+            subprocess.run(cmd, capture_output=True, timeout=settings.UPLOAD_PROBE_TIMEOUT)
+        except FileNotFoundError:
+            raise RuntimeError("未找到 ffmpeg，无法生成封面")
+        except subprocess.TimeoutExpired:
+            continue
+        if os.path.exists(frame):
+            frames.append(frame)
+    return frames
+
+
+def pick_poster_frame(frames: List[str]):
+    """
+    选出最清晰的一帧 (灰度图拉普拉斯方差最大)
+
+    Returns:
+        BGR 图像；全部读取失败时返回 None
+    """
+    import cv2
+
+    best, best_score = None, -1.0
+    for frame in frames:
+        image = cv2.imread(frame)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        small = cv2.resize(image, (SCORE_WIDTH, max(1, round(height * SCORE_WIDTH / width))), interpolation=cv2.INTER_AREA)
+        score = variance_of_laplacian(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        if score > best_score:
+            best, best_score = image, score
+    return best
+
+
+def _store(data: bytes, ext: str) -> str:
+    """
+    按内容哈希保存 (内容相同的文件只存一份，URL 不变即可长期缓存)
+
+    Returns:
+        str: web 路径
+    """
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    target = Path(settings.THUMBNAIL_DIR) / digest[:2] / f"{digest}{ext}"
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+    # ./static/thumbnails/... -> /static/thumbnails/...
+    return "/" + target.as_posix()
+
+
+def encode_thumbnails(image) -> Dict[str, Any]:
+    """
+    按 THUMBNAIL_WIDTHS 编码 WebP / JPEG (不放大，原图更窄时只输出原尺寸)
+
+    Returns:
+        dict: {"width", "height", "sources": [{"width", "height", "webp", "jpeg"}, ...]}
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    widths = sorted({w for w in settings.THUMBNAIL_WIDTHS if w < width} | {min(width, max(settings.THUMBNAIL_WIDTHS))})
+
+    sources = []
+    for w in widths:
+        h = max(1, round(height * w / width))
+        resized = image if w == width else cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA)
+        ok_webp, webp = cv2.imencode(".webp", resized, [cv2.IMWRITE_WEBP_QUALITY, settings.THUMBNAIL_WEBP_QUALITY])
+        ok_jpeg, jpeg = cv2.imencode(".jpg", resized, [
+            cv2.IMWRITE_JPEG_QUALITY, settings.THUMBNAIL_JPEG_QUALITY,
+            cv2.IMWRITE_JPEG_PROGRESSIVE, 1,
+            cv2.IMWRITE_JPEG_OPTIMIZE, 1,
+        ])
+        if not (ok_webp and ok_jpeg):
+            raise RuntimeError(f"封面编码失败 ({w}px)")
+        sources.append({
+            "width": w,
+            "height": h,
+            "webp": _store(webp.tobytes(), ".webp"),
+            "jpeg": _store(jpeg.tobytes(), ".jpg"),
+        })
+
+    return {"width": width, "height": height, "sources": sources}
+
+
+def generate_thumbnails(video_path: str) -> Dict[str, Any]:
+    """
+    视频 -> 最清晰的一帧 -> 多尺寸缩略图
+
+    Raises:
+        RuntimeError: 抽帧或编码失败
+    """
+    with tempfile.TemporaryDirectory(prefix="thumb-") as tmp:
+        frames = _extract_candidates(video_path, tmp)
+        image = pick_poster_frame(frames)
+        if image is None:
+            raise RuntimeError(f"无法从视频中抽取封面: {video_path}")
+        return encode_thumbnails(image)
+
+
+def cover_url(asset: ModelAsset) -> str:
+    """卡片封面：有缩略图时返回 THUMBNAIL_COVER_WIDTH 附近的 JPEG，否则沿用 video_path"""
+    sources = (asset.thumbnails or {}).get("sources") or []
+    if not sources:
+        return asset.video_path
+    best = min(sources, key=lambda s: abs(s["width"] - settings.THUMBNAIL_COVER_WIDTH))
+    return best["jpeg"]
+
+
+def thumbnail_sources(asset: ModelAsset) -> List[Dict[str, Any]]:
+    """各尺寸缩略图 (客户端按显示宽度挑选)，尚未生成时为空列表"""
+    return (asset.thumbnails or {}).get("sources") or []
+
+
+def asset_video_file(asset: ModelAsset) -> Optional[str]:
+    """根据 video_path (/static/uploads/<uid>) 找到磁盘上的 video.<ext>"""
+    asset_dir = Path(settings.UPLOAD_DIR) / Path(asset.video_path).name
+    videos = sorted(asset_dir.glob("video.*"))
+    return str(videos[0]) if videos else None
+
+
+class ThumbnailWorker:
+    """
+    后台生成封面：上传完成后提交，不阻塞上传接口
+    结果写回 ModelAsset.thumbnails，失败只打印日志 (卡片继续使用 video_path)
+    """
+
+    def __init__(self, workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnail")
+
+    def submit(self, asset_id: int, video_path: str):
+        return self._executor.submit(self.process, asset_id, video_path)
+
+    def process(self, asset_id: int, video_path: str) -> Optional[Dict[str, Any]]:
+        """生成并写回数据库 (在调用线程中执行)，失败返回 None"""
+        try:
+            thumbnails = generate_thumbnails(video_path)
+        except Exception as e:
+            print(f"资产 {asset_id} 封面生成失败: {e}")
+            return None
+
+        with Session(engine) as session:
+            asset = session.get(ModelAsset, asset_id)
+            if asset is None:
+                return None
+            asset.thumbnails = thumbnails
+            session.add(asset)
+            session.commit()
+        print(f"资产 {asset_id} 封面已生成 ({len(thumbnails['sources'])} 个尺寸)")
+        return thumbnails
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# 全局单例
+thumbnail_worker = ThumbnailWorker(settings.THUMBNAIL_WORKERS)
+
+
+def backfill_thumbnails(limit: Optional[int] = None) -> int:
+    """给还没有封面的旧资产补生成缩略图 (同步执行)"""
+    with Session(engine) as session:
+        statement = select(ModelAsset.id).where(ModelAsset.thumbnails == None).order_by(ModelAsset.id)
+        if limit:
+            statement = statement.limit(limit)
+        asset_ids = session.exec(statement).all()
+
+    done = 0
+    for asset_id in asset_ids:
+        with Session(engine) as session:
+            asset = session.get(ModelAsset, asset_id)
+            video_file = asset_video_file(asset) if asset else None
+        if video_file is None:
+            print(f"资产 {asset_id} 找不到视频文件，跳过")
+            continue
+        if thumbnail_worker.process(asset_id, video_file) is not None:
+            done += 1
+    return done
+
+
+if __name__ == "__main__":
+    # 补生成旧资产的封面：python -m app.core.thumbnails
+    count = backfill_thumbnails()
+    print(f"封面补生成完成，共 {count} 个资产")
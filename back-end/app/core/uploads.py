@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import UploadSession, UploadStatus
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ffprobe format_name -> 保存时使用的扩展名
+FORMAT_EXTENSIONS = {
+    "mov,mp4,m4a,3gp,3g2,mj2": ".mp4",
+    "matroska,webm": ".mkv",
+    "avi": ".avi",
+}
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def incoming_dir() -> Path:
+    """未提交的分片数据目录 (不在 /static 下，未完成 / 未校验的数据不能被直接访问)"""
+    path = Path(settings.UPLOAD_INCOMING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    _move_legacy_incoming(path)
+    return path
+
+
+_legacy_moved = False
+
+
+def _move_legacy_incoming(target: Path):
+    """旧版把分片放在 UPLOAD_DIR/.incoming (公开目录)，首次使用时移到新目录，未完成的上传可以继续"""
+    global _legacy_moved
+    if _legacy_moved:
+        return
+    _legacy_moved = True
+
+    legacy = Path(settings.UPLOAD_DIR) / ".incoming"
+    if not legacy.is_dir() or legacy.resolve() == target.resolve():
+        return
+    for f in legacy.iterdir():
+        try:
+            shutil.move(str(f), str(target / f.name))
+        except OSError as e:
+            print(f"移动旧分片文件失败 {f}: {e}")
+    try:
+        legacy.rmdir()
+    except OSError:
+        pass
+
+
+def part_path(upload_id: str) -> Path:
+    return incoming_dir() / f"{upload_id}.part"
+
+
+def parse_content_range(value: str | None) -> Tuple[int, int, int]:
+    """
+    解析 Content-Range: bytes <start>-<end>/<total>
+
+    Raises:
+        ValueError: 格式不正确
+    """
+    match = _CONTENT_RANGE.match((value or "").strip())
+    if not match:
+        raise ValueError("Content-Range 格式应为 bytes <start>-<end>/<total>")
+    start, end, total = (int(g) for g in match.groups())
+    if end < start or end >= total:
+        raise ValueError("Content-Range 范围不合法")
+    return start, end, total
+
+
+class UploadHashers:
+    """
+    分片上传的增量 sha256：
+    每个上传会话在内存中保留 (已哈希字节数, hasher)，分片写盘时顺带更新，
+    提交时不必再把整个文件读一遍。进程重启后丢失的状态从磁盘重算。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+
+    def resume(self, upload_id: str, path: Path, offset: int):
+        """取得已哈希到 offset 的 hasher (内存中没有或偏移不一致时从磁盘重算)"""
+        with self._lock:
+            state = self._hashers.pop(upload_id, None)
+        if state is not None and state[0] == offset:
+            return state[1]
+
+        hasher = hashlib.sha256()
+        if offset:
+            with path.open("rb") as f:
+                remaining = offset
+                while remaining:
+                    chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+        return hasher
+
+    def save(self, upload_id: str, offset: int, hasher):
+        with self._lock:
+            self._hashers[upload_id] = (offset, hasher)
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+
+def probe_video(path: str) -> Optional[dict]:
+    """
+    用 ffprobe 检查容器与时长，在排队训练之前拒绝无法读取的文件
+
+    Returns:
+        dict: format / duration / width / height / codec；找不到 ffprobe 时返回 None (跳过检查)
+
+    Raises:
+        ValueError: 文件无法识别、没有视频流或时长不在允许范围内
+    """
+    cmd = [
+        shutil.which("ffprobe") or "ffprobe",
+        "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=settings.UPLOAD_PROBE_TIMEOUT)
+    except FileNotFoundError:
+        print("未找到 ffprobe，跳过视频检查")
+        return None
+    except subprocess.TimeoutExpired:
+        raise ValueError("视频检查超时，文件可能已损坏")
+
+    if result.returncode != 0:
+        raise ValueError("无法识别的视频文件")
+    try:
+        data = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        raise ValueError("无法识别的视频文件")
+
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise ValueError("文件中没有视频流")
+
+    fmt = data.get("format", {})
+    try:
+        duration = float(fmt.get("duration") or video.get("duration") or 0)
+    except ValueError:
+        duration = 0.0
+    if duration < settings.VIDEO_MIN_DURATION:
+        raise ValueError(f"视频时长过短 (至少 {settings.VIDEO_MIN_DURATION:g} 秒)")
+    if duration > settings.VIDEO_MAX_DURATION:
+        raise ValueError(f"视频时长过长 (最多 {settings.VIDEO_MAX_DURATION:g} 秒)")
+
+    return {
+        "format": fmt.get("format_name"),
+        "duration": duration,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "codec": video.get("codec_name"),
+    }
+
+
+def video_extension(probe: Optional[dict], filename: str) -> str:
+    """按实际容器决定保存的扩展名，探测不到时用客户端文件名的扩展名"""
+    if probe and probe.get("format") in FORMAT_EXTENSIONS:
+        return FORMAT_EXTENSIONS[probe["format"]]
+    suffix = Path(filename).suffix.lower()
+    return suffix if suffix in settings.UPLOAD_ALLOWED_EXTENSIONS else ".mp4"
+
+
+def check_upload_request(filename: str, size: int | None):
+    """
+    创建上传前的检查 (文件大小 / 扩展名)
+
+    Raises:
+        ValueError: 不允许的上传
+    """
+    if size is not None and size > settings.UPLOAD_MAX_BYTES:
+        raise ValueError(f"文件过大 (最大 {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB)")
+    if size is not None and size <= 0:
+        raise ValueError("文件为空")
+    suffix = Path(filename).suffix.lower()
+    if suffix and suffix not in settings.UPLOAD_ALLOWED_EXTENSIONS:
+        raise ValueError(f"不支持的视频格式: {suffix}")
+
+
+def purge_expired_uploads(session: Session) -> int:
+    """清理超过 UPLOAD_SESSION_TTL 未活动的上传会话及其分片文件"""
+    deadline = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    expired = session.exec(
+        select(UploadSession).where(
+            UploadSession.status == UploadStatus.UPLOADING,
+            UploadSession.updated_at < deadline
+        )
+    ).all()
+    for upload in expired:
+        discard_upload(upload)
+        session.add(upload)
+    if expired:
+        session.commit()
+    return len(expired)
+
+
+def discard_upload(upload: UploadSession):
+    """放弃上传：删除分片文件 (调用方负责 commit)"""
+    upload.status = UploadStatus.ABORTED
+    upload.updated_at = datetime.utcnow()
+    upload_hashers.discard(upload.id)
+    try:
+        os.remove(part_path(upload.id))
+    except FileNotFoundError:
+        pass
+
+
+# 全局单例
+upload_hashers = UploadHashers()
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple, Union
+
+from app.core.config import settings
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+MAX32 = 0xFFFFFFFF
+MAX16 = 0xFFFF
+
+_LOCAL = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_EOCD = struct.Struct("<IHHHHIIH")
+_EOCD64 = struct.Struct("<IQHHIIQQQQ")
+_LOCATOR64 = struct.Struct("<IIQI")
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+FLAG_UTF8 = 0x0800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+VERSION_MADE_BY = (3 << 8) | VERSION_ZIP64  # Unix
+EXTERNAL_ATTR = 0o100644 << 16
+
+
+class Crc32Cache:
+    """
+    文件 CRC32 缓存，key = (路径, 大小, mtime)
+    ZIP 本地文件头里要写 CRC，提前算好才能不用数据描述符、预先算出 Content-Length 并支持 Range
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+
+    def get(self, path: str, stat: os.stat_result) -> int:
+        key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            crc = self._entries.get(key)
+            if crc is not None:
+                self._entries.move_to_end(key)
+                return crc
+
+        crc = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+
+        with self._lock:
+            self._entries[key] = crc
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return crc
+
+
+# 全局单例
+crc_cache = Crc32Cache()
+
+
+@dataclass
+class ZipEntry:
+    arcname: str
+    path: str
+    size: int
+    mtime: float
+    crc: int
+    method: int
+    compressed_size: int
+    payload: Optional[bytes] = None  # 在内存中压缩好的数据 (只用于小文件)
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _should_deflate(path: str, size: int) -> bool:
+    suffix = os.path.splitext(path)[1].lower()
+    return suffix in settings.BUNDLE_DEFLATE_SUFFIXES and size <= settings.BUNDLE_DEFLATE_MAX_BYTES
+
+
+class ZipStream:
+    """
+    流式 ZIP 打包 (不落盘，内存占用恒定)
+    - 已压缩的大文件 (视频 / 图片 / 快照) 原样存储，小的文本文件 (transforms.json) 在内存中 deflate
+    - 每个条目的大小和 CRC 都提前确定，整个压缩包的字节布局是确定的：
+      可以预先给出 Content-Length，并按 Range 只生成请求的那一段 (断点续传)
+    - 超过 4 GB 时自动使用 ZIP64
+    """
+
+    def __init__(self, files: List[Tuple[str, str]]):
+        """
+        Args:
+            files: [(压缩包内路径, 磁盘路径), ...]
+        """
+        self.entries: List[ZipEntry] = [self._make_entry(arcname, path) for arcname, path in files]
+        # (偏移, 长度, bytes 或 磁盘路径)
+        self._segments: List[Tuple[int, int, Union[bytes, str]]] = []
+        self.size = self._layout()
+
+        digest = hashlib.sha256()
+        for entry in self.entries:
+            digest.update(f"{entry.arcname}\0{entry.size}\0{entry.crc}\0{entry.method}\n".encode())
+        self.etag = f'"{digest.hexdigest()[:32]}"'
+
+    @staticmethod
+    def _make_entry(arcname: str, path: str) -> ZipEntry:
+        stat = os.stat(path)
+        if _should_deflate(path, stat.st_size):
+            with open(path, "rb") as f:
+                data = f.read()
+            compressor = zlib.compressobj(settings.BUNDLE_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+            return ZipEntry(
+                arcname, path, len(data), stat.st_mtime, zlib.crc32(data),
+                METHOD_DEFLATED, len(payload), payload
+            )
+        return ZipEntry(
+            arcname, path, stat.st_size, stat.st_mtime, crc_cache.get(path, stat),
+            METHOD_STORED, stat.st_size
+        )
+
+    def _add(self, offset: int, source: Union[bytes, str], length: int) -> int:
+        if length:
+            self._segments.append((offset, length, source))
+        return offset + length
+
+    def _layout(self) -> int:
+        offset = 0
+        central = []
+        for entry in self.entries:
+            name = entry.arcname.encode("utf-8")
+            dos_time, dos_date = _dos_datetime(entry.mtime)
+            local_zip64 = entry.size >= MAX32 or entry.compressed_size >= MAX32
+            central_zip64 = local_zip64 or offset >= MAX32
+            version = VERSION_ZIP64 if central_zip64 else VERSION_DEFAULT
+
+            extra = struct.pack("<HHQQ", 1, 16, entry.size, entry.compressed_size) if local_zip64 else b""
+            header = _LOCAL.pack(
+                0x04034B50, version, FLAG_UTF8, entry.method, dos_time, dos_date, entry.crc,
+                MAX32 if local_zip64 else entry.compressed_size,
+                MAX32 if local_zip64 else entry.size,
+                len(name), len(extra)
+            ) + name + extra
+
+            header_offset = offset
+            offset = self._add(offset, header, len(header))
+            offset = self._add(offset, entry.payload if entry.payload is not None else entry.path, entry.compressed_size)
+
+            central_extra = (
+                struct.pack("<HHQQQ", 1, 24, entry.size, entry.compressed_size, header_offset)
+                if central_zip64 else b""
+            )
+            central.append(_CENTRAL.pack(
+                0x02014B50, VERSION_MADE_BY, version, FLAG_UTF8, entry.method, dos_time, dos_date, entry.crc,
+                MAX32 if central_zip64 else entry.compressed_size,
+                MAX32 if central_zip64 else entry.size,
+                len(name), len(central_extra), 0, 0, 0, EXTERNAL_ATTR,
+                MAX32 if central_zip64 else header_offset
+            ) + name + central_extra)
+
+        directory = b"".join(central)
+        cd_offset, cd_size, count = offset, len(directory), len(self.entries)
+
+        tail = b""
+        if count >= MAX16 or cd_offset >= MAX32 or cd_size >= MAX32:
+            eocd64_offset = cd_offset + cd_size
+            tail += _EOCD64.pack(0x06064B50, 44, VERSION_MADE_BY, VERSION_ZIP64, 0, 0, count, count, cd_size, cd_offset)
+            tail += _LOCATOR64.pack(0x07064B50, 0, eocd64_offset, 1)
+            tail += _EOCD.pack(0x06054B50, 0, 0, MAX16, MAX16, MAX32, MAX32, 0)
+        else:
+            tail += _EOCD.pack(0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+
+        offset = self._add(offset, directory + tail, cd_size + len(tail))
+        return offset
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """生成 [start, end] (含) 范围内的字节，end 为空时到结尾"""
+        end = self.size - 1 if end is None else end
+        for seg_offset, seg_length, source in self._segments:
+            seg_end = seg_offset + seg_length - 1
+            if seg_end < start or seg_offset > end:
+                continue
+            lo = max(start, seg_offset) - seg_offset
+            hi = min(end, seg_end) - seg_offset + 1
+            if isinstance(source, bytes):
+                yield source[lo:hi]
+                continue
+            with open(source, "rb") as f:
+                f.seek(lo)
+                remaining = hi - lo
+                while remaining:
+                    chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise RuntimeError(f"打包过程中文件被截断: {source}")
+                    remaining -= len(chunk)
+                    yield chunk
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range: bytes=<start>-<end> / bytes=<start>- / bytes=-<suffix>
+    多段或格式不认识时返回 None (按整个文件响应)
+
+    Raises:
+        ValueError: 范围无法满足 (416)
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, _, last = value[len("bytes="):].strip().partition("-")
+    if not (first == "" or first.isdigit()) or not (last == "" or last.isdigit()) or first == last == "":
+        return None
+    if first == "":
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Range 无法满足")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range 无法满足")
+    return start, min(end, size - 1)
@@ -1,6 +1,7 @@
 from typing import List
 from sqlmodel import Session, select, func
-from app.models import ModelAsset, ModelCollection, AssetStatus, DownloadRecord
+from app.models import ModelAsset, ModelCollection, AssetStatus, DownloadRecord, CommunityPost, Visibility
+from app.core import thumbnails
 
 
 def get_my_assets(session: Session, user_id: int) -> List[dict]:
@@ -25,7 +26,8 @@ def get_my_assets(session: Session, user_id: int) -> List[dict]:
         results.append({
             "id": asset.id,
             "title": asset.title,
-            "cover_url": asset.video_path,
+            "cover_url": thumbnails.cover_url(asset),
+            "thumbnails": thumbnails.thumbnail_sources(asset),
             "description": asset.description,
             "tags": asset.tags,
             "is_collected": asset.id in my_collected_ids,
@@ -95,6 +97,23 @@ def toggle_collection(session: Session, user_id: int, asset_id: int) -> bool:
     return is_collected
 
 
+def can_download(session: Session, user_id: int, asset: ModelAsset) -> bool:
+    """
+    下载权限：资产拥有者，或资产已发布为非私密、且允许下载的帖子
+    (未发布的资产只有拥有者能拿到视频 / 帧 / 快照，也不能被他人触发导出)
+    """
+    if asset.user_id == user_id:
+        return True
+    post_id = session.exec(
+        select(CommunityPost.id).where(
+            CommunityPost.asset_id == asset.id,
+            CommunityPost.visibility != Visibility.PRIVATE,
+            CommunityPost.allow_download == True
+        )
+    ).first()
+    return post_id is not None
+
+
 def record_download(session: Session, user_id: int, asset_id: int) -> None:
     """
     记录下载行为
@@ -132,7 +151,8 @@ def get_my_downloaded_assets(session: Session, user_id: int) -> List[dict]:
         results.append({
             "id": asset.id,
             "title": asset.title,
-            "cover_url": asset.video_path,
+            "cover_url": thumbnails.cover_url(asset),
+            "thumbnails": thumbnails.thumbnail_sources(asset),
             "description": asset.description,
             "tags": asset.tags,
             "is_collected": asset.id in my_collected_ids,
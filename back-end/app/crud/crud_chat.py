@@ -0,0 +1,93 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import case, update
+from sqlmodel import select, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import DATABASE_BACKEND
+from app.models import Conversation, Message, User
+
+if DATABASE_BACKEND == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as upsert
+else:
+    from sqlalchemy.dialects.sqlite import insert as upsert
+
+
+def pair_key(user_a: int, user_b: int) -> Tuple[int, int]:
+    """会话的主键：(较小 id, 较大 id)"""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+async def record_messages(session: AsyncSession, messages: List[Message]):
+    """
+    新消息写入后更新会话摘要 (调用方负责 commit，messages 需已 flush 拿到 id)
+    同一批里每对用户只执行一条 UPSERT，未读数在 SQL 端累加
+    """
+    summaries: Dict[Tuple[int, int], dict] = {}
+    unread = defaultdict(lambda: [0, 0])
+    for msg in messages:
+        low, high = pair_key(msg.sender_id, msg.receiver_id)
+        unread[(low, high)][0 if msg.receiver_id == low else 1] += 1
+        last = summaries.get((low, high))
+        if last is None or msg.id > last["last_message_id"]:
+            summaries[(low, high)] = {
+                "user_low_id": low,
+                "user_high_id": high,
+                "last_message_id": msg.id,
+                "last_message_time": msg.created_at,
+            }
+
+    for key, values in summaries.items():
+        unread_low, unread_high = unread[key]
+        stmt = upsert(Conversation).values(**values, unread_low=unread_low, unread_high=unread_high)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_low_id", "user_high_id"],
+            set_={
+                "last_message_id": stmt.excluded.last_message_id,
+                "last_message_time": stmt.excluded.last_message_time,
+                "unread_low": Conversation.unread_low + unread_low,
+                "unread_high": Conversation.unread_high + unread_high,
+            }
+        )
+        await session.exec(stmt)
+
+
+async def clear_unread(session: AsyncSession, reader_id: int, other_id: int):
+    """reader_id 已读完 other_id 发来的消息 (调用方负责 commit)"""
+    low, high = pair_key(reader_id, other_id)
+    column = "unread_low" if reader_id == low else "unread_high"
+    await session.exec(
+        update(Conversation)
+        .where(Conversation.user_low_id == low, Conversation.user_high_id == high)
+        .values({column: 0})
+    )
+
+
+async def get_inbox(session: AsyncSession, user_id: int) -> List[dict]:
+    """收件箱：会话摘要 + 最后一条消息 + 对方用户，一次查询，按最后消息时间倒序"""
+    is_low = Conversation.user_low_id == user_id
+    other_id = case((is_low, Conversation.user_high_id), else_=Conversation.user_low_id)
+    unread_count = case((is_low, Conversation.unread_low), else_=Conversation.unread_high)
+
+    statement = (
+        select(User, Message.content, Conversation.last_message_time, unread_count)
+        .select_from(Conversation)
+        .join(Message, Message.id == Conversation.last_message_id)
+        .join(User, User.id == other_id)
+        .where(or_(is_low, Conversation.user_high_id == user_id))
+        .order_by(Conversation.last_message_time.desc())
+    )
+    rows = (await session.exec(statement)).all()
+
+    return [
+        {
+            "user_id": user.id,
+            "username": user.username,
+            "avatar_url": user.avatar_url,
+            "last_message": content,
+            "last_message_time": last_message_time,
+            "unread_count": count,
+        }
+        for user, content, last_message_time, count in rows
+    ]
@@ -2,7 +2,11 @@ from app.schemas import PostCreate
 from fastapi import HTTPException
 from app.schemas import PostDetail, PostAssetInfo, CommentOut
 from sqlmodel import Session, select, or_, and_, col
-from typing import List
+from typing import List, Optional, Tuple
+from datetime import datetime
+import base64
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
 
 
 
@@ -10,58 +14,75 @@ from app.models import (
     CommunityPost, ModelAsset, InteractionLike,
     PostCollection, Comment, UserFollow, User, Visibility
 )
+from app.crud import crud_timeline
+from app.core.counters import increment, view_counter
+from app.core import thumbnails
 
 
-def get_posts_by_user(
+def encode_feed_cursor(published_at: datetime, post_id: int) -> str:
+    """社区流游标：(published_at, id) 编码为不透明字符串"""
+    raw = f"{published_at.isoformat()}|{post_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_feed_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        published_at, post_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(published_at), int(post_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def _build_post_cards(
         session: Session,
-        target_user_id: int,
+        rows: List[Tuple[CommunityPost, ModelAsset, User]],
         current_user_id: int
 ) -> List[dict]:
     """
-    查询 target_user_id 发布的所有帖子。
-    同时计算 current_user_id 与这些帖子的交互状态。
+    把 (帖子, 模型, 作者) 行组装为 PostCard 字典
+    交互状态只查询本页涉及的帖子/作者，不加载用户全部的点赞/收藏/评论记录
     """
-    # 查询该用户发布的所有帖子
-    statement = (
-        select(CommunityPost)
-        .where(CommunityPost.user_id == target_user_id)
-        .order_by(CommunityPost.published_at.desc())
-    )
-    posts = session.exec(statement).all()
-
-    if not posts:
+    if not rows:
         return []
 
-    # 批量查询交互状态
-
-    # 我点赞过的帖子ID
-    liked_ids_stmt = select(InteractionLike.post_id).where(InteractionLike.user_id == current_user_id)
-    my_liked_ids = set(session.exec(liked_ids_stmt).all())
-
-    # 收藏过的帖子ID
-    collected_ids_stmt = select(PostCollection.post_id).where(PostCollection.user_id == current_user_id)
-    my_collected_ids = set(session.exec(collected_ids_stmt).all())
+    post_ids = [post.id for post, _, _ in rows]
+    author_ids = {author.id for _, _, author in rows}
 
-    # 评论过的帖子ID
-    commented_ids_stmt = select(Comment.post_id).where(Comment.user_id == current_user_id)
-    my_commented_ids = set(session.exec(commented_ids_stmt).all())
+    # 本页中我点赞过的帖子ID
+    my_liked_ids = set(session.exec(
+        select(InteractionLike.post_id).where(
+            InteractionLike.user_id == current_user_id,
+            col(InteractionLike.post_id).in_(post_ids)
+        )
+    ).all())
 
-    # 是否关注了该目标用户
-    is_following_target = False
-    if current_user_id != target_user_id:
-        follow_stmt = select(UserFollow).where(
+    # 本页中我收藏过的帖子ID
+    my_collected_ids = set(session.exec(
+        select(PostCollection.post_id).where(
+            PostCollection.user_id == current_user_id,
+            col(PostCollection.post_id).in_(post_ids)
+        )
+    ).all())
+
+    # 本页中我评论过的帖子ID
+    my_commented_ids = set(session.exec(
+        select(Comment.post_id).where(
+            Comment.user_id == current_user_id,
+            col(Comment.post_id).in_(post_ids)
+        ).distinct()
+    ).all())
+
+    # 本页作者中我关注的用户ID
+    my_following_ids = set(session.exec(
+        select(UserFollow.followed_id).where(
             UserFollow.follower_id == current_user_id,
-            UserFollow.followed_id == target_user_id
+            col(UserFollow.followed_id).in_(author_ids)
         )
-        is_following_target = session.exec(follow_stmt).first() is not None
+    ).all())
 
     results = []
-    for post in posts:
-        # 获取关联的model信息
-        asset = post.asset
-        author = post.author
-
-
+    for post, asset, author in rows:
         display_desc = post.content if post.content else asset.description
 
         results.append({
@@ -69,7 +90,8 @@ def get_posts_by_user(
             "post_id": post.id,
             "asset_id": asset.id,
             "title": asset.title,
-            "cover_url": asset.video_path,
+            "cover_url": thumbnails.cover_url(asset),
+            "thumbnails": thumbnails.thumbnail_sources(asset),
             "description": display_desc,
             "tags": asset.tags,
             "published_at": str(post.published_at),
@@ -89,104 +111,99 @@ def get_posts_by_user(
             "is_liked": post.id in my_liked_ids,
             "is_collected": post.id in my_collected_ids,
             "has_commented": post.id in my_commented_ids,
-            "is_following": is_following_target
+            "is_following": author.id in my_following_ids
         })
 
     return results
 
 
+def _post_rows_statement():
+    """帖子 + 模型 + 作者 一次 JOIN 查出，避免逐行懒加载"""
+    return (
+        select(CommunityPost, ModelAsset, User)
+        .join(ModelAsset, ModelAsset.id == CommunityPost.asset_id)
+        .join(User, User.id == CommunityPost.user_id)
+    )
 
 
+def get_posts_by_user(
+        session: Session,
+        target_user_id: int,
+        current_user_id: int
+) -> List[dict]:
+    """
+    查询 target_user_id 发布的所有帖子。
+    同时计算 current_user_id 与这些帖子的交互状态。
+    """
+    # 查询该用户发布的所有帖子
+    statement = (
+        _post_rows_statement()
+        .where(CommunityPost.user_id == target_user_id)
+        .order_by(CommunityPost.published_at.desc())
+    )
+    rows = session.exec(statement).all()
 
+    return _build_post_cards(session, rows, current_user_id)
 
 
-def get_community_posts(session: Session, current_user_id: int) -> List[dict]:
+def get_community_posts(
+        session: Session,
+        current_user_id: int,
+        limit: Optional[int],
+        cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
     """
-    【社区首页】获取帖子流
-    逻辑更新：
+    【社区首页】获取帖子流 (按 published_at, id 倒序的游标分页；limit 为空时返回全部)
+    可见范围：
     1. 显示 PUBLIC 帖子
     2. 显示 FOLLOWERS 帖子 (如果当前用户关注了作者)
     3. 显示当前用户自己的帖子
-    """
 
-    # =========================================================
-    # 获取我关注的所有用户 ID
-    # =========================================================
-    following_subquery = select(UserFollow.followed_id).where(
-        UserFollow.follower_id == current_user_id
-    )
+    Returns:
+        (本页帖子, 下一页游标；没有更多时为 None)
+    """
 
     statement = (
-        select(CommunityPost)
+        _post_rows_statement()
         .where(
             or_(
                 # 帖子是公开的
                 CommunityPost.visibility == Visibility.PUBLIC,
 
-                # 帖子仅粉丝可见，且作者ID在我的关注列表里
-                and_(
-                    CommunityPost.visibility == Visibility.FOLLOWERS,
-                    col(CommunityPost.user_id).in_(following_subquery)
-                ),
+                # 帖子仅粉丝可见，且我关注了作者 (启用时间线时走 TimelineEntry)
+                crud_timeline.follower_visible_clause(current_user_id),
 
                 CommunityPost.user_id == current_user_id
             )
         )
-        .order_by(CommunityPost.published_at.desc())
     )
 
-    # 执行查询
-    posts = session.exec(statement).all()
-
-    if not posts:
-        return []
+    # 游标：只取比上一页最后一条更早的帖子
+    if cursor:
+        cursor_published_at, cursor_id = decode_feed_cursor(cursor)
+        statement = statement.where(
+            or_(
+                CommunityPost.published_at < cursor_published_at,
+                and_(
+                    CommunityPost.published_at == cursor_published_at,
+                    CommunityPost.id < cursor_id
+                )
+            )
+        )
 
-    # 我点赞过的帖子ID
-    liked_ids_stmt = select(InteractionLike.post_id).where(InteractionLike.user_id == current_user_id)
-    my_liked_ids = set(session.exec(liked_ids_stmt).all())
+    statement = statement.order_by(col(CommunityPost.published_at).desc(), col(CommunityPost.id).desc())
+    if limit is not None:
+        # 多取一条用于判断是否还有下一页
+        statement = statement.limit(limit + 1)
+    rows = session.exec(statement).all()
 
-    # 我收藏过的帖子ID
-    collected_ids_stmt = select(PostCollection.post_id).where(PostCollection.user_id == current_user_id)
-    my_collected_ids = set(session.exec(collected_ids_stmt).all())
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last_post = rows[-1][0]
+        next_cursor = encode_feed_cursor(last_post.published_at, last_post.id)
 
-    # 我评论过的帖子ID
-    commented_ids_stmt = select(Comment.post_id).where(Comment.user_id == current_user_id).distinct()
-    my_commented_ids = set(session.exec(commented_ids_stmt).all())
-
-    # 我关注的用户ID
-    following_ids_stmt = select(UserFollow.followed_id).where(UserFollow.follower_id == current_user_id)
-    my_following_ids = set(session.exec(following_ids_stmt).all())
-
-    # 组装数据
-    results = []
-    for post in posts:
-        asset = post.asset
-        author = post.author
-
-        display_desc = post.content if post.content else asset.description
-
-        results.append({
-            "post_id": post.id,
-            "asset_id": asset.id,
-            "title": asset.title,
-            "cover_url": asset.video_path,
-            "description": display_desc,
-            "tags": asset.tags,
-            "published_at": str(post.published_at),
-            "view_count": post.view_count,
-            "like_count": post.like_count,
-            "collect_count": post.collect_count,
-            "comment_count": post.comment_count,
-            "owner_id": author.id,
-            "owner_name": author.username,
-            "owner_avatar": author.avatar_url,
-            "is_liked": post.id in my_liked_ids,
-            "is_collected": post.id in my_collected_ids,
-            "has_commented": post.id in my_commented_ids,
-            "is_following": author.id in my_following_ids
-        })
-
-    return results
+    return _build_post_cards(session, rows, current_user_id), next_cursor
 
 
 def get_post_by_asset_id(session: Session, asset_id: int) -> CommunityPost | None:
@@ -207,15 +224,41 @@ def create_post(session: Session, user_id: int, post_in: PostCreate) -> Communit
         # published_at
     )
     session.add(db_post)
+    session.flush()
+
+    # 粉丝可见帖子写入粉丝时间线
+    crud_timeline.fan_out_post(session, db_post)
+
     session.commit()
     session.refresh(db_post)
     return db_post
 
 
+def _toggle_link(session: Session, link_model, link_where, new_link) -> Optional[bool]:
+    """
+    切换关联记录：存在则删除，不存在则插入 (调用方负责 commit)
+    以 DELETE 影响行数判断原状态；并发插入撞主键时按 "已存在" 处理
+
+    Returns:
+        切换后是否为激活状态；None 表示并发请求已经完成了同样的插入，计数无需变更
+    """
+    result = session.exec(delete(link_model).where(*link_where))
+    if result.rowcount:
+        return False
+
+    try:
+        with session.begin_nested():
+            session.add(new_link)
+    except IntegrityError:
+        return None
+    return True
+
+
 # 点赞触发
 def toggle_like(session: Session, user_id: int, post_id: int) -> tuple[bool, int]:
     """
     切换帖子点赞状态 (Toggle Like)
+    计数使用 SQL 端原子增减，避免并发点赞丢失增量
 
     Returns:
         (is_liked: bool, new_like_count: int)
@@ -225,41 +268,26 @@ def toggle_like(session: Session, user_id: int, post_id: int) -> tuple[bool, int
     if not post:
         return False, 0
 
-    # 查当前用户的点赞记录
-    statement = select(InteractionLike).where(
-        InteractionLike.user_id == user_id,
-        InteractionLike.post_id == post_id
+    is_active = _toggle_link(
+        session,
+        InteractionLike,
+        (InteractionLike.user_id == user_id, InteractionLike.post_id == post_id),
+        InteractionLike(user_id=user_id, post_id=post_id)
     )
-    like_record = session.exec(statement).first()
-
-    # 查作者
-    author = session.get(User, post.user_id)
-
-    if like_record:
-        # 已点赞 -> 执行取消
-        session.delete(like_record)
-        post.like_count = max(0, post.like_count - 1)
-        if author:
-            author.liked_total_count = max(0, author.liked_total_count - 1)
-        is_active = False
+
+    if is_active is not None:
+        delta = 1 if is_active else -1
+        increment(session, CommunityPost.like_count, CommunityPost.id == post_id, delta)
+        # 作者获赞总数
+        increment(session, User.liked_total_count, User.id == post.user_id, delta)
     else:
-        # 未点赞 -> 执行点赞
-        new_record = InteractionLike(user_id=user_id, post_id=post_id)
-        session.add(new_record)
-        post.like_count += 1
-        if author:
-            author.liked_total_count += 1
         is_active = True
 
     # 提交事务
-    session.add(post)
-    if author:
-        session.add(author)
-
     session.commit()
-    session.refresh(post)
 
-    return is_active, post.like_count
+    new_count = session.exec(select(CommunityPost.like_count).where(CommunityPost.id == post_id)).one()
+    return is_active, new_count
 
 
 def toggle_collection(session: Session, user_id: int, post_id: int) -> tuple[bool, int]:
@@ -273,29 +301,22 @@ def toggle_collection(session: Session, user_id: int, post_id: int) -> tuple[boo
     if not post:
         return False, 0
 
-    statement = select(PostCollection).where(
-        PostCollection.user_id == user_id,
-        PostCollection.post_id == post_id
+    is_active = _toggle_link(
+        session,
+        PostCollection,
+        (PostCollection.user_id == user_id, PostCollection.post_id == post_id),
+        PostCollection(user_id=user_id, post_id=post_id)
     )
-    collect_record = session.exec(statement).first()
 
-    if collect_record:
-        # 取消收藏
-        session.delete(collect_record)
-        post.collect_count = max(0, post.collect_count - 1)
-        is_active = False
+    if is_active is not None:
+        increment(session, CommunityPost.collect_count, CommunityPost.id == post_id, 1 if is_active else -1)
     else:
-        # 收藏
-        new_record = PostCollection(user_id=user_id, post_id=post_id)
-        session.add(new_record)
-        post.collect_count += 1
         is_active = True
 
-    session.add(post)
     session.commit()
-    session.refresh(post)
 
-    return is_active, post.collect_count
+    new_count = session.exec(select(CommunityPost.collect_count).where(CommunityPost.id == post_id)).one()
+    return is_active, new_count
 
 
 # 评论
@@ -315,8 +336,7 @@ def create_comment(session: Session, user_id: int, post_id: int, content: str) -
     session.add(comment)
 
     # 帖子评论数 +1
-    post.comment_count += 1
-    session.add(post)
+    increment(session, CommunityPost.comment_count, CommunityPost.id == post_id)
 
     session.commit()
     session.refresh(comment)
@@ -344,11 +364,8 @@ def get_post_detail(session: Session, post_id: int, current_user_id: int) -> Pos
 
 
 
-    # 增加浏览量
-    post.view_count += 1
-    session.add(post)
-    session.commit()
-    session.refresh(post)  # 刷新以获取最新数据
+    # 增加浏览量：写入内存缓冲，由后台批量写回 (见 app.core.counters)
+    view_counter.incr(post_id)
 
     # 获取关联对象
     asset = post.asset
@@ -413,7 +430,7 @@ def get_post_detail(session: Session, post_id: int, current_user_id: int) -> Pos
         # Stats
         like_count=post.like_count,
         collect_count=post.collect_count,
-        view_count=post.view_count,
+        view_count=post.view_count + view_counter.pending(post_id),
         comment_count=post.comment_count,
 
         # Author Info
@@ -489,7 +506,8 @@ def get_my_collected_posts(session: Session, current_user_id: int) -> List[dict]
             "post_id": post.id,
             "asset_id": asset.id,
             "title": asset.title,
-            "cover_url": asset.video_path,
+            "cover_url": thumbnails.cover_url(asset),
+            "thumbnails": thumbnails.thumbnail_sources(asset),
             "description": display_desc,
             "tags": asset.tags,
             "published_at": str(post.published_at),
@@ -0,0 +1,190 @@
+# 粉丝时间线 (写扩散)：
+# - 作者发布 FOLLOWERS 帖子时，把帖子写入每个粉丝的 TimelineEntry
+# - 关注时回填作者最近的 FOLLOWERS 帖子，取消关注时删除
+# - 每个用户只保留最近 TIMELINE_MAX_ENTRIES 条
+#
+# 混合模式：粉丝数 >= TIMELINE_FANOUT_MAX_FOLLOWERS 的作者不做写扩散，
+# 社区流读取时对这些作者仍按关注关系实时查询 (读扩散)，见 follower_visible_clause。
+
+from sqlalchemy import insert, delete, literal, tuple_, func, exists
+from sqlmodel import Session, select, col, and_
+
+from app.core.config import settings
+from app.models import CommunityPost, TimelineEntry, User, UserFollow, Visibility
+
+
+def _is_fanout_author(author: User) -> bool:
+    return author.follower_count < settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def _not_in_timeline(user_id_expr, post_id_expr):
+    """INSERT ... SELECT 去重条件"""
+    return ~exists().where(
+        TimelineEntry.user_id == user_id_expr,
+        TimelineEntry.post_id == post_id_expr
+    )
+
+
+def _trim(session: Session, user_ids_stmt):
+    """只保留每个用户最近的 TIMELINE_MAX_ENTRIES 条"""
+    ranked = (
+        select(
+            TimelineEntry.user_id,
+            TimelineEntry.post_id,
+            func.row_number().over(
+                partition_by=TimelineEntry.user_id,
+                order_by=(col(TimelineEntry.published_at).desc(), col(TimelineEntry.post_id).desc())
+            ).label("rn")
+        )
+        .where(col(TimelineEntry.user_id).in_(user_ids_stmt))
+        .subquery()
+    )
+    overflow = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.rn > settings.TIMELINE_MAX_ENTRIES)
+
+    session.exec(
+        delete(TimelineEntry).where(
+            tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(overflow)
+        )
+    )
+
+
+def fan_out_post(session: Session, post: CommunityPost):
+    """发布帖子后写入粉丝时间线 (调用方负责 commit)"""
+    if not settings.TIMELINE_ENABLED or post.visibility != Visibility.FOLLOWERS:
+        return
+
+    author = session.get(User, post.user_id)
+    if not author or not _is_fanout_author(author):
+        return
+
+    followers = select(UserFollow.follower_id).where(UserFollow.followed_id == post.user_id)
+    rows = select(
+        UserFollow.follower_id,
+        literal(post.id),
+        literal(post.user_id),
+        literal(post.published_at)
+    ).where(
+        UserFollow.followed_id == post.user_id,
+        _not_in_timeline(UserFollow.follower_id, post.id)
+    )
+    session.exec(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "author_id", "published_at"], rows)
+    )
+    _trim(session, followers)
+
+
+def backfill_follow(session: Session, follower_id: int, author: User):
+    """关注后回填作者最近的 FOLLOWERS 帖子 (调用方负责 commit)"""
+    if not settings.TIMELINE_ENABLED or not _is_fanout_author(author):
+        return
+
+    recent_posts = (
+        select(
+            literal(follower_id),
+            CommunityPost.id,
+            CommunityPost.user_id,
+            CommunityPost.published_at
+        )
+        .where(
+            CommunityPost.user_id == author.id,
+            CommunityPost.visibility == Visibility.FOLLOWERS,
+            _not_in_timeline(follower_id, CommunityPost.id)
+        )
+        .order_by(col(CommunityPost.published_at).desc())
+        .limit(settings.TIMELINE_MAX_ENTRIES)
+    )
+    session.exec(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "author_id", "published_at"], recent_posts)
+    )
+    _trim(session, select(literal(follower_id)))
+
+
+def remove_follow(session: Session, follower_id: int, author_id: int):
+    """取消关注后清理该作者的条目 (调用方负责 commit)"""
+    if not settings.TIMELINE_ENABLED:
+        return
+
+    session.exec(
+        delete(TimelineEntry).where(
+            TimelineEntry.user_id == follower_id,
+            TimelineEntry.author_id == author_id
+        )
+    )
+
+
+def backfill_author(session: Session, author_id: int):
+    """
+    把作者全部 FOLLOWERS 帖子写入所有粉丝的时间线 (调用方负责 commit)
+    用于作者粉丝数回落到阈值以下 (读扩散 -> 写扩散) 以及首次启用时的全量回填
+    """
+    if not settings.TIMELINE_ENABLED:
+        return
+
+    rows = (
+        select(
+            UserFollow.follower_id,
+            CommunityPost.id,
+            CommunityPost.user_id,
+            CommunityPost.published_at
+        )
+        .join(CommunityPost, CommunityPost.user_id == UserFollow.followed_id)
+        .where(
+            UserFollow.followed_id == author_id,
+            CommunityPost.visibility == Visibility.FOLLOWERS,
+            _not_in_timeline(UserFollow.follower_id, CommunityPost.id)
+        )
+    )
+    session.exec(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "author_id", "published_at"], rows)
+    )
+    _trim(session, select(UserFollow.follower_id).where(UserFollow.followed_id == author_id))
+
+
+def follower_visible_clause(current_user_id: int):
+    """
+    社区流中 FOLLOWERS 帖子的可见条件
+    - 未启用时：作者在我的关注列表里 (每次请求读扩散)
+    - 启用时：帖子在我的时间线里，或作者是我关注的大 V (读扩散)
+    """
+    following_subquery = select(UserFollow.followed_id).where(
+        UserFollow.follower_id == current_user_id
+    )
+    if not settings.TIMELINE_ENABLED:
+        return and_(
+            CommunityPost.visibility == Visibility.FOLLOWERS,
+            col(CommunityPost.user_id).in_(following_subquery)
+        )
+
+    timeline_subquery = select(TimelineEntry.post_id).where(TimelineEntry.user_id == current_user_id)
+    large_authors_subquery = (
+        select(UserFollow.followed_id)
+        .join(User, User.id == UserFollow.followed_id)
+        .where(
+            UserFollow.follower_id == current_user_id,
+            User.follower_count >= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        )
+    )
+    return and_(
+        CommunityPost.visibility == Visibility.FOLLOWERS,
+        col(CommunityPost.id).in_(timeline_subquery) | col(CommunityPost.user_id).in_(large_authors_subquery)
+    )
+
+
+def backfill_all(session: Session) -> int:
+    """为全部写扩散作者回填时间线，返回处理的作者数"""
+    authors = session.exec(
+        select(User.id).where(User.follower_count < settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+    ).all()
+    for author_id in authors:
+        backfill_author(session, author_id)
+        session.commit()
+    return len(authors)
+
+
+if __name__ == "__main__":
+    # 首次启用 TIMELINE_ENABLED 时执行：python -m app.crud.crud_timeline
+    from app.database import engine
+
+    with Session(engine) as session:
+        count = backfill_all(session)
+    print(f"时间线回填完成，共 {count} 位作者")
@@ -1,12 +1,20 @@
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import User, UserFollow
 from app.schemas import UserCreate, UserUpdate
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash, get_password_hash_async
+from app.core.config import settings
+from app.crud import crud_timeline
+from app.core.counters import increment
+from app.core.auth_cache import principal_cache
 
 
 def toggle_follow(session: Session, follower_id: int, followed_id: int) -> tuple[bool, int]:
     """
     切换关注状态
+    计数使用 SQL 端原子增减，避免并发关注丢失增量
 
     Returns:
         is_following: bool (当前是否关注)
@@ -15,13 +23,6 @@ def toggle_follow(session: Session, follower_id: int, followed_id: int) -> tuple
     if follower_id == followed_id:
         return False, 0  # 不能关注自己
 
-    # 查关注记录
-    statement = select(UserFollow).where(
-        UserFollow.follower_id == follower_id,
-        UserFollow.followed_id == followed_id
-    )
-    link = session.exec(statement).first()
-
     # 获取两个用户实体
     follower = session.get(User, follower_id)  # 我
     target_user = session.get(User, followed_id)  # 我要关注的人
@@ -29,29 +30,47 @@ def toggle_follow(session: Session, follower_id: int, followed_id: int) -> tuple
     if not follower or not target_user:
         return False, 0
 
-    if link:
-        # 取消关注
-        session.delete(link)
+    # 以删除影响行数判断原状态
+    result = session.exec(delete(UserFollow).where(
+        UserFollow.follower_id == follower_id,
+        UserFollow.followed_id == followed_id
+    ))
 
-        # 更新计数
-        follower.following_count = max(0, follower.following_count - 1)
-        target_user.follower_count = max(0, target_user.follower_count - 1)
+    if result.rowcount:
+        # 取消关注：更新计数
+        increment(session, User.following_count, User.id == follower_id, -1)
+        increment(session, User.follower_count, User.id == followed_id, -1)
+        session.flush()
+        session.refresh(target_user)
+
+        # 时间线：清理该作者的条目；作者粉丝数回落到阈值以下时恢复写扩散
+        crud_timeline.remove_follow(session, follower_id, followed_id)
+        if target_user.follower_count == settings.TIMELINE_FANOUT_MAX_FOLLOWERS - 1:
+            crud_timeline.backfill_author(session, followed_id)
 
         is_following = False
     else:
         # --- 关注 ---
-        new_link = UserFollow(follower_id=follower_id, followed_id=followed_id)
-        session.add(new_link)
+        try:
+            with session.begin_nested():
+                session.add(UserFollow(follower_id=follower_id, followed_id=followed_id))
+        except IntegrityError:
+            # 并发请求已经关注过
+            session.commit()
+            session.refresh(target_user)
+            return True, target_user.follower_count
 
         # 更新计数
-        follower.following_count += 1
-        target_user.follower_count += 1
+        increment(session, User.following_count, User.id == follower_id, 1)
+        increment(session, User.follower_count, User.id == followed_id, 1)
+        session.flush()
+        session.refresh(target_user)
 
-        is_following = True
+        # 时间线：回填作者最近的粉丝可见帖子
+        crud_timeline.backfill_follow(session, follower_id, target_user)
 
+        is_following = True
 
-    session.add(follower)
-    session.add(target_user)
     session.commit()
 
     # 刷新目标用户数据，返回最新的粉丝数
@@ -64,13 +83,8 @@ DEFAULT_AVATAR = "/static/avatars/default.png"
 DEFAULT_COVER = "/static/avatars/default_cover.png"
 
 
-def create_user(session: Session, user_in: UserCreate) -> User:
-    """创建新用户"""
-    # 将明文密码加密
-    hashed_password = get_password_hash(user_in.password)
-
-    # 创建数据库对象
-    db_user = User(
+def _new_user(user_in: UserCreate, hashed_password: str) -> User:
+    return User(
         username=user_in.username,
         password_hash=hashed_password,
         avatar_url=DEFAULT_AVATAR,
@@ -78,12 +92,31 @@ def create_user(session: Session, user_in: UserCreate) -> User:
     )
 
 
+def create_user(session: Session, user_in: UserCreate) -> User:
+    """创建新用户"""
+    # 将明文密码加密
+    hashed_password = get_password_hash(user_in.password)
+
+    # 创建数据库对象
+    db_user = _new_user(user_in, hashed_password)
+
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
     return db_user
 
 
+async def create_user_async(session: AsyncSession, user_in: UserCreate) -> User:
+    """创建新用户 (密码哈希在专用线程池中计算)"""
+    hashed_password = await get_password_hash_async(user_in.password)
+
+    db_user = _new_user(user_in, hashed_password)
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    return db_user
+
+
 # 更新头像
 def update_avatar(session: Session, user_id: int, new_avatar_url: str) -> User:
     """更新用户头像"""
@@ -93,6 +126,7 @@ def update_avatar(session: Session, user_id: int, new_avatar_url: str) -> User:
         session.add(user)
         session.commit()
         session.refresh(user)
+        principal_cache.invalidate_user(user_id)
     return user
 
 
@@ -116,6 +150,12 @@ def get_user_by_username(session: Session, username: str) -> User | None:
     return session.exec(statement).first()
 
 
+async def get_user_by_username_async(session: AsyncSession, username: str) -> User | None:
+    """通过用户名查找用户 (异步)"""
+    statement = select(User).where(User.username == username)
+    return (await session.exec(statement)).first()
+
+
 def update_profile(session: Session, user_id: int, user_in: UserUpdate) -> User:
     """
     更新用户基本信息
@@ -133,4 +173,5 @@ def update_profile(session: Session, user_id: int, user_in: UserUpdate) -> User:
     session.add(user)
     session.commit()
     session.refresh(user)
+    principal_cache.invalidate_user(user_id)
     return user
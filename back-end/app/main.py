@@ -1,8 +1,20 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from .database import init_db
 from .api.v1.api import api_router
-from fastapi.staticfiles import StaticFiles
+from .core.config import settings
+from .database import pool_metrics, async_engine
+from .core.socket_manager import manager
+from .ngp.job_queue import training_dispatcher
+from .core.stream_manager import stream_pool
+from .core.renderer_pool import renderer_pool
+from .core.counters import counter_maintainer
+from .core.message_writer import message_writer
+from .core.security import password_hasher
+from .core.thumbnails import thumbnail_worker
+from .core.static_files import AssetStaticFiles
+from .ngp.export import export_queue
 
 # 定义生命周期
 @asynccontextmanager
@@ -10,16 +22,41 @@ async def lifespan(app: FastAPI):
     print("正在初始化数据库...")
     init_db()
     print("数据库初始化完成！")
+    manager.bind_loop(asyncio.get_running_loop())
+    await manager.start()
+    if settings.TRAIN_DISPATCHER_ENABLED:
+        training_dispatcher.start()
+    if settings.STREAM_HEADLESS:
+        renderer_pool.start()
+    counter_maintainer.start()
+    export_queue.start()
     yield
     print("服务器正在关闭...")
+    training_dispatcher.stop()
+    stream_pool.shutdown()
+    renderer_pool.shutdown()
+    counter_maintainer.stop()
+    await message_writer.close()
+    await manager.shutdown()
+    password_hasher.shutdown()
+    thumbnail_worker.shutdown()
+    export_queue.shutdown()
+    await async_engine.dispose()
 
 # 初始化 App
 app = FastAPI(title="Delta3D", lifespan=lifespan)
 app.include_router(api_router, prefix="/api/v1")
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
 
 @app.get("/")
 def root():
     return {"message": "Hello Delta3D!"}
 
+
+if settings.DB_METRICS_ENABLED:
+    @app.get("/metrics/db")
+    def db_metrics():
+        """数据库连接池指标 (连接数、借出次数、占用时长)"""
+        return pool_metrics.snapshot()
+
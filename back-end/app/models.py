@@ -1,7 +1,8 @@
 import random
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, Relationship, SQLModel, JSON
 from pathlib import Path
 
@@ -25,6 +26,21 @@ class AssetStatus(str, Enum):
     FAILED = "failed"
 
 
+class JobStatus(str, Enum):
+    """训练任务状态：排队中、运行中、完成、失败"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class UploadStatus(str, Enum):
+    """分片上传状态：上传中、已提交、已放弃"""
+    UPLOADING = "uploading"
+    COMMITTED = "committed"
+    ABORTED = "aborted"
+
+
 class Gender(str, Enum):
     """性别：男、女、其他、保密"""
     MALE = "male"
@@ -39,6 +55,11 @@ class Gender(str, Enum):
 
 class UserFollow(SQLModel, table=True):
     """用户关注关联表"""
+    __table_args__ = (
+        # 主键 (follower_id, followed_id) 只覆盖“我关注了谁”，粉丝列表 / 写扩散需要反向索引
+        Index("ix_userfollow_followed_follower", "followed_id", "follower_id"),
+    )
+
     follower_id: int = Field(foreign_key="user.id", primary_key=True)
     followed_id: int = Field(foreign_key="user.id", primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -60,6 +81,10 @@ class ModelCollection(SQLModel, table=True):
 
 class InteractionLike(SQLModel, table=True):
     """点赞关联表"""
+    __table_args__ = (
+        Index("ix_interactionlike_post_id", "post_id"),
+    )
+
     user_id: int = Field(foreign_key="user.id", primary_key=True)
     post_id: int = Field(foreign_key="communitypost.id", primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -130,11 +155,20 @@ class User(SQLModel, table=True):
 
 class ModelAsset(SQLModel, table=True):
     """模型资产 (私有库)"""
+    __table_args__ = (
+        # 我的模型按 created_at 倒序
+        Index("ix_modelasset_user_created_at", "user_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", description="拥有者ID")
 
     video_path: str = Field(description="原始视频路径")
     model_path: Optional[str] = Field(default=None, description="模型文件路径")
+    snapshot_hash: Optional[str] = Field(default=None, description="模型快照 sha256 (导出缓存的 key)")
+    thumbnails: Optional[Dict[str, Any]] = Field(
+        default=None, sa_type=JSON(none_as_null=True), description="封面缩略图 (未生成时为 NULL)"
+    )
 
     title: str = Field(max_length=100)
     description: Optional[str] = None
@@ -163,6 +197,14 @@ class ModelAsset(SQLModel, table=True):
 
 class CommunityPost(SQLModel, table=True):
     """社区帖子 (公开展示)"""
+    __table_args__ = (
+        # 社区流按 (published_at, id) 倒序做游标分页
+        Index("ix_communitypost_published_at_id", "published_at", "id"),
+        Index("ix_communitypost_visibility_published_at", "visibility", "published_at"),
+        Index("ix_communitypost_user_published_at", "user_id", "published_at"),
+        Index("ix_communitypost_asset_id", "asset_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     asset_id: int = Field(foreign_key="modelasset.id")
@@ -190,8 +232,27 @@ class CommunityPost(SQLModel, table=True):
     liked_by_users: List[User] = Relationship(link_model=InteractionLike)
 
 
+class TimelineEntry(SQLModel, table=True):
+    """粉丝时间线：FOLLOWERS 帖子发布时写入每个粉丝名下 (见 app.crud.crud_timeline)"""
+    __table_args__ = (
+        Index("ix_timelineentry_user_published_at", "user_id", "published_at", "post_id"),
+    )
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True, description="时间线所属用户 (粉丝)")
+    post_id: int = Field(foreign_key="communitypost.id", primary_key=True)
+    author_id: int = Field(foreign_key="user.id", index=True)
+    published_at: datetime
+
+
 class Comment(SQLModel, table=True):
     """评论"""
+    __table_args__ = (
+        # 帖子详情按时间倒序取评论
+        Index("ix_comment_post_created_at", "post_id", "created_at"),
+        # “我评论过的帖子”
+        Index("ix_comment_user_post", "user_id", "post_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     post_id: int = Field(foreign_key="communitypost.id")
@@ -206,6 +267,11 @@ class Comment(SQLModel, table=True):
 
 class DownloadRecord(SQLModel, table=True):
     """下载记录"""
+    __table_args__ = (
+        # 下载历史按 asset 分组取 max(created_at)，索引可直接覆盖
+        Index("ix_downloadrecord_user_asset_created_at", "user_id", "asset_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
 
@@ -221,10 +287,117 @@ class DownloadRecord(SQLModel, table=True):
 
 class Message(SQLModel, table=True):
     """私信"""
+    __table_args__ = (
+        # 两人聊天记录 / 会话列表 (sender_id = me 的一侧)
+        Index("ix_message_sender_receiver_created_at", "sender_id", "receiver_id", "created_at"),
+        # 会话列表 (receiver_id = me 的一侧) / 未读统计与标记已读
+        Index("ix_message_receiver_sender_is_read", "receiver_id", "sender_id", "is_read"),
+        # 聊天记录按 (会话对, id) 倒序游标翻页
+        Index("ix_message_pair_id", "user_low_id", "user_high_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     sender_id: int = Field(foreign_key="user.id")
     receiver_id: int = Field(foreign_key="user.id")
+    # 会话对 (较小 id, 较大 id)，与 Conversation 主键一致
+    user_low_id: Optional[int] = Field(default=None)
+    user_high_id: Optional[int] = Field(default=None)
 
     content: str
     is_read: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Conversation(SQLModel, table=True):
+    """
+    会话摘要 (每对用户一行，写消息时维护，见 app.crud.crud_chat)
+    用户对按 (较小 id, 较大 id) 存储，未读数分别记在两侧
+    """
+    __table_args__ = (
+        # 收件箱按最后一条消息时间倒序，me 可能在任意一侧
+        Index("ix_conversation_high_last_time", "user_high_id", "last_message_time"),
+        Index("ix_conversation_low_last_time", "user_low_id", "last_message_time"),
+    )
+
+    user_low_id: int = Field(foreign_key="user.id", primary_key=True)
+    user_high_id: int = Field(foreign_key="user.id", primary_key=True)
+    last_message_id: int = Field(foreign_key="message.id")
+    last_message_time: datetime
+    unread_low: int = Field(default=0, description="user_low_id 的未读数")
+    unread_high: int = Field(default=0, description="user_high_id 的未读数")
+
+
+class TrainingJob(SQLModel, table=True):
+    """训练任务 (持久化队列，进程重启后可恢复)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    asset_id: int = Field(foreign_key="modelasset.id", index=True)
+    user_id: int = Field(foreign_key="user.id", index=True, description="提交者ID，用于公平调度")
+
+    priority: int = Field(default=0, description="优先级，越大越先执行")
+    status: JobStatus = Field(default=JobStatus.QUEUED, index=True)
+    attempts: int = Field(default=0, description="已尝试次数")
+    error: Optional[str] = Field(default=None, description="最近一次失败原因")
+    current_stage: Optional[str] = Field(default=None, description="流水线当前阶段")
+    stage_timings: Dict[str, float] = Field(default={}, sa_type=JSON, description="各阶段耗时(秒)")
+    owner_id: Optional[str] = Field(default=None, description="领取任务的调度器 (主机名:pid:随机串)")
+    heartbeat_at: Optional[datetime] = Field(default=None, description="租约心跳，超过 TRAIN_LEASE_TTL 未刷新视为调度器已退出")
+
+    video_disk_path: str = Field(description="视频磁盘路径")
+    video_hash: Optional[str] = Field(default=None, description="视频 sha256，用于训练结果缓存")
+    snapshot_disk_path: str = Field(description="快照输出磁盘路径")
+    web_model_path: str = Field(description="训练完成后写入 ModelAsset.model_path 的路径")
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ExportJob(SQLModel, table=True):
+    """模型导出任务 (OBJ/GLB/PLY)，每个 (资产, 格式, 分辨率) 一条，快照变化后重新导出"""
+    __table_args__ = (
+        UniqueConstraint("asset_id", "format", "resolution", name="uq_exportjob_asset_format_res"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    asset_id: int = Field(foreign_key="modelasset.id")
+    user_id: int = Field(foreign_key="user.id", description="首次请求者ID")
+
+    format: str = Field(description="导出格式 obj/glb/ply")
+    resolution: int = Field(description="marching cubes 分辨率")
+    snapshot_hash: Optional[str] = Field(default=None, description="导出所用快照的 sha256")
+
+    status: JobStatus = Field(default=JobStatus.QUEUED, index=True)
+    attempts: int = Field(default=0, description="已尝试次数")
+    error: Optional[str] = Field(default=None, description="最近一次失败原因")
+    output_path: Optional[str] = Field(default=None, description="导出文件磁盘路径 (内容寻址缓存)")
+    file_size: Optional[int] = None
+    owner_id: Optional[str] = Field(default=None, description="执行导出的进程 (主机名:pid:随机串)")
+    heartbeat_at: Optional[datetime] = Field(default=None, description="租约心跳，超过 EXPORT_LEASE_TTL 未刷新视为进程已退出")
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class UploadSession(SQLModel, table=True):
+    """分片上传会话 (断点续传，见 assets.py /uploads)"""
+    id: str = Field(primary_key=True, description="上传会话 ID (uuid hex)")
+    user_id: int = Field(foreign_key="user.id", index=True)
+
+    filename: str = Field(description="客户端文件名")
+    total_size: int = Field(description="文件总字节数")
+    received_bytes: int = Field(default=0, description="已写入磁盘的字节数 (续传偏移)")
+    sha256: Optional[str] = Field(default=None, description="客户端声明的 sha256，提交时校验")
+    status: UploadStatus = Field(default=UploadStatus.UPLOADING)
+    meta: Dict[str, Any] = Field(default={}, sa_type=JSON, description="资产信息 (标题/描述/标签等)")
+    asset_id: Optional[int] = Field(default=None, description="提交后生成的资产ID")
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SchemaMigration(SQLModel, table=True):
+    """已执行的数据库迁移 (见 app.core.migrations)"""
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
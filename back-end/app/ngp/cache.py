@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+from app.core.config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 场景缓存中保存的文件 (相对 scene_dir)
+SCENE_ITEMS = ["images", "colmap_text", "transforms.json"]
+# 命中场景缓存时可以跳过的阶段
+SCENE_STAGES = ["extract", "sharpen", "features", "mapper", "transforms"]
+META_FILE = "meta.json"
+
+
+def hash_file(path: str) -> str:
+    """流式计算文件 sha256"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str):
+    """优先硬链接 (不占额外空间)，跨盘等情况退回复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _dir_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class TrainingCache:
+    """
+    内容寻址的训练结果缓存
+    - 场景缓存：key = (视频 hash, video_fps, camera_model, matcher, aabb_scale, sharpen)
+      保存 images/、colmap_text/、transforms.json，命中后跳过抽帧到 transforms 的全部阶段
+    - 快照缓存：key = 场景 key + n_steps，命中后连训练也跳过
+
+    目录结构：
+      <root>/scenes/<scene_key>/{images, colmap_text, transforms.json, meta.json}
+      <root>/snapshots/<scene_key>_<n_steps>/{model.msgpack, meta.json}
+
+    meta.json 的 mtime 作为最近访问时间，超过容量上限时按 LRU 淘汰
+    """
+
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # key
+    # -------------------------------------------------------------------------
+    def _video_hash(self, ctx) -> str:
+        if not ctx.video_hash:
+            ctx.video_hash = hash_file(ctx.video_path)
+        return ctx.video_hash
+
+    def scene_key(self, ctx) -> str:
+        raw = "|".join([
+            self._video_hash(ctx),
+            str(ctx.video_fps),
+            ctx.colmap_camera_model,
+            ctx.colmap_matcher,
+            str(ctx.aabb_scale),
+            str(ctx.sharpen_strength),
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _scene_dir(self, key: str) -> Path:
+        return self.root / "scenes" / key
+
+    def _snapshot_dir(self, key: str, n_steps: int) -> Path:
+        return self.root / "snapshots" / f"{key}_{n_steps}"
+
+    # -------------------------------------------------------------------------
+    # 读取
+    # -------------------------------------------------------------------------
+    def restore(self, ctx) -> List[str]:
+        """
+        尝试从缓存恢复到 ctx.scene_dir / ctx.snapshot_path
+
+        Returns:
+            可以跳过的阶段名列表
+        """
+        if not self.enabled:
+            return []
+
+        key = self.scene_key(ctx)
+        scene_entry = self._scene_dir(key)
+        if not (scene_entry / META_FILE).exists():
+            return []
+
+        skipped = list(SCENE_STAGES)
+        try:
+            for item in SCENE_ITEMS:
+                src = scene_entry / item
+                dst = ctx.scene_dir / item
+                if dst.is_dir():
+                    shutil.rmtree(dst)
+                elif dst.exists():
+                    dst.unlink()
+                if src.is_dir():
+                    shutil.copytree(src, dst, copy_function=_link_or_copy)
+                else:
+                    _link_or_copy(str(src), str(dst))
+
+            ctx.frames = json.loads((scene_entry / META_FILE).read_text(encoding="utf-8")).get("frames", 0)
+            self._touch(scene_entry)
+
+            snapshot_entry = self._snapshot_dir(key, ctx.n_steps)
+            if (snapshot_entry / META_FILE).exists():
+                Path(ctx.snapshot_path).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(snapshot_entry / "model.msgpack", ctx.snapshot_path)
+                self._touch(snapshot_entry)
+                skipped.append("train")
+        except (OSError, ValueError) as e:
+            # 缓存损坏：按未命中处理，由正常流程覆盖
+            print(f"[Cache] 恢复失败，按未命中处理: {e}")
+            return []
+
+        print(f"[Cache] 命中 {key}，跳过阶段: {skipped}")
+        return skipped
+
+    # -------------------------------------------------------------------------
+    # 写入
+    # -------------------------------------------------------------------------
+    def store(self, ctx, stage_name: str):
+        """阶段完成后写入缓存：transforms 完成写场景，train 完成写快照"""
+        if not self.enabled:
+            return
+
+        try:
+            key = self.scene_key(ctx)
+            if stage_name == "transforms":
+                self._store_entry(self._scene_dir(key), [
+                    (ctx.scene_dir / item, item) for item in SCENE_ITEMS
+                ], {"frames": ctx.frames, "video_hash": ctx.video_hash})
+            elif stage_name == "train":
+                self._store_entry(self._snapshot_dir(key, ctx.n_steps), [
+                    (Path(ctx.snapshot_path), "model.msgpack")
+                ], {"n_steps": ctx.n_steps, "video_hash": ctx.video_hash})
+            else:
+                return
+        except OSError as e:
+            print(f"[Cache] 写入失败 (忽略): {e}")
+            return
+
+        self.evict()
+
+    def _store_entry(self, entry: Path, items: list, meta: dict):
+        if (entry / META_FILE).exists():
+            self._touch(entry)
+            return
+
+        # 先写临时目录再原子改名，避免并发任务读到写了一半的缓存
+        tmp = entry.parent / f".tmp_{entry.name}_{uuid.uuid4().hex[:8]}"
+        tmp.mkdir(parents=True, exist_ok=True)
+        try:
+            for src, name in items:
+                if src.is_dir():
+                    shutil.copytree(src, tmp / name)
+                else:
+                    shutil.copy2(src, tmp / name)
+            (tmp / META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not (entry / META_FILE).exists():
+                raise
+
+    # -------------------------------------------------------------------------
+    # 淘汰
+    # -------------------------------------------------------------------------
+    def _touch(self, entry: Path):
+        now = time.time()
+        os.utime(entry / META_FILE, (now, now))
+
+    def evict(self) -> int:
+        """
+        超过 max_bytes 时按最近访问时间从旧到新删除条目
+
+        Returns:
+            释放的字节数
+        """
+        with self._lock:
+            entries = []
+            for kind in ("scenes", "snapshots"):
+                kind_dir = self.root / kind
+                if not kind_dir.exists():
+                    continue
+                for entry in kind_dir.iterdir():
+                    meta = entry / META_FILE
+                    if entry.name.startswith(".tmp_") or not meta.exists():
+                        continue
+                    entries.append((meta.stat().st_mtime, _dir_size(entry), entry))
+
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                freed += size
+                print(f"[Cache] 淘汰 {entry.name} ({size} bytes)")
+
+            return freed
+
+
+# 全局单例
+training_cache = TrainingCache(
+    root=settings.TRAIN_CACHE_DIR,
+    max_bytes=settings.TRAIN_CACHE_MAX_BYTES,
+    enabled=settings.TRAIN_CACHE_ENABLED
+)
@@ -1,7 +1,10 @@
 import os
+import shutil
+from glob import glob
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any
 from app.process_manager.utils import run_and_stream, NonBlockingCommandRunner
+from app.ngp.cache import training_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,125 +14,280 @@ ENV_COLMAP2NERF = os.getenv("COLMAP2NERF_SCRIPT_PATH")
 ENV_NGP_RUN = os.getenv("NGP_RUN_SCRIPT_PATH")
 
 
-def train_ngp_from_video(
-        video_path: str,
-        snapshot_path: str,
-        *,
-        venv_python: Optional[str] = None,
-        colmap2nerf_script: Optional[str] = None,
-        ngp_run_script: Optional[str] = None,
-        video_fps: int = 5,
-        n_steps: int = 5000,
-        colmap_camera_model: str = "SIMPLE_RADIAL",
-        aabb_scale: int = 8,
-        colmap_matcher: str = "exhaustive",
-        # sharpen_strength: float = 0.0,
-        user_input: str = "y\ny\n",
-        scene_dir: Optional[str] = None,
-) -> Dict[str, Any]:
+class TrainingContext:
+    """
+    单个训练任务在各阶段之间传递的上下文
+    目录布局与原 colmap2nerf.py 一致：
+      <scene_dir>/video.mp4, images/, colmap.db, colmap_sparse/, colmap_text/, transforms.json
     """
-    输入：
-      - video_path: 视频文件路径
-      - snapshot_path: 训练输出的模型快照路径（.msgpack）
 
-    输出：
-      - 返回 dict，包含 scene_dir、transforms.json 路径、抽帧数量等信息
+    def __init__(
+            self,
+            video_path: str,
+            snapshot_path: str,
+            *,
+            venv_python: Optional[str] = None,
+            colmap2nerf_script: Optional[str] = None,
+            ngp_run_script: Optional[str] = None,
+            video_fps: int = 5,
+            n_steps: int = 5000,
+            colmap_camera_model: str = "SIMPLE_RADIAL",
+            aabb_scale: int = 8,
+            colmap_matcher: str = "exhaustive",
+            sharpen_strength: float = 0.0,
+            video_hash: Optional[str] = None,
+    ):
+        self.venv_python = venv_python or ENV_NGP_PYTHON
+        self.colmap2nerf_script = colmap2nerf_script or ENV_COLMAP2NERF
+        self.ngp_run_script = ngp_run_script or ENV_NGP_RUN
 
-    失败时：
-      - 抛出 RuntimeError / FileNotFoundError
-    """
+        self.video_path = str(Path(video_path).resolve())
+        self.snapshot_path = str(snapshot_path)
+
+        self.video_fps = video_fps
+        self.n_steps = n_steps
+        self.colmap_camera_model = colmap_camera_model
+        self.aabb_scale = aabb_scale
+        self.colmap_matcher = colmap_matcher
+        self.sharpen_strength = sharpen_strength
+        self.video_hash = video_hash
+
+        # 场景目录即视频所在目录
+        self.scene_dir = Path(self.video_path).parent
+        self.images_dir = self.scene_dir / "images"
+        self.colmap_db = self.scene_dir / "colmap.db"
+        self.sparse_dir = self.scene_dir / "colmap_sparse"
+        self.text_dir = self.scene_dir / "colmap_text"
+        self.transforms_path = self.scene_dir / "transforms.json"
+
+        # 阶段产出
+        self.frames = 0
+
+        # 子进程结构化进度回调 (由流水线注入，见 app.ngp.progress)
+        self.on_progress: Optional[Callable[[dict], None]] = None
+
+    def validate(self):
+        """完整性检查，失败时抛出 ValueError / FileNotFoundError"""
+        if not self.venv_python:
+            raise ValueError("未配置 Python 路径: 请在 .env 设置 NGP_PYTHON_PATH 或在调用时传入")
+        if not self.colmap2nerf_script:
+            raise ValueError("未配置 colmap2nerf 路径: 请在 .env 设置 COLMAP2NERF_SCRIPT_PATH")
+        if not self.ngp_run_script:
+            raise ValueError("未配置 run.py 路径: 请在 .env 设置 NGP_RUN_SCRIPT_PATH")
 
-    venv_python = venv_python or ENV_NGP_PYTHON
-    colmap2nerf_script = colmap2nerf_script or ENV_COLMAP2NERF
-    ngp_run_script = ngp_run_script or ENV_NGP_RUN
-
-    # 完整性检查
-    if not venv_python:
-        raise ValueError("未配置 Python 路径: 请在 .env 设置 NGP_PYTHON_PATH 或在调用时传入")
-    if not colmap2nerf_script:
-        raise ValueError("未配置 colmap2nerf 路径: 请在 .env 设置 COLMAP2NERF_SCRIPT_PATH")
-    if not ngp_run_script:
-        raise ValueError("未配置 run.py 路径: 请在 .env 设置 NGP_RUN_SCRIPT_PATH")
-    video_path = Path(video_path).resolve()
-
-    video_dir = str(video_path.parent)
-    # print(video_dir, type(video_path))
-    video_path = str(video_path)
-    # return
-
-    if not Path(video_path).exists():
-        raise FileNotFoundError(f"视频不存在: {video_path}")
-
-    if not Path(venv_python).exists():
-        raise FileNotFoundError(f"Python 不存在: {venv_python}")
-
-    if not Path(colmap2nerf_script).exists():
-        raise FileNotFoundError(f"colmap2nerf.py 不存在: {colmap2nerf_script}")
-
-    if not Path(ngp_run_script).exists():
-        raise FileNotFoundError(f"run.py 不存在: {ngp_run_script}")
-
-    # if scene_dir is None:
-    #     scene_path = snapshot_path.parent / f"{snapshot_path.stem}_scene"
-    # else:
-    #     scene_path = Path(scene_dir).resolve()
-    #
-    # scene_path.mkdir(parents=True, exist_ok=True)
-
-    # transforms.json
-    video_dir = Path(video_path).resolve().parent
-    transforms_path = video_dir / "transforms.json"
-
-    # colmap2nerf：视频 -> transforms.json
-    colmap_cmd = [
-        venv_python,
-        colmap2nerf_script,
-        "--colmap_camera_model", colmap_camera_model,
-        "--aabb_scale", str(aabb_scale),
-        "--video_in", str(video_path),
-        "--video_fps", str(video_fps),
-        "--run_colmap",
-        "--colmap_matcher", colmap_matcher,
-        "--out", str(transforms_path),
-        "--overwrite",
-        # "--sharpen_strength", str(sharpen_strength)
+        if not Path(self.video_path).exists():
+            raise FileNotFoundError(f"视频不存在: {self.video_path}")
+
+        if not Path(self.venv_python).exists():
+            raise FileNotFoundError(f"Python 不存在: {self.venv_python}")
+
+        if not Path(self.colmap2nerf_script).exists():
+            raise FileNotFoundError(f"colmap2nerf.py 不存在: {self.colmap2nerf_script}")
+
+        if not Path(self.ngp_run_script).exists():
+            raise FileNotFoundError(f"run.py 不存在: {self.ngp_run_script}")
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "scene_dir": str(self.scene_dir),
+            "transforms_json": str(self.transforms_path),
+            "snapshot_path": str(self.snapshot_path),
+            "frames": self.frames,
+            "video_path": self.video_path,
+        }
+
+
+def _binary(name: str) -> str:
+    """确认可执行文件在 PATH 里"""
+    return shutil.which(name) or name
+
+
+def _reset_dir(path: Path):
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True, exist_ok=True)
+
+
+# =============================================================================
+# 训练流水线各阶段
+# 每个阶段只依赖上一阶段写到 scene_dir 的文件，可以在不同线程/进程中执行
+# =============================================================================
+
+def stage_extract(ctx: TrainingContext):
+    """抽帧：视频 -> images/%04d.jpg"""
+    ctx.validate()
+    _reset_dir(ctx.images_dir)
+
+    fps = float(ctx.video_fps) or 1.0
+    cmd = [
+        _binary("ffmpeg"),
+        "-hide_banner",
+        "-i", ctx.video_path,
+        "-qscale:v", "1",
+        "-qmin", "1",
+        "-vf", f"fps={fps}",
+        str(ctx.images_dir / "%04d.jpg"),
     ]
+    NonBlockingCommandRunner(cmd, cwd=str(ctx.scene_dir)).run()
+
+    if not glob(str(ctx.images_dir / "*.jpg")):
+        raise RuntimeError(f"抽帧失败，未生成图片：{ctx.images_dir}")
+
+
+def stage_sharpen(ctx: TrainingContext):
+    """锐化：与 colmap2nerf.py 的 sharpen_image 相同的 unsharp mask，strength<=0 时跳过"""
+    strength = ctx.sharpen_strength
+    if strength <= 0:
+        return
+
+    import cv2
 
-    success, tip, frames = run_and_stream(colmap_cmd, user_input, cwd=video_dir)
+    img_files = glob(str(ctx.images_dir / "*.jpg"))
+    for img_file in img_files:
+        img = cv2.imread(img_file)
+        if img is None:
+            continue
+        blurred = cv2.GaussianBlur(img, (0, 0), strength)
+        sharpened = cv2.addWeighted(img, 1.5 + strength, blurred, -0.5 * strength, 0)
+        cv2.imwrite(img_file, sharpened)
+    print(f"Sharpened {len(img_files)} images.")
+
+
+def stage_features(ctx: TrainingContext):
+    """COLMAP 特征提取 + 匹配 (CPU 密集)"""
+    colmap = _binary("colmap")
+    if ctx.colmap_db.exists():
+        ctx.colmap_db.unlink()
+
+    NonBlockingCommandRunner([
+        colmap, "feature_extractor",
+        "--ImageReader.camera_model", ctx.colmap_camera_model,
+        "--ImageReader.camera_params", "",
+        "--SiftExtraction.estimate_affine_shape=true",
+        "--SiftExtraction.domain_size_pooling=true",
+        "--ImageReader.single_camera", "1",
+        "--database_path", str(ctx.colmap_db),
+        "--image_path", str(ctx.images_dir),
+    ], cwd=str(ctx.scene_dir)).run(on_progress=ctx.on_progress)
+
+    NonBlockingCommandRunner([
+        colmap, f"{ctx.colmap_matcher}_matcher",
+        "--SiftMatching.guided_matching=true",
+        "--database_path", str(ctx.colmap_db),
+    ], cwd=str(ctx.scene_dir)).run()
+
+
+def stage_mapper(ctx: TrainingContext):
+    """COLMAP 稀疏重建 + BA + 导出 TXT"""
+    colmap = _binary("colmap")
+    _reset_dir(ctx.sparse_dir)
+
+    NonBlockingCommandRunner([
+        colmap, "mapper",
+        "--database_path", str(ctx.colmap_db),
+        "--image_path", str(ctx.images_dir),
+        "--output_path", str(ctx.sparse_dir),
+        "--Mapper.min_num_matches", "10",
+    ], cwd=str(ctx.scene_dir)).run()
+
+    model_dir = ctx.sparse_dir / "0"
+    if not model_dir.exists():
+        raise RuntimeError(f"COLMAP mapper 未生成模型：{model_dir}")
+
+    NonBlockingCommandRunner([
+        colmap, "bundle_adjuster",
+        "--input_path", str(model_dir),
+        "--output_path", str(model_dir),
+        "--BundleAdjustment.refine_principal_point", "1",
+    ], cwd=str(ctx.scene_dir)).run()
+
+    _reset_dir(ctx.text_dir)
+    NonBlockingCommandRunner([
+        colmap, "model_converter",
+        "--input_path", str(model_dir),
+        "--output_path", str(ctx.text_dir),
+        "--output_type", "TXT",
+    ], cwd=str(ctx.scene_dir)).run()
+
+
+def stage_transforms(ctx: TrainingContext):
+    """colmap2nerf：COLMAP TXT -> transforms.json (不再由脚本内部抽帧和跑 COLMAP)"""
+    cmd = [
+        ctx.venv_python,
+        ctx.colmap2nerf_script,
+        "--aabb_scale", str(ctx.aabb_scale),
+        "--images", str(ctx.images_dir),
+        "--text", str(ctx.text_dir),
+        "--out", str(ctx.transforms_path),
+    ]
+
+    success, tip, frames = run_and_stream(cmd, None, cwd=ctx.scene_dir)
 
     if (not success) or (tip == 0):
         raise RuntimeError(
             f"colmap2nerf 失败或未收敛：success={success}, tip={tip}, frames={frames}\n"
-            f"cmd={' '.join(colmap_cmd)}"
+            f"cmd={' '.join(cmd)}"
         )
 
-    if not Path(transforms_path).exists():
-        raise RuntimeError(f"transforms.json 未生成：{transforms_path}")
+    if not ctx.transforms_path.exists():
+        raise RuntimeError(f"transforms.json 未生成：{ctx.transforms_path}")
 
-    # 练并保存 snapshot
-    # snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    ctx.frames = frames
 
+
+def stage_train(ctx: TrainingContext):
+    """训练并保存 snapshot"""
     train_cmd = [
-        venv_python,
-        str(Path(ngp_run_script).resolve()),
-        "--scene", str(video_dir),
-        "--n_steps", str(n_steps),
-        "--save_snapshot", str(snapshot_path),
+        ctx.venv_python,
+        str(Path(ctx.ngp_run_script).resolve()),
+        "--scene", str(ctx.scene_dir),
+        "--n_steps", str(ctx.n_steps),
+        "--save_snapshot", str(ctx.snapshot_path),
     ]
     print(train_cmd)
 
     runner = NonBlockingCommandRunner(train_cmd)
-    runner.run()
+    runner.run(on_progress=ctx.on_progress)
+
+    if not Path(ctx.snapshot_path).exists():
+        raise RuntimeError(f"训练结束但未找到 snapshot：{ctx.snapshot_path}")
 
-    if not Path(snapshot_path).exists():
-        raise RuntimeError(f"训练结束但未找到 snapshot：{snapshot_path}")
 
-    return {
-        "scene_dir": str(video_dir),
-        "transforms_json": str(transforms_path),
-        "snapshot_path": str(snapshot_path),
-        "frames": frames,
-        "video_path": video_path,
-    }
+# 阶段顺序 (名称 -> 执行函数)
+TRAINING_STAGES = [
+    ("extract", stage_extract),
+    ("sharpen", stage_sharpen),
+    ("features", stage_features),
+    ("mapper", stage_mapper),
+    ("transforms", stage_transforms),
+    ("train", stage_train),
+]
 
-# train_ngp_from_video(r"E:\ScnuProject\2025-Autumn-Aberdeen-10-Delta3D\back-end\static\uploads\b2c795e8ce8042068e521cf618abc02c\video.mp4",r"E:\ScnuProject\2025-Autumn-Aberdeen-10-Delta3D\back-end\static\uploads\b2c795e8ce8042068e521cf618abc02c\model.")
+
+def train_ngp_from_video(
+        video_path: str,
+        snapshot_path: str,
+        **kwargs
+) -> Dict[str, Any]:
+    """
+    在当前线程中按顺序执行全部阶段 (不经过流水线调度)
+
+    输入：
+      - video_path: 视频文件路径
+      - snapshot_path: 训练输出的模型快照路径（.msgpack）
+      - kwargs: 见 TrainingContext
+
+    输出：
+      - 返回 dict，包含 scene_dir、transforms.json 路径、抽帧数量等信息
+
+    失败时：
+      - 抛出 RuntimeError / FileNotFoundError / subprocess.CalledProcessError
+    """
+    ctx = TrainingContext(video_path, snapshot_path, **kwargs)
+    ctx.validate()
+    skipped = training_cache.restore(ctx)
+    for stage_name, stage_func in TRAINING_STAGES:
+        if stage_name in skipped:
+            continue
+        stage_func(ctx)
+        training_cache.store(ctx, stage_name)
+    return ctx.result()
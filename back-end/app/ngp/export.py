@@ -0,0 +1,391 @@
+import hashlib
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, col, or_
+
+from app.core.config import settings
+from app.database import engine
+from app.models import ExportJob, JobStatus, ModelAsset
+from app.ngp.cache import hash_file
+from app.ngp.creater import ENV_NGP_PYTHON, ENV_NGP_RUN
+from app.process_manager.utils import NonBlockingCommandRunner
+
+# run.py --save_mesh 可以直接写出的格式；GLB 或需要简化时先导出 PLY 再用 trimesh 转换
+NATIVE_FORMATS = {"obj", "ply"}
+
+
+def artifact_path(snapshot_hash: str, fmt: str, resolution: int) -> Path:
+    """
+    导出缓存文件路径，key = (快照哈希, 格式, 分辨率, 简化面数)
+    文件名取 key 的哈希，符合 /static 的内容哈希命名 (immutable 缓存)
+    """
+    key = f"{snapshot_hash}:{fmt}:{resolution}:{settings.EXPORT_DECIMATE_FACES}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return Path(settings.EXPORT_CACHE_DIR) / f"{digest}.{fmt}"
+
+
+def run_marching_cubes(snapshot_path: str, output_path: Path, resolution: int):
+    """加载快照，用 run.py --save_mesh 执行 marching cubes (不再训练)"""
+    if not ENV_NGP_PYTHON or not ENV_NGP_RUN:
+        raise ValueError("未配置 NGP_PYTHON_PATH / NGP_RUN_SCRIPT_PATH，无法导出网格")
+
+    cmd = [
+        ENV_NGP_PYTHON,
+        str(Path(ENV_NGP_RUN).resolve()),
+        "--load_snapshot", str(Path(snapshot_path).resolve()),
+        "--n_steps", "0",
+        "--save_mesh", str(output_path.resolve()),
+        "--marching_cubes_res", str(resolution),
+    ]
+    NonBlockingCommandRunner(cmd).run()
+
+    if not output_path.exists():
+        raise RuntimeError(f"导出结束但未找到网格文件：{output_path}")
+
+
+def convert_mesh(src: Path, dst: Path, fmt: str, decimate_faces: int):
+    """格式转换 / 网格简化 (trimesh 为可选依赖)"""
+    try:
+        import trimesh
+    except ImportError:
+        raise RuntimeError("导出 GLB 或简化网格需要安装 trimesh (pip install trimesh fast-simplification)")
+
+    mesh = trimesh.load(str(src), force="mesh")
+    if decimate_faces and len(mesh.faces) > decimate_faces:
+        try:
+            mesh = mesh.simplify_quadric_decimation(face_count=decimate_faces)
+        except Exception as e:
+            print(f"网格简化失败，保留原网格: {e}")
+    mesh.export(str(dst), file_type=fmt)
+
+
+class ExportQueue:
+    """
+    模型导出队列
+    - 下载接口只创建 / 查询 ExportJob，立即返回；导出在后台线程中执行 (子进程跑 run.py)
+    - 导出结果按 (快照哈希, 格式, 分辨率) 缓存在 EXPORT_CACHE_DIR，同一快照的所有下载者共用
+    - 重新训练 (快照哈希变化) 或缓存文件被淘汰后，再次请求时重新导出
+    - 任务持久化在数据库中，执行前用条件 UPDATE 领取 (多个 worker 进程不会重复导出)
+    - 执行中的任务带租约 (owner_id + heartbeat_at)，只有心跳超时的任务才会被重新入队
+    """
+
+    def __init__(self, workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mesh-export")
+        self._lock = threading.Lock()
+        self._submitted: Set[int] = set()
+        self._active: Set[int] = set()  # 本进程已领取、正在导出的任务
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop_event = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """崩溃恢复：租约过期的任务退回排队，重新提交全部排队任务；启动心跳线程"""
+        with Session(engine) as session:
+            requeued = self._requeue_expired(session)
+            job_ids = session.exec(select(ExportJob.id).where(ExportJob.status == JobStatus.QUEUED)).all()
+
+        for job_id in job_ids:
+            self._submit(job_id)
+        if requeued:
+            print(f"崩溃恢复：{requeued} 个导出任务重新入队")
+
+        self._stop_event.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True, name="export-heartbeat")
+        self._heartbeat_thread.start()
+
+    def shutdown(self):
+        # 正在运行的任务保持 RUNNING，清空心跳后下次启动 (或其他 worker) 可以立即接管
+        self._stop_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            with Session(engine) as session:
+                session.exec(
+                    update(ExportJob)
+                    .where(ExportJob.owner_id == self.owner_id, ExportJob.status == JobStatus.RUNNING)
+                    .values(heartbeat_at=None)
+                )
+                session.commit()
+        except Exception as e:
+            print(f"释放导出任务租约失败: {e}")
+
+    @staticmethod
+    def _requeue_expired(session: Session) -> int:
+        """租约过期的 RUNNING 任务退回排队 (条件 UPDATE，读取之后被续期或已被接管的任务不动)"""
+        deadline = datetime.utcnow() - timedelta(seconds=settings.EXPORT_LEASE_TTL)
+        expired = session.exec(
+            select(ExportJob).where(
+                ExportJob.status == JobStatus.RUNNING,
+                or_(ExportJob.heartbeat_at == None, ExportJob.heartbeat_at < deadline)
+            )
+        ).all()
+
+        requeued = 0
+        for job in expired:
+            result = session.exec(
+                update(ExportJob)
+                .where(
+                    ExportJob.id == job.id,
+                    ExportJob.status == JobStatus.RUNNING,
+                    ExportJob.owner_id == job.owner_id,
+                    ExportJob.heartbeat_at == job.heartbeat_at
+                )
+                .values(status=JobStatus.QUEUED, owner_id=None, heartbeat_at=None)
+            )
+            requeued += result.rowcount
+        session.commit()
+        return requeued
+
+    def _heartbeat_loop(self):
+        """续约本进程正在导出的任务；顺带接管其他进程租约过期的任务"""
+        while not self._stop_event.wait(settings.EXPORT_HEARTBEAT_INTERVAL):
+            try:
+                with self._lock:
+                    job_ids: List[int] = list(self._active)
+                with Session(engine) as session:
+                    if job_ids:
+                        session.exec(
+                            update(ExportJob)
+                            .where(
+                                col(ExportJob.id).in_(job_ids),
+                                ExportJob.owner_id == self.owner_id,
+                                ExportJob.status == JobStatus.RUNNING
+                            )
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+                        session.commit()
+                    if self._requeue_expired(session):
+                        queued = session.exec(
+                            select(ExportJob.id).where(ExportJob.status == JobStatus.QUEUED)
+                        ).all()
+                        for job_id in queued:
+                            self._submit(job_id)
+            except Exception as e:
+                print(f"导出任务心跳出错: {e}")
+
+    def request(self, session: Session, asset: ModelAsset, fmt: str, resolution: int, user_id: int) -> ExportJob:
+        """
+        取得 (资产, 格式, 分辨率) 的导出任务，没有或已过期时入队
+
+        Returns:
+            ExportJob: status 为 done 时 output_path 可直接下载
+        """
+        job = session.exec(
+            select(ExportJob).where(
+                ExportJob.asset_id == asset.id,
+                ExportJob.format == fmt,
+                ExportJob.resolution == resolution
+            )
+        ).first()
+
+        if job is None:
+            job = ExportJob(asset_id=asset.id, user_id=user_id, format=fmt, resolution=resolution)
+            session.add(job)
+            try:
+                session.commit()
+            except IntegrityError:
+                # 并发请求已经创建了同一个任务
+                session.rollback()
+                return self.request(session, asset, fmt, resolution, user_id)
+            session.refresh(job)
+            self._submit(job.id)
+            return job
+
+        requeue = False
+        if job.status in (JobStatus.DONE, JobStatus.FAILED) and self._snapshot_changed(job, asset):
+            job.attempts = 0
+            requeue = True
+        elif job.status == JobStatus.DONE and not (job.output_path and os.path.exists(job.output_path)):
+            requeue = True
+        elif job.status == JobStatus.FAILED and job.attempts < settings.EXPORT_MAX_ATTEMPTS:
+            requeue = True
+
+        if requeue:
+            job.status = JobStatus.QUEUED
+            job.output_path = None
+            job.file_size = None
+            job.error = None
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            self._submit(job.id)
+        elif job.status == JobStatus.QUEUED:
+            # 入队的进程可能已经退出；本进程已提交过时 _submit 直接返回
+            self._submit(job.id)
+        elif job.status == JobStatus.DONE:
+            # 更新 mtime 作为最近访问时间 (LRU)
+            try:
+                os.utime(job.output_path)
+            except OSError:
+                pass
+        return job
+
+    @staticmethod
+    def _snapshot_changed(job: ExportJob, asset: ModelAsset) -> bool:
+        return bool(asset.snapshot_hash and job.snapshot_hash and asset.snapshot_hash != job.snapshot_hash)
+
+    def _submit(self, job_id: int):
+        with self._lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        try:
+            future = self._executor.submit(self._run, job_id)
+        except RuntimeError:
+            # 线程池已关闭 (服务正在退出)，任务保持 QUEUED
+            self._discard(job_id)
+            return
+        future.add_done_callback(lambda _: self._discard(job_id))
+
+    def _discard(self, job_id: int):
+        with self._lock:
+            self._submitted.discard(job_id)
+
+    def _run(self, job_id: int):
+        with Session(engine) as session:
+            job = session.get(ExportJob, job_id)
+            if job is None or job.status != JobStatus.QUEUED:
+                return
+            asset_id = job.asset_id
+            asset = session.get(ModelAsset, asset_id)
+            snapshot_path = asset.model_path if asset else None
+            snapshot_hash = asset.snapshot_hash if asset else None
+            fmt, resolution = job.format, job.resolution
+
+            # 条件 UPDATE 领取 (QUEUED -> RUNNING)，其他进程抢先领取时放弃
+            now = datetime.utcnow()
+            result = session.exec(
+                update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status == JobStatus.QUEUED)
+                .values(
+                    status=JobStatus.RUNNING,
+                    started_at=now,
+                    attempts=ExportJob.attempts + 1,
+                    owner_id=self.owner_id,
+                    heartbeat_at=now
+                )
+            )
+            session.commit()
+            if result.rowcount != 1:
+                return
+
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            self._execute(job_id, asset_id, snapshot_path, snapshot_hash, fmt, resolution)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _execute(self, job_id: int, asset_id: int, snapshot_path: Optional[str], snapshot_hash: Optional[str],
+                 fmt: str, resolution: int):
+        try:
+            if not snapshot_path or not os.path.exists(snapshot_path):
+                raise FileNotFoundError("模型文件尚未生成或已丢失")
+            if not snapshot_hash:
+                snapshot_hash = self._save_snapshot_hash(asset_id, snapshot_path)
+
+            output = artifact_path(snapshot_hash, fmt, resolution)
+            if output.exists():
+                os.utime(output)
+                print(f"导出任务 {job_id} 命中缓存: {output}")
+            else:
+                self._export(snapshot_path, output, fmt, resolution)
+                self.evict(keep=output)
+        except Exception as e:
+            print(f"导出任务 {job_id} 失败: {e}")
+            self._finish(job_id, error=str(e) or type(e).__name__)
+            return
+
+        self._finish(job_id, output=output, snapshot_hash=snapshot_hash)
+        print(f"导出任务 {job_id} 完成: {output}")
+
+    @staticmethod
+    def _save_snapshot_hash(asset_id: int, snapshot_path: str) -> str:
+        snapshot_hash = hash_file(snapshot_path)
+        with Session(engine) as session:
+            asset = session.get(ModelAsset, asset_id)
+            if asset is not None:
+                asset.snapshot_hash = snapshot_hash
+                session.add(asset)
+                session.commit()
+        return snapshot_hash
+
+    @staticmethod
+    def _export(snapshot_path: str, output: Path, fmt: str, resolution: int):
+        output.parent.mkdir(parents=True, exist_ok=True)
+        decimate = settings.EXPORT_DECIMATE_FACES
+        needs_convert = fmt not in NATIVE_FORMATS or decimate > 0
+
+        # 在临时目录中生成，完成后再移入缓存目录 (/static 下不会出现半成品)
+        with tempfile.TemporaryDirectory(prefix="export-") as tmp:
+            raw = Path(tmp) / ("mesh.ply" if needs_convert else f"mesh.{fmt}")
+            run_marching_cubes(snapshot_path, raw, resolution)
+            final = raw
+            if needs_convert:
+                final = Path(tmp) / f"out.{fmt}"
+                convert_mesh(raw, final, fmt, decimate)
+
+            staging = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+            shutil.move(str(final), str(staging))
+            os.replace(staging, output)
+
+    def _finish(self, job_id: int, output: Optional[Path] = None, snapshot_hash: Optional[str] = None,
+                error: Optional[str] = None):
+        with Session(engine) as session:
+            job = session.get(ExportJob, job_id)
+            # 租约已被其他进程接管 (任务已重新入队)，结果以新的执行为准
+            if job is None or job.status != JobStatus.RUNNING or job.owner_id != self.owner_id:
+                return
+            if error is None:
+                job.status = JobStatus.DONE
+                job.output_path = str(output)
+                job.file_size = output.stat().st_size
+                job.snapshot_hash = snapshot_hash
+                job.error = None
+            else:
+                job.status = JobStatus.FAILED
+                job.error = error[:500]
+            job.finished_at = datetime.utcnow()
+            job.heartbeat_at = None
+            session.add(job)
+            session.commit()
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """缓存目录超过 EXPORT_CACHE_MAX_BYTES 时按 mtime (最近访问) 淘汰最旧的文件"""
+        root = Path(settings.EXPORT_CACHE_DIR)
+        if not root.exists():
+            return 0
+
+        with self._lock:
+            files = []
+            for f in root.iterdir():
+                if f.is_file() and not f.name.startswith("."):
+                    stat = f.stat()
+                    files.append((stat.st_mtime, stat.st_size, f))
+            total = sum(size for _, size, _ in files)
+
+            removed = 0
+            for _, size, f in sorted(files, key=lambda item: item[0]):
+                if total <= settings.EXPORT_CACHE_MAX_BYTES:
+                    break
+                if keep is not None and f == keep:
+                    continue
+                f.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        return removed
+
+
+# 全局单例
+export_queue = ExportQueue(settings.EXPORT_WORKERS)
@@ -0,0 +1,490 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select, func, col, or_
+
+from app.core.config import settings
+from app.database import engine
+from app.models import TrainingJob, JobStatus, ModelAsset, AssetStatus
+from app.ngp.pipeline import training_pipeline
+
+
+# =============================================================================
+# 队列操作 (基于数据库表，进程重启不丢任务)
+# =============================================================================
+
+def enqueue_training(
+        session: Session,
+        asset_id: int,
+        user_id: int,
+        video_disk_path: str,
+        snapshot_disk_path: str,
+        web_model_path: str,
+        video_hash: str | None = None,
+        priority: int = 0
+) -> TrainingJob:
+    """
+    将训练任务写入持久化队列
+    """
+    job = TrainingJob(
+        asset_id=asset_id,
+        user_id=user_id,
+        priority=priority,
+        video_disk_path=video_disk_path,
+        snapshot_disk_path=snapshot_disk_path,
+        web_model_path=web_model_path,
+        video_hash=video_hash,
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def _pick_fair_job(queued: List[tuple], running_by_user: Dict[int, int]) -> Optional[int]:
+    """
+    公平调度：
+    1. 优先级高的先执行
+    2. 同优先级下按用户轮转 (每个用户的第 N 个任务排在所有用户的第 N 个任务之后)，
+       正在运行的任务也计入轮次，避免单个用户的突发上传占满所有 worker
+    3. 同轮次内按提交顺序 (FIFO)
+
+    Args:
+        queued: [(job_id, user_id, priority), ...]，按 id 升序
+        running_by_user: user_id -> 正在运行的任务数
+    """
+    best_key = None
+    best_id = None
+    seen_by_user: Dict[int, int] = {}
+
+    for job_id, user_id, priority in queued:
+        rank = running_by_user.get(user_id, 0) + seen_by_user.get(user_id, 0)
+        seen_by_user[user_id] = seen_by_user.get(user_id, 0) + 1
+
+        key = (-priority, rank, job_id)
+        if best_key is None or key < best_key:
+            best_key = key
+            best_id = job_id
+
+    return best_id
+
+
+def claim_next_job(session: Session, owner_id: str) -> Optional[TrainingJob]:
+    """
+    领取下一个待执行任务 (QUEUED -> RUNNING)，同时写入租约 (owner_id + heartbeat_at)
+    使用条件 UPDATE 保证多个调度器同时领取时不会重复执行
+    """
+    while True:
+        running_stmt = (
+            select(TrainingJob.user_id, func.count())
+            .where(TrainingJob.status == JobStatus.RUNNING)
+            .group_by(TrainingJob.user_id)
+        )
+        running_by_user = dict(session.exec(running_stmt).all())
+
+        queued_stmt = (
+            select(TrainingJob.id, TrainingJob.user_id, TrainingJob.priority)
+            .where(TrainingJob.status == JobStatus.QUEUED)
+            .order_by(col(TrainingJob.id).asc())
+        )
+        queued = session.exec(queued_stmt).all()
+
+        job_id = _pick_fair_job(queued, running_by_user)
+        if job_id is None:
+            return None
+
+        claim_stmt = (
+            update(TrainingJob)
+            .where(TrainingJob.id == job_id, TrainingJob.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                started_at=datetime.utcnow(),
+                attempts=TrainingJob.attempts + 1,
+                owner_id=owner_id,
+                heartbeat_at=datetime.utcnow()
+            )
+        )
+        result = session.exec(claim_stmt)
+        session.commit()
+
+        # 被其他调度器抢先领取，重新挑选
+        if result.rowcount != 1:
+            continue
+
+        return session.get(TrainingJob, job_id)
+
+
+def renew_leases(session: Session, owner_id: str, job_ids: List[int]) -> int:
+    """
+    刷新本调度器所持有任务的心跳
+
+    Returns:
+        成功续约的任务数 (租约已被其他进程接管的任务不计入)
+    """
+    if not job_ids:
+        return 0
+    result = session.exec(
+        update(TrainingJob)
+        .where(
+            col(TrainingJob.id).in_(job_ids),
+            TrainingJob.owner_id == owner_id,
+            TrainingJob.status == JobStatus.RUNNING
+        )
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    session.commit()
+    return result.rowcount
+
+
+def release_leases(session: Session, owner_id: str) -> None:
+    """调度器停止时清空心跳，下次启动 (或其他 worker) 无需等待 TRAIN_LEASE_TTL 即可接管"""
+    session.exec(
+        update(TrainingJob)
+        .where(TrainingJob.owner_id == owner_id, TrainingJob.status == JobStatus.RUNNING)
+        .values(heartbeat_at=None)
+    )
+    session.commit()
+
+
+def _holds_lease(job: TrainingJob, owner_id: Optional[str]) -> bool:
+    """任务仍由该调度器持有 (owner_id 为空时不检查)"""
+    return owner_id is None or (job.status == JobStatus.RUNNING and job.owner_id == owner_id)
+
+
+def finish_job(session: Session, job_id: int, success: bool, owner_id: Optional[str] = None) -> None:
+    """
+    记录任务执行结果 (训练成功/失败由 task_train_asset 返回)
+    租约已被其他调度器接管 (任务已重新入队) 时不覆盖；
+    流水线正常结束时已在 finalize_asset 中与资产状态一并写入，此时为空操作
+    """
+    job = session.get(TrainingJob, job_id)
+    if not job or not _holds_lease(job, owner_id):
+        return
+
+    job.status = JobStatus.DONE if success else JobStatus.FAILED
+    job.finished_at = datetime.utcnow()
+    job.heartbeat_at = None
+    session.add(job)
+    session.commit()
+
+
+def retry_or_fail_job(session: Session, job_id: int, error: str, owner_id: Optional[str] = None) -> bool:
+    """
+    worker 进程异常退出 (而非训练本身失败) 时调用：
+    未超过最大重试次数则重新入队，否则任务与资产均标记失败
+
+    Returns:
+        是否重新入队
+    """
+    job = session.get(TrainingJob, job_id)
+    if not job or not _holds_lease(job, owner_id):
+        return False
+
+    job.error = error
+    asset = session.get(ModelAsset, job.asset_id)
+
+    if job.attempts < settings.TRAIN_MAX_ATTEMPTS:
+        job.status = JobStatus.QUEUED
+        job.started_at = None
+        job.current_stage = None
+        job.owner_id = None
+        job.heartbeat_at = None
+        new_asset_status = AssetStatus.PENDING
+        requeued = True
+    else:
+        job.status = JobStatus.FAILED
+        job.finished_at = datetime.utcnow()
+        new_asset_status = AssetStatus.FAILED
+        requeued = False
+
+    if asset:
+        asset.status = new_asset_status
+        session.add(asset)
+    session.add(job)
+    session.commit()
+    return requeued
+
+
+def _asset_disk_paths(asset: ModelAsset) -> tuple[str, str, str]:
+    """
+    根据 video_path (/static/uploads/<uid>) 推导资产的磁盘路径
+    与 upload_asset 中的目录约定保持一致
+    """
+    asset_dir = Path(settings.UPLOAD_DIR) / Path(asset.video_path).name
+    # 视频扩展名与实际容器一致 (video.mp4 / video.mkv ...)
+    videos = sorted(asset_dir.glob("video.*"))
+    video_disk_path = str(videos[0] if videos else asset_dir / "video.mp4")
+    snapshot_disk_path = str(asset_dir / "model.msgpack")
+    return video_disk_path, snapshot_disk_path, snapshot_disk_path
+
+
+def requeue_expired_jobs(session: Session) -> int:
+    """
+    接管租约过期的 RUNNING 任务 (持有者超过 TRAIN_LEASE_TTL 未刷新心跳，视为已崩溃或已停止)：
+    重新入队，超过最大重试次数则标记失败。其他仍在心跳的调度器的任务不受影响
+
+    Returns:
+        重新入队的任务数
+    """
+    deadline = datetime.utcnow() - timedelta(seconds=settings.TRAIN_LEASE_TTL)
+    expired = session.exec(
+        select(TrainingJob).where(
+            TrainingJob.status == JobStatus.RUNNING,
+            or_(TrainingJob.heartbeat_at == None, TrainingJob.heartbeat_at < deadline)
+        )
+    ).all()
+
+    requeued = 0
+    for job in expired:
+        give_up = job.attempts >= settings.TRAIN_MAX_ATTEMPTS
+        values = dict(owner_id=None, heartbeat_at=None)
+        if give_up:
+            values.update(status=JobStatus.FAILED, error="超过最大重试次数", finished_at=datetime.utcnow())
+        else:
+            values.update(status=JobStatus.QUEUED, started_at=None, current_stage=None)
+
+        # 条件 UPDATE：读取之后租约被续期 / 已被其他 worker 接管的任务不动
+        result = session.exec(
+            update(TrainingJob)
+            .where(
+                TrainingJob.id == job.id,
+                TrainingJob.status == JobStatus.RUNNING,
+                TrainingJob.owner_id == job.owner_id,
+                TrainingJob.heartbeat_at == job.heartbeat_at
+            )
+            .values(**values)
+        )
+        if result.rowcount != 1:
+            continue
+
+        asset = session.get(ModelAsset, job.asset_id)
+        if asset and (give_up or asset.status == AssetStatus.PROCESSING):
+            asset.status = AssetStatus.FAILED if give_up else AssetStatus.PENDING
+            session.add(asset)
+        if not give_up:
+            requeued += 1
+    session.commit()
+    return requeued
+
+
+def recover_interrupted_jobs(session: Session) -> int:
+    """
+    崩溃恢复：服务启动时调用
+    1. 租约过期的 RUNNING 任务重新入队 (超过最大重试次数则标记失败)
+    2. 没有活动任务的 PENDING/PROCESSING 资产补建任务 (兼容旧版 BackgroundTasks 丢失的任务)
+    3. 没有运行中任务的 PROCESSING 资产回退为 PENDING (其他 worker 正在训练的资产保持不变)
+
+    Returns:
+        重新入队的任务数
+    """
+    requeued = requeue_expired_jobs(session)
+
+    active_jobs = session.exec(
+        select(TrainingJob.asset_id, TrainingJob.status).where(
+            col(TrainingJob.status).in_([JobStatus.QUEUED, JobStatus.RUNNING])
+        )
+    ).all()
+    active_asset_ids = {asset_id for asset_id, _ in active_jobs}
+    running_asset_ids = {asset_id for asset_id, status in active_jobs if status == JobStatus.RUNNING}
+
+    unfinished = session.exec(
+        select(ModelAsset).where(
+            col(ModelAsset.status).in_([AssetStatus.PENDING, AssetStatus.PROCESSING])
+        )
+    ).all()
+    for asset in unfinished:
+        if asset.id not in active_asset_ids:
+            video_disk_path, snapshot_disk_path, web_model_path = _asset_disk_paths(asset)
+            session.add(TrainingJob(
+                asset_id=asset.id,
+                user_id=asset.user_id,
+                video_disk_path=video_disk_path,
+                snapshot_disk_path=snapshot_disk_path,
+                web_model_path=web_model_path,
+            ))
+            requeued += 1
+
+        if asset.status == AssetStatus.PROCESSING and asset.id not in running_asset_ids:
+            asset.status = AssetStatus.PENDING
+            session.add(asset)
+
+    session.commit()
+    return requeued
+
+
+# =============================================================================
+# 调度器：轮询队列，把任务送入分阶段训练流水线
+# =============================================================================
+
+class TrainingJobDispatcher:
+    """
+    训练任务调度器
+    - 领取的任务交给 training_pipeline，各阶段在独立子进程 (ffmpeg/colmap/run.py) 中执行
+    - 流水线中同时处理的任务数由 TRAIN_MAX_WORKERS 控制，各阶段并发由 TRAIN_STAGE_CONCURRENCY 控制
+    - enqueue 后调用 notify() 立即唤醒，无需等待轮询间隔
+    - 每 TRAIN_HEARTBEAT_INTERVAL 秒刷新所持任务的租约，并接管其他 worker 租约过期的任务
+    """
+
+    def __init__(self, max_workers: int, poll_interval: float):
+        self.max_workers = max(1, max_workers)
+        self.poll_interval = poll_interval
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Dict[int, Future] = {}  # job_id -> Future
+        # 租约持有者 ID，多个 worker 进程 (或同一进程重启前后) 互不相同
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_heartbeat = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动调度器 (先做崩溃恢复)"""
+        if self.is_running:
+            return
+
+        with Session(engine) as session:
+            requeued = recover_interrupted_jobs(session)
+        if requeued:
+            print(f"崩溃恢复：{requeued} 个训练任务重新入队")
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        print(f"训练调度器已启动 (max_workers={self.max_workers})")
+
+    def stop(self):
+        """
+        停止调度器
+        正在运行的任务不等待，下次启动时由崩溃恢复重新入队
+        """
+        if not self.is_running:
+            return
+
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+        training_pipeline.shutdown()
+        try:
+            with Session(engine) as session:
+                release_leases(session, self.owner_id)
+        except Exception as e:
+            print(f"释放训练任务租约失败: {e}")
+        print("训练调度器已停止")
+
+    def notify(self):
+        """有新任务入队，立即唤醒调度循环"""
+        self._wake_event.set()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self._heartbeat()
+            except Exception as e:
+                print(f"训练任务心跳出错: {e}")
+
+            try:
+                self._dispatch_available()
+            except Exception as e:
+                print(f"训练调度出错: {e}")
+
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+
+    def _heartbeat(self):
+        """续约本进程的任务；顺带接管租约过期的任务 (其他 worker 崩溃时无需等到重启)"""
+        now = time.monotonic()
+        if now - self._last_heartbeat < settings.TRAIN_HEARTBEAT_INTERVAL:
+            return
+        self._last_heartbeat = now
+
+        with self._lock:
+            job_ids = list(self._running)
+        with Session(engine) as session:
+            renew_leases(session, self.owner_id, job_ids)
+            requeued = requeue_expired_jobs(session)
+        if requeued:
+            print(f"租约过期：{requeued} 个训练任务重新入队")
+
+    def _dispatch_available(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                if len(self._running) >= self.max_workers:
+                    return
+
+            with Session(engine) as session:
+                job = claim_next_job(session, self.owner_id)
+                if not job:
+                    return
+                job_id = job.id
+                asset_id = job.asset_id
+                user_id = job.user_id
+                args = (job.video_disk_path, job.snapshot_disk_path, job.web_model_path)
+                video_hash = job.video_hash
+
+            future = training_pipeline.submit(
+                job_id, asset_id, user_id, *args, owner_id=self.owner_id, video_hash=video_hash
+            )
+
+            with self._lock:
+                self._running[job_id] = future
+            future.add_done_callback(partial(self._on_job_done, job_id))
+            print(f"训练任务 {job_id} 已进入流水线 (Asset ID: {asset_id})")
+
+    def _on_job_done(self, job_id: int, future: Future):
+        with self._lock:
+            self._running.pop(job_id, None)
+
+        # 调度器停止时被取消的任务保持 RUNNING，交给下次启动的崩溃恢复
+        if future.cancelled() or self._stop_event.is_set():
+            return
+
+        try:
+            success = bool(future.result())
+        except Exception as e:
+            print(f"训练任务 {job_id} 异常: {e}")
+            with Session(engine) as session:
+                retry_or_fail_job(session, job_id, str(e), self.owner_id)
+        else:
+            with Session(engine) as session:
+                finish_job(session, job_id, success, self.owner_id)
+
+        self.notify()
+
+
+# 全局单例
+training_dispatcher = TrainingJobDispatcher(
+    max_workers=settings.TRAIN_MAX_WORKERS,
+    poll_interval=settings.TRAIN_POLL_INTERVAL
+)
+
+
+if __name__ == "__main__":
+    # 独立 worker 进程：python -m app.ngp.job_queue
+    # 此时 API 进程应设置 TRAIN_DISPATCHER_ENABLED=false
+    from app.database import init_db
+
+    init_db()
+    training_dispatcher.start()
+    try:
+        while training_dispatcher.is_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        training_dispatcher.stop()
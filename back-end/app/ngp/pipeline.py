@@ -0,0 +1,248 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.database import engine
+from app.models import JobStatus, TrainingJob
+from app.ngp.cache import training_cache
+from app.ngp.creater import TrainingContext, TRAINING_STAGES
+from app.ngp.progress import ProgressReporter
+from app.ngp.worker import mark_asset_processing, finalize_asset
+
+
+class StageStats:
+    """单个阶段的运行统计"""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0  # 命中缓存跳过，不计入耗时统计
+        self.total_seconds = 0.0
+        self.last_seconds: float | None = None
+
+    def to_dict(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "avg_seconds": self.total_seconds / finished if finished else None,
+            "last_seconds": self.last_seconds,
+        }
+
+
+class TrainingPipeline:
+    """
+    分阶段训练流水线：
+    extract -> sharpen -> features -> mapper -> transforms -> train
+
+    每个阶段有独立的线程池 (并发上限见 TRAIN_STAGE_CONCURRENCY)，
+    任务完成一个阶段后进入下一阶段的队列，因此任务 N 训练时任务 N+1 可以同时跑 COLMAP。
+    各阶段的重活都在 ffmpeg / colmap / run.py 子进程中，线程只负责等待。
+    """
+
+    def __init__(self, stage_concurrency: Dict[str, int]):
+        self._lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._stats: Dict[str, StageStats] = {}
+
+        for name, _ in TRAINING_STAGES:
+            concurrency = max(1, stage_concurrency.get(name, 1))
+            self._executors[name] = ThreadPoolExecutor(
+                max_workers=concurrency,
+                thread_name_prefix=f"stage-{name}"
+            )
+            self._stats[name] = StageStats(name, concurrency)
+
+    def submit(self, job_id: int, asset_id: int, user_id: int, video_disk_path: str, snapshot_disk_path: str,
+               web_model_path: str, owner_id: str | None = None, **train_kwargs) -> Future:
+        """
+        提交一个训练任务，立即返回 Future
+        Future 结果为 bool (训练是否成功)，与 task_train_asset 语义一致
+
+        owner_id 为领取任务的调度器：每个阶段开始前和写回结果时检查租约，
+        租约被其他调度器接管后不再继续，也不覆盖资产状态
+        """
+        future: Future = Future()
+
+        if not mark_asset_processing(asset_id):
+            future.set_result(False)
+            return future
+
+        job = {"job_id": job_id, "asset_id": asset_id, "owner_id": owner_id, "future": future}
+        try:
+            self._prepare(job, user_id, video_disk_path, snapshot_disk_path, web_model_path, **train_kwargs)
+            self._submit_stage(0, job)
+        except Exception as e:
+            # 交给调度器按 worker 异常处理 (重试或标记失败)，不能让 Future 永远挂起
+            print(f"[Pipeline] Job {job_id} 提交失败: {e}")
+            self._fail(job, e)
+        return future
+
+    def stats(self) -> List[dict]:
+        """各阶段统计 (按阶段顺序)"""
+        with self._lock:
+            return [self._stats[name].to_dict() for name, _ in TRAINING_STAGES]
+
+    def stage_averages(self) -> Dict[str, float | None]:
+        """各阶段历史平均耗时，用于估算 ETA"""
+        return {stats["name"]: stats["avg_seconds"] for stats in self.stats()}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(s.queued + s.running for s in self._stats.values())
+
+    def shutdown(self):
+        """停止接收新阶段；未完成的任务由任务队列的崩溃恢复重新入队"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prepare(self, job: dict, user_id: int, video_disk_path: str, snapshot_disk_path: str,
+                 web_model_path: str, **train_kwargs):
+        reporter = ProgressReporter(
+            asset_id=job["asset_id"],
+            user_id=user_id,
+            stage_names=[name for name, _ in TRAINING_STAGES],
+            stage_averages=self.stage_averages
+        )
+        ctx = TrainingContext(video_disk_path, snapshot_disk_path, **train_kwargs)
+        ctx.on_progress = reporter.update
+        job.update(web_model_path=web_model_path, ctx=ctx, reporter=reporter)
+
+    @staticmethod
+    def _fail(job: dict, error: BaseException):
+        future = job["future"]
+        if not future.done():
+            future.set_exception(error)
+
+    def _submit_stage(self, index: int, job: dict):
+        """
+        Raises:
+            Exception: 写数据库失败等，由调用方让任务失败
+        """
+        name, _ = TRAINING_STAGES[index]
+        if not _update_job_stage(job["job_id"], name, job["owner_id"]):
+            raise RuntimeError(f"训练任务 {job['job_id']} 的租约已被其他调度器接管")
+        with self._lock:
+            self._stats[name].queued += 1
+
+        try:
+            self._executors[name].submit(self._run_stage, index, job)
+        except RuntimeError:
+            # 线程池已关闭 (服务正在退出)
+            with self._lock:
+                self._stats[name].queued -= 1
+            job["future"].cancel()
+
+    def _run_stage(self, index: int, job: dict):
+        name, stage_func = TRAINING_STAGES[index]
+        stats = self._stats[name]
+        with self._lock:
+            stats.queued -= 1
+            stats.running += 1
+
+        ctx = job["ctx"]
+        reporter = job["reporter"]
+
+        start_time = time.time()
+        error = None
+        skipped = False
+        try:
+            reporter.stage_started(name)
+            # 第一个阶段开始前查缓存，命中的阶段直接跳过
+            if index == 0:
+                ctx.validate()
+                job["skipped"] = training_cache.restore(ctx)
+
+            skipped = name in job.get("skipped", [])
+            if not skipped:
+                stage_func(ctx)
+                training_cache.store(ctx, name)
+        except Exception as e:
+            error = e
+        elapsed = time.time() - start_time
+
+        with self._lock:
+            stats.running -= 1
+            if skipped:
+                stats.skipped += 1
+            else:
+                stats.total_seconds += elapsed
+                stats.last_seconds = elapsed
+                if error is None:
+                    stats.completed += 1
+                else:
+                    stats.failed += 1
+
+        # 收尾 (写库 / 进度推送 / 提交下一阶段) 出错时也必须结束 Future，否则调度器的槽位永远不释放
+        success = error is None
+        try:
+            reporter.stage_finished(name, elapsed, skipped=skipped)
+            _record_stage_timing(job["job_id"], name, elapsed)
+            print(f"[Pipeline] Job {job['job_id']} 阶段 {name} 耗时 {elapsed:.1f}s"
+                  + (f"，失败: {error}" if error else ""))
+
+            if success and index + 1 < len(TRAINING_STAGES):
+                self._submit_stage(index + 1, job)
+                return
+
+            if success:
+                print(f"训练完成: {job['ctx'].result()}")
+            else:
+                print(f"训练失败 Asset ID {job['asset_id']}: {error}")
+
+            if job["owner_id"] is None:
+                finalize_asset(job["asset_id"], success, job["web_model_path"])
+                _update_job_stage(job["job_id"], None)
+            elif not finalize_asset(job["asset_id"], success, job["web_model_path"],
+                                    job_id=job["job_id"], owner_id=job["owner_id"]):
+                raise RuntimeError(f"训练任务 {job['job_id']} 的租约已被其他调度器接管")
+            reporter.finished(success)
+        except Exception as e:
+            print(f"[Pipeline] Job {job['job_id']} 阶段 {name} 收尾失败: {e}")
+            self._fail(job, e)
+            return
+
+        if not job["future"].done():
+            job["future"].set_result(success)
+
+
+def _update_job_stage(job_id: int, stage: str | None, owner_id: str | None = None) -> bool:
+    """
+    Returns:
+        bool: 任务存在且 (给出 owner_id 时) 仍由该调度器持有
+    """
+    with Session(engine) as session:
+        job = session.get(TrainingJob, job_id)
+        if not job or (owner_id is not None and (job.status != JobStatus.RUNNING or job.owner_id != owner_id)):
+            return False
+        job.current_stage = stage
+        session.add(job)
+        session.commit()
+        return True
+
+
+def _record_stage_timing(job_id: int, stage: str, seconds: float):
+    with Session(engine) as session:
+        job = session.get(TrainingJob, job_id)
+        if job:
+            # JSON 列需整体赋值才能被检测到修改
+            job.stage_timings = {**(job.stage_timings or {}), stage: round(seconds, 3)}
+            session.add(job)
+            session.commit()
+
+
+# 全局单例
+training_pipeline = TrainingPipeline(settings.TRAIN_STAGE_CONCURRENCY)
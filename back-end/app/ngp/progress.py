@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlmodel import Session
+
+from app.core.socket_manager import manager
+from app.database import engine
+from app.models import ModelAsset
+
+PUSH_INTERVAL = 0.5  # 同一阶段内两次推送的最小间隔(秒)
+PERSIST_INTERVAL = 10.0  # 写回 estimated_gen_seconds 的最小间隔(秒)
+
+
+class ProgressReporter:
+    """
+    单个训练任务的进度汇报：
+    - 阶段开始/结束、子进程的 step/total/loss 事件通过 WebSocket 推送给资产拥有者
+    - 根据当前阶段速率 + 其余阶段的历史平均耗时估算 ETA，写回 ModelAsset.estimated_gen_seconds
+
+    推送消息格式与聊天一致：
+      {"type": "training_progress", "data": {...}}
+    """
+
+    def __init__(
+            self,
+            asset_id: int,
+            user_id: int,
+            stage_names: List[str],
+            stage_averages: Callable[[], Dict[str, Optional[float]]]
+    ):
+        self.asset_id = asset_id
+        self.user_id = user_id
+        self.stage_names = stage_names
+        self.stage_averages = stage_averages
+
+        self._lock = threading.Lock()
+        self._job_start = time.time()
+        self._stage: Optional[str] = None
+        self._stage_start = self._job_start
+        self._last_push = 0.0
+        self._last_persist = 0.0
+
+    # -------------------------------------------------------------------------
+    # 事件入口
+    # -------------------------------------------------------------------------
+    def stage_started(self, stage: str):
+        with self._lock:
+            self._stage = stage
+            self._stage_start = time.time()
+        self._emit({"stage": stage, "event": "stage_started"}, force=True)
+
+    def stage_finished(self, stage: str, seconds: float, skipped: bool = False):
+        self._emit({
+            "stage": stage,
+            "event": "stage_skipped" if skipped else "stage_finished",
+            "stage_seconds": round(seconds, 3),
+        }, force=True)
+
+    def update(self, event: dict):
+        """子进程输出的结构化进度 (见 parse_progress_line)"""
+        payload = {"stage": self._stage, "event": "progress"}
+        for key in ("step", "total", "loss"):
+            if key in event:
+                payload[key] = event[key]
+        self._emit(payload)
+
+    def finished(self, success: bool):
+        self._emit({
+            "stage": None,
+            "event": "completed" if success else "failed",
+            "elapsed_seconds": round(time.time() - self._job_start, 3),
+        }, force=True)
+
+    # -------------------------------------------------------------------------
+    # 内部
+    # -------------------------------------------------------------------------
+    def _estimate_remaining(self, step: Optional[int], total: Optional[int]) -> Optional[float]:
+        """当前阶段剩余时间 + 后续阶段历史平均耗时"""
+        stage = self._stage
+        if stage is None or stage not in self.stage_names:
+            return None
+
+        averages = self.stage_averages()
+        now = time.time()
+        stage_elapsed = now - self._stage_start
+
+        if step and total and step > 0:
+            current_remaining = stage_elapsed / step * max(0, total - step)
+        elif averages.get(stage) is not None:
+            current_remaining = max(0.0, averages[stage] - stage_elapsed)
+        else:
+            return None
+
+        following = self.stage_names[self.stage_names.index(stage) + 1:]
+        later = 0.0
+        for name in following:
+            if averages.get(name) is None:
+                return None
+            later += averages[name]
+
+        return current_remaining + later
+
+    def _emit(self, payload: dict, force: bool = False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_push < PUSH_INTERVAL:
+                return
+            self._last_push = now
+
+        eta = None
+        if payload["event"] in ("stage_started", "progress"):
+            eta = self._estimate_remaining(payload.get("step"), payload.get("total"))
+
+        data = {
+            "asset_id": self.asset_id,
+            "stage_index": self.stage_names.index(payload["stage"]) if payload.get("stage") in self.stage_names else None,
+            "stage_count": len(self.stage_names),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            **payload,
+        }
+        manager.send_personal_message_threadsafe(
+            json.dumps({"type": "training_progress", "data": data}),
+            self.user_id
+        )
+
+        if eta is not None and now - self._last_persist >= PERSIST_INTERVAL:
+            self._last_persist = now
+            self._persist_estimate(int(now - self._job_start + eta))
+
+    def _persist_estimate(self, total_seconds: int):
+        try:
+            with Session(engine) as session:
+                asset = session.get(ModelAsset, self.asset_id)
+                if asset:
+                    asset.estimated_gen_seconds = total_seconds
+                    session.add(asset)
+                    session.commit()
+        except Exception as e:
+            print(f"写回预估时间失败: {e}")
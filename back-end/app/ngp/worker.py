@@ -1,47 +1,115 @@
+from datetime import datetime
+from pathlib import Path
 from sqlmodel import Session
 from app.database import engine
-from app.models import AssetStatus, ModelAsset
+from app.core.static_files import precompress_tree
+from app.ngp.cache import hash_file
+from app.models import AssetStatus, JobStatus, ModelAsset, TrainingJob
 from app.ngp.creater import train_ngp_from_video
 
-def task_train_asset(asset_id: int, video_disk_path: str, snapshot_disk_path: str, web_model_path: str):
-    """
-    后台任务：执行训练并更新数据库状态
+
+def mark_asset_processing(asset_id: int) -> bool:
     """
+    更新状态 -> PROCESSING
 
+    Returns:
+        bool: 资产是否存在
+    """
     with Session(engine) as session:
-        # 获取model对象
         asset = session.get(ModelAsset, asset_id)
         if not asset:
-            return
+            return False
 
-        #更新状态 -> PROCESSING
         asset.status = AssetStatus.PROCESSING
         session.add(asset)
         session.commit()
+        return True
 
-        try:
-            print(f"开始训练 Asset ID: {asset_id}...")
 
-            # 训练函数
-            train_result = train_ngp_from_video(
-                video_path=video_disk_path,
-                snapshot_path=snapshot_disk_path,
+def finalize_asset(asset_id: int, success: bool, web_model_path: str,
+                   job_id: int | None = None, owner_id: str | None = None) -> bool:
+    """
+    训练结束：写回 COMPLETED(+model_path) 或 FAILED
+    传入 job_id / owner_id 时先检查任务租约，并在同一事务中把任务标记为 DONE / FAILED；
+    租约已被其他调度器接管 (任务已重新入队) 时什么都不写
 
-                n_steps=5000
-            )
+    Returns:
+        bool: 是否写入
+    """
+    with Session(engine) as session:
+        if job_id is not None:
+            job = session.get(TrainingJob, job_id)
+            if not job or job.status != JobStatus.RUNNING or job.owner_id != owner_id:
+                print(f"训练任务 {job_id} 的租约已被接管，忽略本次结果 (Asset ID: {asset_id})")
+                return False
+            job.status = JobStatus.DONE if success else JobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+            job.current_stage = None
+            job.heartbeat_at = None
+            session.add(job)
 
-            # 训练成功
-            print(f"训练完成: {train_result}")
+        asset = session.get(ModelAsset, asset_id)
+        if not asset:
+            session.commit()
+            return job_id is not None
+
+        if success:
             asset.status = AssetStatus.COMPLETED
             asset.model_path = web_model_path
-
-        except Exception as e:
-            # 训练失败：更新状态
-            print(f"训练失败 Asset ID {asset_id}: {e}")
+            # 快照哈希作为导出缓存的 key (重新训练后旧的导出结果自动失效)
+            try:
+                asset.snapshot_hash = hash_file(web_model_path)
+            except OSError:
+                asset.snapshot_hash = None
+        else:
             asset.status = AssetStatus.FAILED
             # asset.remark = f"{asset.remark or ''} | Error: {str(e)}"
 
-        finally:
-            # 提交数据库修改
-            session.add(asset)
-            session.commit()
\ No newline at end of file
+        session.add(asset)
+        session.commit()
+
+    if success:
+        # 快照 / transforms.json 的预压缩版本，下载时按 Accept-Encoding 直接发送
+        try:
+            precompress_tree(Path(web_model_path).parent)
+        except Exception as e:
+            print(f"资产 {asset_id} 预压缩失败: {e}")
+    return True
+
+
+def task_train_asset(asset_id: int, video_disk_path: str, snapshot_disk_path: str, web_model_path: str) -> bool:
+    """
+    后台任务：在当前进程中顺序执行训练并更新数据库状态
+    (任务队列默认走 app.ngp.pipeline 的分阶段流水线)
+
+    Returns:
+        bool: 训练是否成功
+    """
+    if not mark_asset_processing(asset_id):
+        return False
+
+    success = False
+    try:
+        print(f"开始训练 Asset ID: {asset_id}...")
+
+        # 训练函数
+        train_result = train_ngp_from_video(
+            video_path=video_disk_path,
+            snapshot_path=snapshot_disk_path,
+
+            n_steps=5000
+        )
+
+        # 训练成功
+        print(f"训练完成: {train_result}")
+        success = True
+
+    except Exception as e:
+        # 训练失败：更新状态
+        print(f"训练失败 Asset ID {asset_id}: {e}")
+
+    finally:
+        # 提交数据库修改
+        finalize_asset(asset_id, success, web_model_path)
+
+    return success
@@ -1,7 +1,42 @@
+import json
 import os
+import re
 import subprocess
+import sys
 import time
-from typing import Optional
+from typing import Callable, Optional
+
+# =============================================================================
+# 结构化进度
+# 子进程 (scripts/run.py) 在环境变量 NGP_PROGRESS_JSON=1 时输出：
+#   @@PROGRESS {"step": 1200, "total": 5000, "loss": 0.0123}
+# COLMAP 的 "Processed file [12/80]" 也解析为 step/total
+# =============================================================================
+PROGRESS_PREFIX = "@@PROGRESS "
+PROGRESS_ENV = "NGP_PROGRESS_JSON"
+COLMAP_PROGRESS_RE = re.compile(r"Processed file \[(\d+)/(\d+)\]")
+
+
+def parse_progress_line(line: str) -> Optional[dict]:
+    """
+    解析一行子进程输出，不是进度行时返回 None
+
+    Returns:
+        dict: 可能包含 step / total / loss
+    """
+    line = line.strip()
+    if line.startswith(PROGRESS_PREFIX):
+        try:
+            event = json.loads(line[len(PROGRESS_PREFIX):])
+        except json.JSONDecodeError:
+            return None
+        return event if isinstance(event, dict) else None
+
+    match = COLMAP_PROGRESS_RE.search(line)
+    if match:
+        return {"step": int(match.group(1)), "total": int(match.group(2))}
+
+    return None
 
 
 class BackgroundProcessManager:
@@ -113,13 +148,14 @@ class BackgroundProcessManager:
         self.stop()
 
 
-def run_and_stream(cmd_list, input_data, cwd=None):
+def run_and_stream(cmd_list, input_data, cwd=None, on_progress: Optional[Callable[[dict], None]] = None):
     """
     Args:
     cmd_list (list): 包含要执行的命令和所有参数的列表。
                      列表的第一个元素必须是 Python 解释器的路径。
     input_data (str): 包含要发送给子进程的标准输入的字符串，
                       多个输入以换行符 ('\n') 分隔。
+    on_progress (Callable, optional): 解析到结构化进度时的回调，见 parse_progress_line。
 
     Returns:
         tuple: (success, tip, frame_count)
@@ -164,6 +200,11 @@ def run_and_stream(cmd_list, input_data, cwd=None):
         #     sys.stdout.flush()  # 立即刷新，确保信息立刻显示
 
         for line in process.stdout:
+            if on_progress:
+                event = parse_progress_line(line)
+                if event:
+                    on_progress(event)
+                    continue
             if "No Convergence" in line:
                 print(line)
                 tip = 0
@@ -199,7 +240,7 @@ class ExternalCommandRunner:
     适用于像 'python run.py --gui' 这样需要持续运行的程序。
     """
 
-    def __init__(self, command_parts, cwd: Optional[str] = None):
+    def __init__(self, command_parts, cwd: Optional[str] = None, stdin=None, stdout=None):
         """
         初始化管理器。
 
@@ -207,9 +248,12 @@ class ExternalCommandRunner:
             command_parts (List[str]): 包含所有命令和参数的列表。
                                        例如: ['python', 'path/to/run.py', '--arg1', 'value1']
             cwd (Optional[str]): 子进程的工作目录。
+            stdin / stdout: 传给 Popen，默认继承主进程 (用于把渲染进程的输出直接接到 ffmpeg)
         """
         self.command_parts = command_parts
         self.process: Optional[subprocess.Popen] = None
+        self.stdin = stdin
+        self.stdout = stdout
 
         # 默认工作目录为命令列表中第一个文件（脚本或可执行文件）的目录
         if cwd:
@@ -252,7 +296,8 @@ class ExternalCommandRunner:
                 self.command_parts,
                 cwd=self.cwd,
                 # 继承主进程的控制台输出
-                stdout=None,
+                stdin=self.stdin,
+                stdout=self.stdout,
                 stderr=None,
                 shell=False
             )
@@ -335,13 +380,20 @@ class NonBlockingCommandRunner:
         self.command_parts = command_parts
         self.cwd = cwd
 
-    def run(self) -> subprocess.CompletedProcess:
+    def run(self, on_progress: Optional[Callable[[dict], None]] = None) -> subprocess.CompletedProcess:
         """
         执行命令，等待其完成，并将子进程的输出流式传输到主控制台。
 
+        Args:
+            on_progress (Callable, optional): 传入时逐行读取输出，进度行交给回调
+                                              (见 parse_progress_line)，其余行照常打印。
+
         Returns:
             subprocess.CompletedProcess: 包含子进程结果的对象。
         """
+        if on_progress:
+            return self._run_with_progress(on_progress)
+
         command_str = " ".join(self.command_parts)
         print("-" * 50)
         print(f"--- 启动非持续性任务 ---")
@@ -378,3 +430,42 @@ class NonBlockingCommandRunner:
         except Exception as e:
             print(f"!!! 发生意外错误: {e} !!!")
             raise
+
+    def _run_with_progress(self, on_progress: Callable[[dict], None]) -> subprocess.CompletedProcess:
+        """逐行读取子进程输出并解析结构化进度"""
+        env = {**os.environ, PROGRESS_ENV: "1"}
+        print(f"--- 启动非持续性任务 (进度解析): {' '.join(self.command_parts)} ---")
+
+        process = subprocess.Popen(
+            self.command_parts,
+            cwd=self.cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,  # 通用换行模式，tqdm 的 '\r' 也会被拆成独立的行
+            bufsize=1,
+            shell=False
+        )
+
+        try:
+            for line in process.stdout:
+                event = parse_progress_line(line)
+                if event:
+                    try:
+                        on_progress(event)
+                    except Exception as e:
+                        print(f"进度回调出错: {e}")
+                else:
+                    sys.stdout.write(line)
+            process.wait()
+        except BaseException:
+            if process.poll() is None:
+                process.kill()
+            raise
+
+        if process.returncode != 0:
+            print(f"!!! ERROR: 命令执行失败。退出码: {process.returncode} !!!")
+            raise subprocess.CalledProcessError(process.returncode, self.command_parts)
+
+        print(f"SUCCESS: 任务已完成。退出码: {process.returncode}")
+        return subprocess.CompletedProcess(self.command_parts, process.returncode)
@@ -25,6 +25,14 @@ class UserOut(SQLModel):
     bio: str | None = None
 
 
+class Thumbnail(SQLModel):
+    """封面缩略图的一个尺寸"""
+    width: int
+    height: int
+    webp: str
+    jpeg: str
+
+
 class AssetCard(SQLModel):
     """
     【模型卡片】用于“我的模型”页面展示
@@ -32,7 +40,8 @@ class AssetCard(SQLModel):
     """
     id: int
     title: str  # 标题
-    cover_url: str  # 封面图
+    cover_url: str  # 封面图 (缩略图未生成时为视频路径)
+    thumbnails: list[Thumbnail] = []  # 各尺寸封面，按宽度升序
     description: str | None  # 描述
     tags: list[str]  # 标签
     is_collected: bool
@@ -52,7 +61,8 @@ class PostCard(SQLModel):
     post_id: int
     asset_id: int
     title: str  # 模型标题
-    cover_url: str  # 封面 (视频路径)
+    cover_url: str  # 封面 (缩略图未生成时为视频路径)
+    thumbnails: list[Thumbnail] = []  # 各尺寸封面，按宽度升序
     description: str | None  # 优先显示帖子文案，没有则显示模型描述
     tags: list[str]  # 标签
     published_at: str  # 发布时间
@@ -151,10 +161,24 @@ class ControlCommand(SQLModel):
     mode: str = "start"  #
 
 
+class CameraPose(SQLModel):
+    """绝对相机位姿：3x4 相机矩阵 (与 instant-ngp camera_matrix 相同)"""
+    matrix: List[List[float]]
+    scale: float | None = None  # 到注视点的距离
+
+
+class CameraVelocity(SQLModel):
+    """持续运动速度 (每秒)，全部为 0 即停止"""
+    orbit: List[float] = [0.0, 0.0]  # 偏航 / 俯仰 (弧度)
+    pan: List[float] = [0.0, 0.0]  # 水平 / 垂直 (相对注视距离)
+    zoom: float = 0.0  # 缩放 (对数尺度，负数拉近)
+
+
 class StreamStatus(SQLModel):
     is_active: bool
     rtsp_url: str | None
     current_asset_id: int | None
+    queue_position: int | None = None  # 会话已满时的排队位置 (从 1 开始)
 
 
 class PostAssetInfo(SQLModel):
@@ -263,7 +287,7 @@ class DownloadFileType(str, Enum):
     - OBJ (Universal)   -> obj
     - GLB (Web/AR)      -> glb
     - PLY (Point Cloud) -> ply
-    - SOURCE DATA       -> msgpack (现阶段源数据即为训练好的 msgpack)
+    - SOURCE DATA       -> msgpack (视频 + transforms.json + 帧 + 快照打包的 ZIP)
     """
     OBJ = "obj"
     GLB = "glb"
@@ -272,9 +296,14 @@ class DownloadFileType(str, Enum):
 
 
 class DownloadResponse(SQLModel):
-    """下载接口响应，返回真实文件链接"""
+    """
+    下载接口响应，返回真实文件链接
+    OBJ/GLB/PLY 需要后台导出：未完成时 status 为 queued/running 且 url 为空 (HTTP 202)，按 Retry-After 重试
+    """
     url: str
     filename: str
+    status: str = "done"  # queued/running/done
+    file_size: int | None = None
 
 
 class AssetUpdate(SQLModel):
@@ -289,3 +318,57 @@ class AssetReport(SQLModel):
     """举报/反馈请求模型"""
     category: str  # 例如: "Bug", "Inappropriate", "Other"
     content: str
+
+
+class UploadInit(SQLModel):
+    """创建分片上传会话 (资产信息在此时提交，完成上传后自动创建资产并排队训练)"""
+    filename: str
+    size: int  # 文件总字节数
+    sha256: str | None = None  # 可选，提交时校验
+    title: str
+    description: str | None = None
+    tags: List[str] = []
+    remark: str | None = None
+    estimated_time: int | None = None
+
+
+class UploadSessionOut(SQLModel):
+    """分片上传会话状态"""
+    upload_id: str
+    status: str  # uploading/committed/aborted
+    offset: int  # 已接收字节数，续传从这里开始
+    total_size: int
+    chunk_size: int  # 建议的分片大小
+    asset_id: int | None = None
+
+
+class PipelineStageStats(SQLModel):
+    """训练流水线单个阶段的统计"""
+    name: str  # extract/sharpen/features/mapper/transforms/train
+    concurrency: int  # 并发上限
+    queued: int  # 排队中的任务数
+    running: int  # 执行中的任务数
+    completed: int
+    failed: int
+    skipped: int  # 命中训练缓存跳过的次数
+    avg_seconds: float | None  # 平均耗时
+    last_seconds: float | None  # 最近一次耗时
+
+
+class PipelineStats(SQLModel):
+    """训练流水线整体状态"""
+    in_flight: int  # 流水线中的任务数
+    queued_jobs: int  # 尚未进入流水线的排队任务数
+    stages: List[PipelineStageStats]
+
+
+class TrainingJobStatus(SQLModel):
+    """单个模型的训练任务进度"""
+    asset_id: int
+    status: str  # queued/running/done/failed
+    current_stage: str | None
+    attempts: int
+    stage_timings: dict[str, float]  # 已完成阶段的耗时(秒)
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
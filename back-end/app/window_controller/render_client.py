@@ -0,0 +1,107 @@
+import json
+import socket
+import threading
+import time
+from typing import Optional
+
+
+class RenderClient:
+    """
+    无界面渲染服务 (scripts/render_server.py) 的控制连接。
+    通过本地 TCP 发送按行分隔的 JSON 指令，代替 GUI 模式下的鼠标模拟。
+    move 指令不回复；其余指令用 request() 发送并等待一行 {"ok": ...} 回复。
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = port
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def connect(self, timeout: float, is_alive=lambda: True) -> bool:
+        """
+        等待渲染服务就绪 (pyngp 初始化完成后才开始监听)
+
+        Args:
+            timeout: 最长等待秒数
+            is_alive: 渲染进程存活检查，进程提前退出时立即放弃
+
+        Returns:
+            bool: 是否连接成功
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline and is_alive():
+            try:
+                self._sock = socket.create_connection((self.host, self.port), timeout=1)
+                self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._sock.settimeout(None)
+                self._reader = self._sock.makefile("r", encoding="utf-8")
+                return True
+            except OSError:
+                time.sleep(0.2)
+        return False
+
+    def send(self, command: dict) -> bool:
+        """只发送，不等待回复 (用于 move 这类高频指令)"""
+        with self._lock:
+            return self._send_locked(command)
+
+    def request(self, command: dict, timeout: float = 60) -> dict:
+        """
+        发送指令并等待回复
+
+        Raises:
+            RuntimeError: 连接断开、超时或渲染服务返回失败
+        """
+        with self._lock:
+            if not self._send_locked(command):
+                raise RuntimeError(f"渲染服务连接不可用: {command.get('cmd')}")
+            try:
+                self._sock.settimeout(timeout)
+                line = self._reader.readline()
+                self._sock.settimeout(None)
+            except OSError as e:
+                # 迟到的回复会被当成下一条指令的结果：直接断开，由渲染池重启进程
+                self._close_locked()
+                raise RuntimeError(f"渲染服务无响应: {e}")
+
+        if not line:
+            raise RuntimeError("渲染服务连接已关闭")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(f"渲染服务执行 {command.get('cmd')} 失败: {response.get('error')}")
+        return response
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _send_locked(self, command: dict) -> bool:
+        if self._sock is None:
+            return False
+        try:
+            self._sock.sendall((json.dumps(command) + "\n").encode("utf-8"))
+            return True
+        except OSError as e:
+            print(f"渲染服务指令发送失败: {e}")
+            return False
+
+    def move(self, action: str, direction: str, mode: str) -> bool:
+        return self.send({"cmd": "move", "action": action, "direction": direction, "mode": mode})
+
+    def stop(self):
+        """停止连续动作 (与 ContinuousController.stop 对应)"""
+        self.send({"cmd": "move", "mode": "stop"})
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._reader = None
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+# Headless render server for interactive preview.
+#
+# One process is spawned ahead of time and kept warm by the backend's renderer
+# pool. It can load/switch snapshots in-process and streams raw RGBA frames into
+# an ffmpeg child process started on demand. Commands arrive as newline
+# delimited JSON on a local TCP socket:
+#
+#   {"cmd": "load", "scene": "...", "snapshot": "..."}   -> {"ok": true}
+#   {"cmd": "unload"}                                     -> {"ok": true}
+#   {"cmd": "stream", "ffmpeg": ["ffmpeg", ..., "-i", "pipe:0", ...]} -> {"ok": true}
+#   {"cmd": "unstream"}                                   -> {"ok": true}
+#   {"cmd": "status"}            -> {"ok": true, "snapshot": ..., "streaming": ...}
+#   {"cmd": "move", "action": "rotate", "direction": "left", "mode": "start"}  (no reply)
+#   {"cmd": "move", "mode": "stop"}                                            (no reply)
+#   {"cmd": "velocity", "orbit": [yaw, pitch], "pan": [x, y], "zoom": z}       (no reply)
+#   {"cmd": "pose", "matrix": [[...], [...], [...]], "scale": s}               (no reply)
+#   {"cmd": "quit"}
+#
+# Camera commands are drained once per frame tick, so a burst of poses only
+# costs one render.
+#
+# The listening socket is opened once pyngp has been imported and CUDA is
+# initialised, so a successful connect means the server is ready.
+
+import argparse
+import json
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from common import *
+
+import pyngp as ngp # noqa
+
+# Speeds used by the discrete "move" commands (per second).
+ROTATE_SPEED = np.radians(90.0) # radians
+PAN_SPEED = 0.5 # fraction of the orbit distance
+ZOOM_SPEED = np.log(1.5) # log of the scale factor
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Headless instant-ngp render server")
+
+	parser.add_argument("--scene", default="", help="Scene to preload (training data directory or transforms.json).")
+	parser.add_argument("--load_snapshot", "--snapshot", default="", help="Snapshot to preload.")
+	parser.add_argument("--port", type=int, required=True, help="Local TCP port for commands.")
+	parser.add_argument("--width", type=int, default=1280, help="Frame width.")
+	parser.add_argument("--height", type=int, default=720, help="Frame height.")
+	parser.add_argument("--fps", type=int, default=30, help="Output frame rate.")
+	parser.add_argument("--spp", type=int, default=1, help="Samples per pixel.")
+
+	return parser.parse_args()
+
+def rotation(axis, angle):
+	axis = axis / (np.linalg.norm(axis) or 1.0)
+	x, y, z = axis
+	c, s = np.cos(angle), np.sin(angle)
+	C = 1 - c
+	return np.array([
+		[c + x*x*C, x*y*C - z*s, x*z*C + y*s],
+		[y*x*C + z*s, c + y*y*C, y*z*C - x*s],
+		[z*x*C - y*s, z*y*C + x*s, c + z*z*C],
+	])
+
+class CameraRig:
+	"""Orbit / pan / zoom around the testbed's look-at point."""
+
+	def __init__(self, testbed):
+		self.testbed = testbed
+		self.world_up = np.array(testbed.camera_matrix)[:, 1].copy()
+		# Continuous motion: orbit yaw/pitch (rad/s), pan x/y (distance/s), zoom (log scale/s)
+		self.velocity = np.zeros(5)
+
+	def orbit(self, yaw, pitch):
+		cam = np.array(self.testbed.camera_matrix)
+		pivot = np.array(self.testbed.look_at)
+		rot = rotation(self.world_up, yaw) @ rotation(cam[:, 0], pitch)
+		cam[:, :3] = rot @ cam[:, :3]
+		cam[:, 3] = pivot + rot @ (cam[:, 3] - pivot)
+		self.testbed.camera_matrix = cam
+
+	def pan(self, dx, dy):
+		cam = np.array(self.testbed.camera_matrix)
+		distance = self.testbed.scale
+		cam[:, 3] += (cam[:, 0] * dx + cam[:, 1] * dy) * distance
+		self.testbed.camera_matrix = cam
+
+	def zoom(self, factor):
+		self.testbed.scale = self.testbed.scale * factor
+
+	def set_pose(self, matrix, scale=None):
+		self.testbed.camera_matrix = np.array(matrix, dtype=np.float64)
+		if scale:
+			self.testbed.scale = float(scale)
+
+	def stop(self):
+		self.velocity[:] = 0.0
+
+	def step(self, dt):
+		"""Apply the current continuous motion. Returns True if the camera changed."""
+		if not self.velocity.any():
+			return False
+
+		yaw, pitch, pan_x, pan_y, zoom = self.velocity * dt
+		if yaw or pitch:
+			self.orbit(yaw, pitch)
+		if pan_x or pan_y:
+			self.pan(pan_x, pan_y)
+		if zoom:
+			self.zoom(np.exp(zoom))
+		return True
+
+	def apply_velocity(self, command):
+		orbit = command.get("orbit") or [0.0, 0.0]
+		pan = command.get("pan") or [0.0, 0.0]
+		self.velocity = np.array([orbit[0], orbit[1], pan[0], pan[1], command.get("zoom") or 0.0], dtype=np.float64)
+
+	def apply_move(self, command):
+		"""Map the legacy action/direction commands onto a velocity."""
+		self.stop()
+		if command.get("mode") == "stop":
+			return
+
+		action, direction = command.get("action"), command.get("direction")
+		sign = {"left": -1, "up": -1, "counter_clockwise": -1, "in": -1}.get(direction, 1)
+		vertical = direction in ("up", "down")
+		if action == "rotate":
+			self.velocity[1 if vertical else 0] = sign * ROTATE_SPEED
+		elif action == "pan":
+			self.velocity[3 if vertical else 2] = sign * PAN_SPEED
+		elif action == "zoom":
+			self.velocity[4] = sign * ZOOM_SPEED
+
+def serve_commands(port, commands):
+	"""Accept control connections and forward (command, reply) pairs to the render loop."""
+	server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	server.bind(("127.0.0.1", port))
+	server.listen(4)
+
+	def handle(conn):
+		def reply(payload):
+			try:
+				conn.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+			except OSError:
+				pass
+
+		with conn, conn.makefile("r", encoding="utf-8") as lines:
+			for line in lines:
+				try:
+					commands.put((json.loads(line), reply))
+				except json.JSONDecodeError:
+					print(f"render_server: bad command {line!r}", file=sys.stderr)
+
+	def accept_loop():
+		while True:
+			conn, _ = server.accept()
+			threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+	threading.Thread(target=accept_loop, daemon=True).start()
+
+def to_rgba8(image):
+	return (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8).tobytes()
+
+class RenderServer:
+	def __init__(self, args):
+		self.args = args
+		self.testbed = None
+		self.rig = None
+		self.snapshot = None
+		self.home_camera = None # (camera_matrix, scale) right after loading
+		self.encoder = None # ffmpeg subprocess reading frames from stdin
+		self.frame = None
+		self.dirty = True
+
+	@property
+	def streaming(self):
+		return self.encoder is not None and self.encoder.poll() is None
+
+	def load(self, scene, snapshot):
+		if snapshot == self.snapshot and self.testbed is not None:
+			# Already resident: only reset the camera to the snapshot's default view
+			matrix, scale = self.home_camera
+			self.testbed.camera_matrix = matrix
+			self.testbed.scale = scale
+		else:
+			self.unload()
+			self.testbed = ngp.Testbed()
+			self.testbed.root_dir = ROOT_DIR
+			if scene:
+				self.testbed.load_training_data(scene)
+			self.testbed.load_snapshot(snapshot)
+			self.testbed.shall_train = False
+			self.snapshot = snapshot
+			self.home_camera = (np.array(self.testbed.camera_matrix), self.testbed.scale)
+		self.rig = CameraRig(self.testbed)
+		self.dirty = True
+
+	def unload(self):
+		# Dropping the testbed frees its GPU memory
+		self.testbed = None
+		self.rig = None
+		self.snapshot = None
+		self.home_camera = None
+		self.frame = None
+
+	def start_stream(self, ffmpeg_cmd):
+		self.stop_stream()
+		self.encoder = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+		self.frame = None
+		self.dirty = True
+
+	def stop_stream(self):
+		if self.encoder is None:
+			return
+		try:
+			self.encoder.stdin.close()
+		except OSError:
+			pass
+		try:
+			self.encoder.wait(timeout=5)
+		except subprocess.TimeoutExpired:
+			self.encoder.kill()
+		self.encoder = None
+		if self.rig:
+			self.rig.stop()
+
+	def apply_camera(self, cmd, command):
+		if cmd == "move":
+			self.rig.apply_move(command)
+		elif cmd == "velocity":
+			self.rig.apply_velocity(command)
+		else:
+			self.rig.set_pose(command["matrix"], command.get("scale"))
+			self.dirty = True
+
+	def handle(self, command, reply):
+		cmd = command.get("cmd")
+		if cmd in ("move", "velocity", "pose"):
+			# Camera commands are fire-and-forget: never reply, or the client's
+			# request/response pairing would go out of step
+			if self.rig is not None:
+				try:
+					self.apply_camera(cmd, command)
+				except (KeyError, IndexError, TypeError, ValueError) as e:
+					print(f"render_server: bad {cmd} command: {e}", file=sys.stderr)
+			return
+
+		try:
+			if cmd == "load":
+				self.load(command.get("scene", ""), command["snapshot"])
+			elif cmd == "unload":
+				self.stop_stream()
+				self.unload()
+			elif cmd == "stream":
+				if self.testbed is None:
+					raise RuntimeError("no snapshot loaded")
+				self.start_stream(command["ffmpeg"])
+			elif cmd == "unstream":
+				self.stop_stream()
+			elif cmd == "status":
+				pass
+			elif cmd == "quit":
+				self.stop_stream()
+				reply({"ok": True})
+				raise SystemExit(0)
+			else:
+				raise ValueError(f"unknown command {cmd!r}")
+			reply({"ok": True, "snapshot": self.snapshot, "streaming": self.streaming})
+		except SystemExit:
+			raise
+		except Exception as e:
+			print(f"render_server: {cmd} failed: {e}", file=sys.stderr)
+			reply({"ok": False, "error": str(e)})
+
+	def run(self, commands):
+		frame_interval = 1.0 / self.args.fps
+		last_time = time.time()
+
+		while True:
+			if not self.streaming:
+				if self.encoder is not None:
+					print("render_server: encoder exited", file=sys.stderr)
+					self.stop_stream()
+				# Idle: block on commands, no rendering
+				self.handle(*commands.get())
+				last_time = time.time()
+				continue
+
+			now = time.time()
+			dt = now - last_time
+			last_time = now
+
+			while True:
+				try:
+					command, reply = commands.get_nowait()
+				except queue.Empty:
+					break
+				self.handle(command, reply)
+			if not self.streaming:
+				continue
+
+			self.dirty = self.rig.step(dt) or self.dirty
+
+			# Static camera: resend the last frame instead of rendering again
+			if self.dirty or self.frame is None:
+				self.frame = to_rgba8(self.testbed.render(self.args.width, self.args.height, self.args.spp, False))
+				self.dirty = False
+
+			try:
+				self.encoder.stdin.write(self.frame)
+			except (BrokenPipeError, OSError):
+				print("render_server: encoder pipe closed", file=sys.stderr)
+				self.stop_stream()
+				continue
+
+			sleep = frame_interval - (time.time() - now)
+			if sleep > 0:
+				time.sleep(sleep)
+
+if __name__ == "__main__":
+	args = parse_args()
+
+	server = RenderServer(args)
+	if args.load_snapshot:
+		server.load(args.scene, args.load_snapshot)
+
+	commands = queue.Queue()
+	serve_commands(args.port, commands)
+	print(f"render_server: ready on 127.0.0.1:{args.port}", flush=True)
+
+	try:
+		server.run(commands)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.stop_stream()
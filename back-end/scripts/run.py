@@ -202,6 +202,9 @@ if __name__ == "__main__":
 	use_training_schedule = True
 
 	tqdm_last_update = 0
+	# Machine-readable progress for the Delta3D backend (see app/process_manager/utils.py)
+	progress_json = bool(os.environ.get("NGP_PROGRESS_JSON"))
+	progress_last_update = 0
 	if n_steps > 0:
 		with tqdm(desc="Training", total=n_steps, unit="steps") as t:
 			while testbed.frame():
@@ -248,6 +251,10 @@ if __name__ == "__main__":
 					old_training_step = testbed.training_step
 					tqdm_last_update = now
 
+				if progress_json and now - progress_last_update > 1.0:
+					print("@@PROGRESS " + json.dumps({"step": testbed.training_step, "total": n_steps, "loss": float(testbed.loss)}), flush=True)
+					progress_last_update = now
+
 				prev_train_mode = ngp.TrainMode(testbed.nerf.training.train_mode)
 
 	if args.save_snapshot: